@@ -0,0 +1,81 @@
+# Per-client adaptive video quality
+#
+# Each client is assigned a quality tier. Once per evaluation window the
+# controller looks at how the client's video queue behaved: frames dropped
+# because the previous one was still queued, how long sends took and
+# whether the transport buffer is growing. Congested clients step down a
+# tier right away; clients step back up only after several clean windows.
+
+# stream: Picamera2 stream the tier is encoded from ('lores' is the
+# camera's hardware-scaled second output)
+DEFAULT_TIERS = [
+    {'name': 'high', 'stream': 'main', 'size': (640, 480), 'quality': 80, 'fps': 30},
+    {'name': 'medium', 'stream': 'main', 'size': (640, 480), 'quality': 60, 'fps': 20},
+    {'name': 'low', 'stream': 'lores', 'size': (320, 240), 'quality': 50, 'fps': 15},
+    {'name': 'minimal', 'stream': 'lores', 'size': (320, 240), 'quality': 35, 'fps': 5},
+]
+
+
+def load_tiers(video_config):
+    """Tiers from the video config, highest quality first"""
+    tiers = [dict(tier) for tier in video_config.get('tiers', DEFAULT_TIERS)]
+    for tier in tiers:
+        tier['size'] = tuple(tier['size'])
+    return tiers
+
+
+class AdaptiveQuality:
+    def __init__(self, tiers, drop_threshold=0.3, buffer_threshold=256 * 1024,
+                 upgrade_windows=3):
+        self.tiers = tiers
+        self.drop_threshold = drop_threshold
+        self.buffer_threshold = buffer_threshold
+        self.upgrade_windows = upgrade_windows
+
+    def evaluate(self, client):
+        """Move one client up or down a tier; returns True if it changed"""
+        sent = client.sent['video']
+        dropped = client.dropped['video']
+        buffered = client.write_buffer_size()
+
+        last_sent, last_dropped, last_buffered = client.quality_window
+        client.quality_window = (sent, dropped, buffered)
+
+        window_sent = sent - last_sent
+        window_dropped = dropped - last_dropped
+        offered = window_sent + window_dropped
+        if offered == 0:
+            return False
+
+        tier = self.tiers[client.video_tier]
+        frame_interval_ms = 1000.0 / tier['fps']
+        send_ms = client.send_ms['video'] or 0
+
+        drop_ratio = window_dropped / offered
+        congested = (
+            drop_ratio > self.drop_threshold
+            or send_ms > 2 * frame_interval_ms
+            or (buffered > self.buffer_threshold and buffered > last_buffered)
+        )
+
+        if congested:
+            client.good_windows = 0
+            if client.video_tier < len(self.tiers) - 1:
+                client.video_tier += 1
+                return True
+            return False
+
+        # Only step up when the link has clear headroom at the higher rate
+        if client.video_tier > 0 and window_dropped == 0:
+            better = self.tiers[client.video_tier - 1]
+            if send_ms < 0.5 * 1000.0 / better['fps']:
+                client.good_windows += 1
+            else:
+                client.good_windows = 0
+
+            if client.good_windows >= self.upgrade_windows:
+                client.good_windows = 0
+                client.video_tier -= 1
+                return True
+
+        return False
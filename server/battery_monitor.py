@@ -2,17 +2,20 @@
 import board
 import busio
 
+from device_supervisor import DeviceSupervisor
+
+def open_ina3221():
+    """Open the INA3221 on the default I2C bus"""
+    from adafruit_ina3221 import INA3221
+    i2c = busio.I2C(board.SCL, board.SDA)
+    return INA3221(i2c)
+
 class BatteryMonitor:
-    def __init__(self):
-        self.ina = None
-        try:
-            from adafruit_ina3221 import INA3221
-            i2c = busio.I2C(board.SCL, board.SDA)
-            self.ina = INA3221(i2c)
-        except ImportError:
-            print("INA3221 library not available")
-        except Exception as e:
-            print(f"INA3221 init error: {e}")
+    def __init__(self, devices=None):
+        # The supervisor owns the sensor handle and reconnects it in the background
+        self.devices = devices or DeviceSupervisor()
+        self.device = self.devices.add('battery', open_ina3221)
+        self.devices.start()
     
     def lifepo4_percentage(self, voltage):
         """Calculate LiFePO4 battery percentage from voltage"""
@@ -48,8 +51,11 @@ class BatteryMonitor:
             
     def read(self):
         """Read battery data with LiFePO4 percentage calculation"""
-        if not self.ina:
-            # Return simulated data for testing
+        ina = self.devices.get('battery')
+        if ina is None:
+            if self.device.state != 'disabled':
+                return None
+            # INA3221 library not installed: return simulated data for testing
             return {
                 'voltage': 13.2,
                 'percentage': 80,
@@ -58,7 +64,7 @@ class BatteryMonitor:
             
         try:
             # Read voltage from INA3221 (channel 1)
-            voltage = self.ina.bus_voltage
+            voltage = ina.bus_voltage
             
             # Calculate battery percentage using LiFePO4 curve
             percentage = self.lifepo4_percentage(voltage)
@@ -80,4 +86,5 @@ class BatteryMonitor:
             }
         except Exception as e:
             print(f"Battery read error: {e}")
+            self.devices.report_failure('battery', e)
             return None
\ No newline at end of file
@@ -0,0 +1,418 @@
+# End-to-end WebSocket server benchmark
+#
+# Starts the server as a subprocess against simulated hardware and
+# connects N synthetic dashboard clients, optionally bandwidth limited.
+# For each scenario it measures delivered video fps and capture-to-client
+# latency, telemetry rate, control command round trips, server CPU and
+# RSS, and the server's own /metrics histograms, then writes everything
+# as JSON. --compare checks a run against an earlier one and exits
+# non-zero on regressions.
+#
+#   python benchmark.py --clients 1,4,8 --duration 20
+#   python benchmark.py --clients 4 --bandwidth 0,2000 --set simulation.devices.camera.fps=15
+#   python benchmark.py --compare benchmark_results/baseline.json
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+import numpy as np
+import psutil
+from websockets.asyncio.client import connect
+
+from binary_frames import FRAME_TELEMETRY, FRAME_VIDEO, VIDEO_HEADER
+
+SERVER_DIR = os.path.dirname(os.path.abspath(__file__))
+CONFIG_PATH = os.path.join(SERVER_DIR, '../config/settings.json')
+
+# Scenario metric -> True if higher is better, for --compare
+COMPARED = {
+    'video_fps': True,
+    'telemetry_hz': True,
+    'frame_latency_p95_ms': False,
+    'control_rtt_p95_ms': False,
+    'server_cpu_percent': False,
+    'server_rss_mb': False
+}
+
+METRIC_LINE = re.compile(r'^(aquabot_\w+?)_(sum|count)(\{[^}]*\})? (\S+)$')
+
+
+def percentiles(values, prefix):
+    """p50/p95/p99/max of a list of milliseconds"""
+    if not values:
+        return {f'{prefix}_p50_ms': None, f'{prefix}_p95_ms': None, f'{prefix}_p99_ms': None, f'{prefix}_max_ms': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        f'{prefix}_p50_ms': round(float(p50), 2),
+        f'{prefix}_p95_ms': round(float(p95), 2),
+        f'{prefix}_p99_ms': round(float(p99), 2),
+        f'{prefix}_max_ms': round(float(max(values)), 2)
+    }
+
+
+def set_path(config, path, value):
+    """Apply one --set key.path=value override"""
+    keys = path.split('.')
+    target = config
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    try:
+        target[keys[-1]] = json.loads(value)
+    except ValueError:
+        target[keys[-1]] = value
+
+
+def scrape_metrics(url):
+    """{'family{labels}': (sum, count)} for every histogram on /metrics"""
+    text = urllib.request.urlopen(url, timeout=5).read().decode()
+    series = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            name, kind, labels, value = match.groups()
+            entry = series.setdefault(name + (labels or ''), [0.0, 0])
+            entry[0 if kind == 'sum' else 1] = float(value)
+    return series
+
+
+def metrics_delta(before, after):
+    """Mean (ms) and count of each server histogram over the scenario"""
+    result = {}
+    for key, (total, count) in after.items():
+        old_total, old_count = before.get(key, (0.0, 0))
+        if count > old_count:
+            result[key] = {
+                'count': int(count - old_count),
+                'mean_ms': round((total - old_total) / (count - old_count) * 1000, 3)
+            }
+    return result
+
+
+class BenchmarkClient:
+    """One synthetic dashboard viewer"""
+
+    def __init__(self, url, binary, bandwidth, control_interval):
+        self.url = url
+        self.binary = binary
+        self.bandwidth = bandwidth  # bytes/s, 0 for unlimited
+        self.control_interval = control_interval
+        self.measuring = False
+        self.video_frames = 0
+        self.video_bytes = 0
+        self.telemetry = 0
+        self.frame_latency = []
+        self.control_rtt = []
+        self.pending = {}
+        self.errors = 0
+        self.websocket = None
+
+    def start_measuring(self):
+        """Count events from now on"""
+        self.measuring = True
+
+    async def run(self):
+        """Receive until cancelled, sending a control command every interval"""
+        try:
+            async with connect(self.url, max_size=None, max_queue=4) as websocket:
+                self.websocket = websocket
+                if self.binary:
+                    await websocket.send(json.dumps({'type': 'video_mode', 'mode': 'binary'}))
+                    await websocket.send(json.dumps({'type': 'telemetry_mode', 'mode': 'binary'}))
+                controller = asyncio.create_task(self.send_controls(websocket))
+                try:
+                    await self.receive(websocket)
+                finally:
+                    controller.cancel()
+                    await asyncio.gather(controller, return_exceptions=True)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Benchmark client error: {e}")
+            self.errors += 1
+
+    async def stop(self):
+        """Close with a normal closing handshake; cancelling the reader would send 1011"""
+        if self.websocket is not None:
+            await self.websocket.close()
+
+    async def send_controls(self, websocket):
+        """Alternate forward/stop commands asking for an acknowledgement"""
+        ack = 0
+        while True:
+            await asyncio.sleep(self.control_interval)
+            ack += 1
+            self.pending[ack] = time.perf_counter()
+            command = 'forward' if ack % 2 else 'stop'
+            await websocket.send(json.dumps({'type': 'control', 'command': command, 'ack': ack}))
+
+    async def receive(self, websocket):
+        """Account for every message, reading no faster than the bandwidth limit"""
+        async for message in websocket:
+            now = time.time()
+            if isinstance(message, bytes):
+                if message[0] == FRAME_VIDEO:
+                    _, _, capture_ms = VIDEO_HEADER.unpack_from(message)
+                    self.count_video(len(message), (now - capture_ms / 1000) * 1000)
+                elif message[0] == FRAME_TELEMETRY and self.measuring:
+                    self.telemetry += 1
+            else:
+                self.handle_json(message)
+
+            if self.bandwidth:
+                await asyncio.sleep(len(message) / self.bandwidth)
+
+    def handle_json(self, message):
+        """JSON telemetry, base64 video and control acknowledgements"""
+        data = json.loads(message)
+        msg_type = data.get('type')
+        if msg_type == 'control_ack':
+            sent = self.pending.pop(data.get('ack'), None)
+            if sent is not None and self.measuring:
+                self.control_rtt.append((time.perf_counter() - sent) * 1000)
+        elif msg_type == 'telemetry' and self.measuring:
+            self.telemetry += 1
+        elif msg_type == 'video':
+            self.count_video(len(message), None)
+
+    def count_video(self, size, latency_ms):
+        """One delivered video frame"""
+        if not self.measuring:
+            return
+        self.video_frames += 1
+        self.video_bytes += size
+        if latency_ms is not None:
+            self.frame_latency.append(latency_ms)
+
+
+class ServerProcess:
+    """The server running against simulated hardware in a scratch directory"""
+
+    def __init__(self, config, python=sys.executable):
+        self.directory = tempfile.mkdtemp(prefix='aquabot_bench_')
+        self.config_path = os.path.join(self.directory, 'settings.json')
+        with open(self.config_path, 'w') as f:
+            json.dump(config, f, indent=2)
+        self.port = config['websocket']['port']
+        self.python = python
+        self.process = None
+        self.log = None
+
+    def start(self, timeout=30):
+        """Start the server and wait until it accepts connections"""
+        env = dict(os.environ, AQUABOT_SIMULATE='1', AQUABOT_CONFIG=self.config_path, PYTHONUNBUFFERED='1')
+        self.log = open(os.path.join(self.directory, 'server.log'), 'w')
+        self.process = subprocess.Popen(
+            [self.python, os.path.join(SERVER_DIR, 'main.py')],
+            cwd=self.directory, env=env, stdout=self.log, stderr=subprocess.STDOUT
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"Server exited during startup, see {self.log.name}")
+            try:
+                urllib.request.urlopen(self.metrics_url, timeout=1).read()
+                return psutil.Process(self.process.pid)
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError(f"Server did not start within {timeout}s, see {self.log.name}")
+
+    @property
+    def metrics_url(self):
+        return f"http://127.0.0.1:{self.port}/metrics"
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.port}/"
+
+    def stop(self):
+        """Stop the server"""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.log:
+            self.log.close()
+
+
+async def run_scenario(server, process, clients, bandwidth_kbps, binary, warmup, duration, control_interval):
+    """Connect the clients, measure for `duration` after `warmup`, return the results"""
+    bandwidth = bandwidth_kbps * 1000 / 8
+    viewers = [BenchmarkClient(server.url, binary, bandwidth, control_interval) for _ in range(clients)]
+    tasks = [asyncio.create_task(viewer.run()) for viewer in viewers]
+    try:
+        await asyncio.sleep(warmup)
+
+        before = await asyncio.to_thread(scrape_metrics, server.metrics_url)
+        cpu_before = process.cpu_times()
+        started = time.monotonic()
+        rss = []
+        for viewer in viewers:
+            viewer.start_measuring()
+        while time.monotonic() - started < duration:
+            rss.append(process.memory_info().rss)
+            await asyncio.sleep(0.5)
+        elapsed = time.monotonic() - started
+        for viewer in viewers:
+            viewer.measuring = False
+        cpu_after = process.cpu_times()
+        after = await asyncio.to_thread(scrape_metrics, server.metrics_url)
+    finally:
+        await asyncio.gather(*(viewer.stop() for viewer in viewers), return_exceptions=True)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    cpu = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    fps = [viewer.video_frames / elapsed for viewer in viewers]
+    result = {
+        'clients': clients,
+        'bandwidth_kbps': bandwidth_kbps,
+        'binary': binary,
+        'duration': round(elapsed, 1),
+        'video_fps': round(float(np.mean(fps)), 2),
+        'video_fps_min': round(min(fps), 2),
+        'video_mbps': round(sum(viewer.video_bytes for viewer in viewers) * 8 / elapsed / 1e6, 2),
+        'telemetry_hz': round(float(np.mean([viewer.telemetry / elapsed for viewer in viewers])), 2),
+        'server_cpu_percent': round(cpu / elapsed * 100, 1),
+        'server_rss_mb': round(max(rss) / (1024 * 1024), 1),
+        'client_errors': sum(viewer.errors for viewer in viewers)
+    }
+    result.update(percentiles([ms for viewer in viewers for ms in viewer.frame_latency], 'frame_latency'))
+    result.update(percentiles([ms for viewer in viewers for ms in viewer.control_rtt], 'control_rtt'))
+    result['server_metrics'] = metrics_delta(before, after)
+    return result
+
+
+def git_commit():
+    """Commit being benchmarked, if this is a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVER_DIR,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """Print changes against a baseline run; returns the regressions"""
+    old = {(s['clients'], s['bandwidth_kbps'], s['binary']): s for s in baseline['scenarios']}
+    regressions = []
+    for scenario in results['scenarios']:
+        key = (scenario['clients'], scenario['bandwidth_kbps'], scenario['binary'])
+        reference = old.get(key)
+        if reference is None:
+            continue
+        print(f"\n{key[0]} clients, {key[1] or 'unlimited'} kbit/s, {'binary' if key[2] else 'json'}:")
+        for metric, higher_is_better in COMPARED.items():
+            new_value, old_value = scenario.get(metric), reference.get(metric)
+            if new_value is None or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = -change if higher_is_better else change
+            flag = ' REGRESSION' if worse > tolerance else ''
+            print(f"  {metric:24s} {old_value:>10} -> {new_value:>10} ({change:+.1%}){flag}")
+            if flag:
+                regressions.append((key, metric, old_value, new_value))
+    return regressions
+
+
+async def run(args, config):
+    """Run every scenario against one server process"""
+    server = ServerProcess(config)
+    print(f"Starting server on port {server.port} in {server.directory}")
+    process = server.start()
+    scenarios = []
+    try:
+        for bandwidth in args.bandwidth:
+            for clients in args.clients:
+                print(f"Scenario: {clients} clients, {bandwidth or 'unlimited'} kbit/s ...")
+                result = await run_scenario(
+                    server, process, clients, bandwidth, not args.json,
+                    args.warmup, args.duration, args.control_interval
+                )
+                print(
+                    f"  video {result['video_fps']} fps (min {result['video_fps_min']}), "
+                    f"telemetry {result['telemetry_hz']} Hz, "
+                    f"control rtt p95 {result['control_rtt_p95_ms']} ms, "
+                    f"cpu {result['server_cpu_percent']}%, rss {result['server_rss_mb']} MB"
+                )
+                scenarios.append(result)
+    finally:
+        server.stop()
+    return scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the WebSocket server against simulated hardware')
+    parser.add_argument('--clients', default='1,2,4', help='comma separated client counts, one scenario each')
+    parser.add_argument('--bandwidth', default='0', help='comma separated per-client limits in kbit/s (0 = unlimited)')
+    parser.add_argument('--json', action='store_true', help='use the JSON/base64 protocol instead of binary frames')
+    parser.add_argument('--duration', type=float, default=15, help='measured seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds before measuring each scenario')
+    parser.add_argument('--control-interval', type=float, default=0.2, help='seconds between control commands')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help='override a setting, e.g. simulation.devices.camera.fps=15')
+    parser.add_argument('--output', help='results file (default benchmark_results/benchmark_<time>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='relative change counted as a regression')
+    args = parser.parse_args()
+    args.clients = [int(n) for n in args.clients.split(',')]
+    args.bandwidth = [float(n) for n in args.bandwidth.split(',')]
+
+    with open(CONFIG_PATH) as f:
+        config = json.load(f)
+    config['websocket']['port'] = args.port
+    config.setdefault('simulation', {})['enabled'] = True
+    for override in args.set:
+        key, _, value = override.partition('=')
+        set_path(config, key, value)
+
+    results = {
+        'version': 1,
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'host': {
+            'machine': platform.machine(),
+            'python': platform.python_version(),
+            'cpus': psutil.cpu_count()
+        },
+        'settings': {
+            'duration': args.duration,
+            'warmup': args.warmup,
+            'control_interval': args.control_interval,
+            'overrides': args.set
+        },
+        'scenarios': asyncio.run(run(args, config))
+    }
+
+    output = args.output or os.path.join(
+        'benchmark_results', f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
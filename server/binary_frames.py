@@ -0,0 +1,29 @@
+# Binary WebSocket frame layouts
+#
+# Every binary frame starts with a one byte frame type so several binary
+# channels can share a connection with the JSON messages.
+import struct
+
+FRAME_VIDEO = 0x01
+FRAME_FILE_CHUNK = 0x02
+FRAME_TELEMETRY = 0x03  # layout in telemetry_protocol
+
+# type, sequence number, capture time (ms since epoch)
+VIDEO_HEADER = struct.Struct('!BIQ')
+
+# type, transfer id, chunk index
+FILE_CHUNK_HEADER = struct.Struct('!BHI')
+
+# Keep chunks small enough that a 4G link never stalls on one frame
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def pack_video_frame(sequence, capture_time, jpeg):
+    """Build a video frame from raw JPEG bytes"""
+    header = VIDEO_HEADER.pack(FRAME_VIDEO, sequence & 0xFFFFFFFF, int(capture_time * 1000))
+    return header + bytes(jpeg)
+
+
+def pack_file_chunk(transfer_id, index, payload):
+    """Build a file download chunk frame"""
+    return FILE_CHUNK_HEADER.pack(FRAME_FILE_CHUNK, transfer_id, index) + payload
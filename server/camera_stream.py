@@ -3,12 +3,23 @@ import cv2
 from picamera2 import Picamera2
 
 class CameraStream:
-    def __init__(self):
+    def __init__(self, size=(640, 480), lores_size=(320, 240)):
         self.camera = Picamera2()
-        config = self.camera.create_preview_configuration(
-            main={"format": "RGB888", "size": (640, 480)}
-        )
-        self.camera.configure(config)
+        self.has_lores = True
+        try:
+            # Second, hardware-scaled output for low bandwidth video tiers
+            config = self.camera.create_preview_configuration(
+                main={"format": "RGB888", "size": tuple(size)},
+                lores={"format": "YUV420", "size": tuple(lores_size)}
+            )
+            self.camera.configure(config)
+        except Exception as e:
+            print(f"Camera lores stream unavailable, scaling in software: {e}")
+            self.has_lores = False
+            config = self.camera.create_preview_configuration(
+                main={"format": "RGB888", "size": tuple(size)}
+            )
+            self.camera.configure(config)
         self.camera.start()
         
     def capture_frame(self):
@@ -19,6 +30,21 @@ class CameraStream:
             print(f"Camera error: {e}")
             return None
             
+    def capture_streams(self, streams):
+        """Capture the named streams ('main', 'lores') from the same request"""
+        try:
+            names = [s for s in streams if s == 'main' or (s == 'lores' and self.has_lores)]
+            if not names:
+                names = ['main']
+            arrays, _ = self.camera.capture_arrays(names)
+            frames = dict(zip(names, arrays))
+            if 'lores' in frames:
+                frames['lores'] = cv2.cvtColor(frames['lores'], cv2.COLOR_YUV420p2BGR)
+            return frames
+        except Exception as e:
+            print(f"Camera error: {e}")
+            return None
+            
     def cleanup(self):
         """Clean up camera resources"""
         self.camera.stop()
\ No newline at end of file
@@ -0,0 +1,133 @@
+# Per-client outbound queues with backpressure
+import asyncio
+import time
+from collections import deque
+
+
+class ClientConnection:
+    """Wraps one WebSocket with bounded, per-channel outbound queues.
+
+    Broadcast loops only enqueue; a writer task per client does the
+    actual sends one at a time. When a client can't keep up, the oldest
+    queued video frame is dropped (latest frame wins) and queued
+    telemetry or status is replaced by the newer one, so a slow viewer
+    never holds up the broadcast loops or other clients.
+    """
+
+    CHANNELS = ('telemetry', 'video', 'status')
+
+    def __init__(self, websocket, video_queue_size=1, telemetry_queue_size=1, send_latency=None):
+        self.websocket = websocket
+        self.remote_address = getattr(websocket, 'remote_address', None)
+        self.connected_at = time.time()
+        self.binary_video = False
+        self.binary_telemetry = False
+
+        self.queues = {
+            'telemetry': deque(maxlen=telemetry_queue_size),
+            'video': deque(maxlen=video_queue_size),
+            'status': deque(maxlen=1)  # pushed status (servos), latest wins
+        }
+        self.sent = {channel: 0 for channel in self.CHANNELS}
+        self.dropped = {channel: 0 for channel in self.CHANNELS}
+        self.bytes_sent = 0
+        self.last_send_time = None
+        self.send_ms = {channel: None for channel in self.CHANNELS}
+        self.send_latency = send_latency  # optional {channel: Histogram} shared by all clients
+        self.turn = 0
+
+        # Adaptive video state, see adaptive_video.AdaptiveQuality
+        self.video_tier = 0
+        self.quality_window = (0, 0, 0)
+        self.good_windows = 0
+
+        self.ready = asyncio.Event()
+        self.writer_task = None
+
+    def start(self):
+        """Start the writer task"""
+        self.writer_task = asyncio.create_task(self.writer())
+        return self.writer_task
+
+    async def stop(self):
+        """Stop the writer task"""
+        if self.writer_task:
+            self.writer_task.cancel()
+            try:
+                await self.writer_task
+            except asyncio.CancelledError:
+                pass
+            self.writer_task = None
+
+    def enqueue(self, channel, message):
+        """Queue a message; a full queue drops its oldest entry"""
+        queue = self.queues[channel]
+        if len(queue) == queue.maxlen:
+            self.dropped[channel] += 1
+        queue.append(message)
+        self.ready.set()
+
+    def next_message(self):
+        """Round-robin between channels so neither starves the other"""
+        for offset in range(len(self.CHANNELS)):
+            channel = self.CHANNELS[(self.turn + offset) % len(self.CHANNELS)]
+            if self.queues[channel]:
+                self.turn = (self.CHANNELS.index(channel) + 1) % len(self.CHANNELS)
+                return channel, self.queues[channel].popleft()
+        return None, None
+
+    async def writer(self):
+        """Send queued messages one at a time until the connection closes"""
+        try:
+            while True:
+                await self.ready.wait()
+                channel, message = self.next_message()
+                if channel is None:
+                    self.ready.clear()
+                    continue
+
+                start = time.monotonic()
+                await self.websocket.send(message)
+                self.last_send_time = time.monotonic() - start
+                self.track_send_time(channel, self.last_send_time * 1000)
+                if self.send_latency:
+                    self.send_latency[channel].observe(self.last_send_time * 1000)
+                self.sent[channel] += 1
+                self.bytes_sent += len(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Client writer stopped for {self.remote_address}: {e}")
+
+    def track_send_time(self, channel, elapsed_ms, alpha=0.2):
+        """Moving average of how long sends on a channel take"""
+        current = self.send_ms[channel]
+        self.send_ms[channel] = elapsed_ms if current is None else current + alpha * (elapsed_ms - current)
+
+    def write_buffer_size(self):
+        """Bytes waiting in the transport's send buffer"""
+        transport = getattr(self.websocket, 'transport', None)
+        try:
+            return transport.get_write_buffer_size() if transport else 0
+        except Exception:
+            return 0
+
+    def get_stats(self):
+        """Per-client counters"""
+        return {
+            'remote_address': str(self.remote_address),
+            'connected_for': round(time.time() - self.connected_at, 1),
+            'binary_video': self.binary_video,
+            'binary_telemetry': self.binary_telemetry,
+            'video_tier': self.video_tier,
+            'sent': dict(self.sent),
+            'dropped': dict(self.dropped),
+            'queue_depth': {channel: len(queue) for channel, queue in self.queues.items()},
+            'write_buffer': self.write_buffer_size(),
+            'bytes_sent': self.bytes_sent,
+            'last_send_ms': None if self.last_send_time is None else round(self.last_send_time * 1000, 1),
+            'send_ms': {
+                channel: None if value is None else round(value, 1)
+                for channel, value in self.send_ms.items()
+            }
+        }
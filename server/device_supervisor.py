@@ -0,0 +1,215 @@
+# Hardware handle ownership and background reconnection
+#
+# Every hardware handle (serial port, I2C sensor, pigpio connection) is
+# opened through the supervisor. Code using a device asks for the current
+# handle, gets None while it is down, and reports failures instead of
+# reconnecting inline. Reconnection happens on the supervisor's own thread
+# with exponential backoff and jitter, so a missing device never blocks the
+# event loop, the control path or the video pipeline.
+import random
+import threading
+import time
+
+
+class Device:
+    """One hardware handle and its connection state"""
+
+    def __init__(self, name, open, close=None, check=None, on_connect=None):
+        self.name = name
+        self.open = open
+        self.close = close
+        self.check = check
+        self.on_connect = on_connect
+
+        self.handle = None
+        self.failed_handle = None  # waiting to be closed on the supervisor thread
+        self.state = 'connecting'  # ok, degraded or disabled
+        self.attempts = 0
+        self.failures = 0
+        self.reconnects = 0
+        self.last_error = None
+        self.next_attempt = 0.0
+        self.last_check = time.monotonic()
+
+
+class DeviceSupervisor:
+    def __init__(self, base_delay=1.0, max_delay=60.0, check_interval=5.0):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.check_interval = check_interval
+
+        self.devices = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = False
+        self.thread = None
+
+    def add(self, name, open, close=None, check=None, on_connect=None):
+        """Register a device and make one connection attempt right away.
+
+        open() returns the handle or raises; on_connect(handle) puts the
+        hardware into a known state after every (re)connect; check(handle)
+        is an optional periodic health check returning False when broken.
+        """
+        device = Device(name, open, close, check, on_connect)
+        self.devices[name] = device
+        self.attempt(device)
+        return device
+
+    def start(self):
+        """Start the reconnection thread (safe to call more than once)"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='device-supervisor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the reconnection thread"""
+        self.running = False
+        self.wake.set()
+        if self.thread:
+            self.thread.join(timeout=2)
+            self.thread = None
+
+    def get(self, name):
+        """Current handle, or None while the device is down"""
+        device = self.devices.get(name)
+        return device.handle if device else None
+
+    def report_failure(self, name, error):
+        """Mark a device as degraded after an I/O error; reconnects in the background"""
+        device = self.devices[name]
+        with self.lock:
+            if device.handle is None:
+                return
+            device.failed_handle, device.handle = device.handle, None
+            device.state = 'degraded'
+            device.last_error = str(error)
+            device.failures += 1
+            device.attempts = 0
+            device.next_attempt = time.monotonic()
+        print(f"Device {name} failed, reconnecting in background: {error}")
+        self.wake.set()
+
+    def backoff(self, attempts):
+        """Exponential backoff with jitter so devices don't retry in lockstep"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return random.uniform(delay / 2, delay)
+
+    def attempt(self, device):
+        """Try to (re)open a device once, on the calling thread"""
+        if device.failed_handle is not None:
+            if device.close:
+                try:
+                    device.close(device.failed_handle)
+                except Exception:
+                    pass
+            device.failed_handle = None
+
+        try:
+            handle = device.open()
+        except ImportError as e:
+            # Driver library not installed; retrying won't help
+            device.state = 'disabled'
+            device.last_error = str(e)
+            print(f"Device {device.name} disabled: {e}")
+            return False
+        except Exception as e:
+            return self.attempt_failed(device, e)
+
+        try:
+            if device.on_connect:
+                device.on_connect(handle)
+        except Exception as e:
+            if device.close:
+                try:
+                    device.close(handle)
+                except Exception:
+                    pass
+            return self.attempt_failed(device, e)
+
+        with self.lock:
+            if device.state == 'degraded':
+                device.reconnects += 1
+                print(f"Device {device.name} reconnected after {device.attempts + 1} attempt(s)")
+            device.handle = handle
+            device.state = 'ok'
+            device.attempts = 0
+            device.last_check = time.monotonic()
+        return True
+
+    def attempt_failed(self, device, error):
+        """Schedule the next attempt after a failed open"""
+        device.attempts += 1
+        device.state = 'degraded'
+        device.last_error = str(error)
+        delay = self.backoff(device.attempts)
+        device.next_attempt = time.monotonic() + delay
+        print(f"Device {device.name} unavailable ({error}), retrying in {delay:.1f}s")
+        return False
+
+    def run(self):
+        """Reconnect degraded devices when due and health-check healthy ones"""
+        while self.running:
+            now = time.monotonic()
+            for device in list(self.devices.values()):
+                if device.state == 'degraded' and device.handle is None and now >= device.next_attempt:
+                    self.attempt(device)
+                elif device.state == 'ok' and device.check and now - device.last_check >= self.check_interval:
+                    device.last_check = now
+                    handle = device.handle
+                    try:
+                        healthy = device.check(handle)
+                        error = 'health check failed'
+                    except Exception as e:
+                        healthy = False
+                        error = e
+                    if not healthy:
+                        self.report_failure(device.name, error)
+
+            self.wake.wait(0.2)
+            self.wake.clear()
+
+    def degraded(self):
+        """Names of devices that are not currently usable"""
+        return [name for name, device in self.devices.items() if device.state != 'ok']
+
+    def get_status(self):
+        """Per-device state, errors and time to the next reconnect attempt"""
+        now = time.monotonic()
+        return {
+            name: {
+                'state': device.state,
+                'last_error': device.last_error,
+                'failures': device.failures,
+                'reconnects': device.reconnects,
+                'attempts': device.attempts,
+                'retry_in': (
+                    round(max(0.0, device.next_attempt - now), 1)
+                    if device.state == 'degraded' else None
+                )
+            }
+            for name, device in self.devices.items()
+        }
+
+
+def open_pigpio():
+    """Connect to the local pigpio daemon"""
+    import pigpio
+    pi = pigpio.pi()
+    if not pi.connected:
+        pi.stop()
+        raise RuntimeError("Failed to connect to pigpio daemon. Is 'pigpiod' running?")
+    return pi
+
+
+def close_pigpio(pi):
+    """Close a pigpio connection"""
+    pi.stop()
+
+
+def check_pigpio(pi):
+    """pigpio connection is still up"""
+    pi.get_current_tick()
+    return bool(pi.connected)
@@ -0,0 +1,75 @@
+# Fixed-bucket latency histogram
+import threading
+from bisect import bisect_left
+
+# Bucket upper bounds in milliseconds
+DEFAULT_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+# For steps that normally take well under a millisecond (serializing, message handling)
+FAST_BOUNDS_MS = (0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+class Histogram:
+    """Counts observations into fixed buckets.
+
+    observe() is O(log buckets) and safe to call from worker threads, so
+    it can sit on hot paths; percentiles are estimated from the buckets
+    only when stats are requested.
+    """
+
+    def __init__(self, bounds=DEFAULT_BOUNDS_MS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        """Add one observation"""
+        index = bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations"""
+        with self.lock:
+            counts = list(self.counts)
+            total = self.count
+            largest = self.max
+        if total == 0:
+            return None
+
+        target = fraction * total
+        running = 0
+        for index, count in enumerate(counts):
+            running += count
+            if running >= target:
+                return self.bounds[index] if index < len(self.bounds) else largest
+        return largest
+
+    def cumulative(self):
+        """(upper bound, cumulative count) pairs, ending with +Inf"""
+        with self.lock:
+            counts = list(self.counts)
+        pairs = []
+        running = 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+    def get_stats(self):
+        """Count, mean, max and estimated percentiles"""
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 2) if self.count else None,
+            'max': round(self.max, 2),
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99)
+        }
@@ -0,0 +1,204 @@
+# IMU calibration: estimation, storage and the precomputed correction
+#
+# A calibration holds the gyro bias (with an optional linear temperature
+# coefficient) and per-axis accelerometer offsets and scale factors. All
+# of it, together with the raw register scaling, is folded into one
+# affine map from the 7 raw register values (accel xyz, temperature,
+# gyro xyz) to corrected physical units, so applying it costs a single
+# matrix multiply per batch whether or not the IMU is calibrated.
+import json
+import os
+import time
+
+import numpy as np
+
+GRAVITY = 9.80665
+
+# MPU6050 temperature register: degrees C = raw / 340 + 36.53
+TEMP_SCALE = 1 / 340.0
+TEMP_OFFSET = 36.53
+
+# A pose or bias measurement is rejected if the sensor moved while it was taken
+MAX_GYRO_STD = 0.5    # deg/s
+MAX_ACCEL_STD = 0.05  # g
+
+
+def default_calibration():
+    """Identity calibration"""
+    return {
+        'gyro_bias': [0.0, 0.0, 0.0],
+        'gyro_temp_coeff': [0.0, 0.0, 0.0],
+        'reference_temp': 25.0,
+        'accel_offset': [0.0, 0.0, 0.0],
+        'accel_scale': [1.0, 1.0, 1.0],
+        'calibrated_at': None
+    }
+
+
+def correction_matrix(calibration, accel_scale, gyro_scale):
+    """Affine map (M, c) so that raw (N x 7) @ M.T + c = [accel, temp, gyro]
+
+    accel_scale and gyro_scale convert register counts to m/s^2 and deg/s
+    for the configured ranges.
+    """
+    matrix = np.zeros((7, 7))
+    constant = np.zeros(7)
+
+    for axis in range(3):
+        s = calibration['accel_scale'][axis]
+        matrix[axis, axis] = s * accel_scale
+        constant[axis] = -s * calibration['accel_offset'][axis]
+
+    matrix[3, 3] = TEMP_SCALE
+    constant[3] = TEMP_OFFSET
+
+    # bias(T) = bias + coeff * (T - reference) and T is itself affine in the raw value
+    for axis in range(3):
+        row = 4 + axis
+        coeff = calibration['gyro_temp_coeff'][axis]
+        matrix[row, row] = gyro_scale
+        matrix[row, 3] = -coeff * TEMP_SCALE
+        constant[row] = -calibration['gyro_bias'][axis] - coeff * (TEMP_OFFSET - calibration['reference_temp'])
+
+    return matrix, constant
+
+
+def check_stationary(accel, gyro):
+    """Raise ValueError if the samples show the sensor moving"""
+    gyro_std = float(np.max(np.std(gyro, axis=0)))
+    accel_std = float(np.max(np.std(accel, axis=0))) / GRAVITY
+    if gyro_std > MAX_GYRO_STD or accel_std > MAX_ACCEL_STD:
+        raise ValueError(
+            f"IMU was moving (gyro std {gyro_std:.2f} deg/s, accel std {accel_std:.3f} g); "
+            "keep it still and try again"
+        )
+
+
+def fit_accel(poses):
+    """Offsets and scale factors from mean accelerometer readings in several poses.
+
+    Six or more well spread poses fit an axis-aligned ellipsoid (offset and
+    scale per axis); four or five fit a sphere (offset per axis, one scale).
+    """
+    a = np.asarray(poses, dtype=np.float64) / GRAVITY  # in g
+    if len(a) >= 6:
+        # P x^2 + Q y^2 + R z^2 + S x + T y + U z = 1
+        design = np.hstack([a ** 2, a])
+        coeffs, *_ = np.linalg.lstsq(design, np.ones(len(a)), rcond=None)
+        quadratic, linear = coeffs[:3], coeffs[3:]
+        if np.any(quadratic <= 0):
+            raise ValueError('Accelerometer poses do not cover enough orientations')
+        offset = -linear / (2 * quadratic)
+        g = 1 + np.sum(linear ** 2 / (4 * quadratic))
+        radius = np.sqrt(g / quadratic)
+    elif len(a) >= 4:
+        # x^2 + y^2 + z^2 = 2 o . v + (r^2 - |o|^2)
+        design = np.hstack([2 * a, np.ones((len(a), 1))])
+        coeffs, *_ = np.linalg.lstsq(design, np.sum(a ** 2, axis=1), rcond=None)
+        offset = coeffs[:3]
+        radius = np.full(3, np.sqrt(coeffs[3] + np.sum(offset ** 2)))
+    else:
+        raise ValueError('At least 4 accelerometer poses are needed')
+
+    return (offset * GRAVITY).tolist(), (1 / radius).tolist()
+
+
+def fit_gyro(measurements):
+    """Gyro bias at the reference temperature and a linear temperature coefficient"""
+    temps = np.array([m['temp'] for m in measurements])
+    biases = np.array([m['bias'] for m in measurements])
+    reference = float(temps.mean())
+
+    if len(measurements) >= 2 and np.ptp(temps) >= 5.0:
+        # Enough spread to fit bias = b0 + k (T - reference) per axis
+        x = temps - reference
+        coeff = (x @ (biases - biases.mean(axis=0))) / (x @ x)
+        return biases.mean(axis=0).tolist(), coeff.tolist(), reference
+
+    return biases.mean(axis=0).tolist(), [0.0, 0.0, 0.0], reference
+
+
+class IMUCalibration:
+    """Calibration session state and persistence"""
+
+    def __init__(self, path):
+        self.path = path
+        self.calibration = self.load()
+        self.gyro_measurements = []
+        self.accel_poses = []
+
+    def load(self):
+        """Stored calibration, or the identity if none was saved"""
+        calibration = default_calibration()
+        try:
+            with open(self.path) as f:
+                calibration.update(json.load(f))
+            print(f"Loaded IMU calibration from {self.path}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"IMU calibration load error: {e}")
+        return calibration
+
+    def save(self):
+        """Write the calibration atomically"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.calibration, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def add_gyro(self, accel, gyro, temps):
+        """Record one stationary gyro bias measurement (uncorrected samples)"""
+        check_stationary(accel, gyro)
+        self.gyro_measurements.append({
+            'bias': np.mean(gyro, axis=0).tolist(),
+            'temp': float(np.mean(temps))
+        })
+        return self.gyro_measurements[-1]
+
+    def add_accel_pose(self, accel, gyro):
+        """Record the mean accelerometer reading for one stationary pose"""
+        check_stationary(accel, gyro)
+        self.accel_poses.append(np.mean(accel, axis=0).tolist())
+        return self.accel_poses[-1]
+
+    def finish(self):
+        """Solve for whatever was measured, keep the rest, and save"""
+        calibration = dict(self.calibration)
+        if self.gyro_measurements:
+            bias, coeff, reference = fit_gyro(self.gyro_measurements)
+            calibration.update(gyro_bias=bias, gyro_temp_coeff=coeff, reference_temp=reference)
+        if self.accel_poses:
+            offset, scale = fit_accel(self.accel_poses)
+            calibration.update(accel_offset=offset, accel_scale=scale)
+
+        calibration['calibrated_at'] = time.time()
+        self.calibration = calibration
+        self.save()
+        self.reset_session()
+        return calibration
+
+    def clear(self):
+        """Go back to the identity calibration and remove the stored file"""
+        self.calibration = default_calibration()
+        self.reset_session()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    def reset_session(self):
+        """Drop measurements not yet solved for"""
+        self.gyro_measurements = []
+        self.accel_poses = []
+
+    def get_status(self):
+        """Current calibration and the measurements collected so far"""
+        return {
+            'calibration': self.calibration,
+            'gyro_measurements': len(self.gyro_measurements),
+            'accel_poses': len(self.accel_poses)
+        }
@@ -0,0 +1,121 @@
+# Orientation from batches of IMU samples
+#
+# A complementary filter blends the integrated gyro rates (smooth, but
+# drifting) with the tilt implied by gravity in the accelerometer (noisy,
+# but drift free). The filter is a first-order linear recurrence, so a
+# whole batch is solved at once with cumulative products and sums instead
+# of a Python loop per sample. The MPU6050 has no magnetometer, so yaw is
+# integrated gyro only and is relative to the heading at startup.
+import math
+
+import numpy as np
+
+GRAVITY = 9.80665
+
+
+def accel_angles(accel):
+    """Roll and pitch (radians) implied by gravity, one row per sample"""
+    ax, ay, az = accel[:, 0], accel[:, 1], accel[:, 2]
+    roll = np.arctan2(ay, az)
+    pitch = np.arctan2(-ax, np.hypot(ay, az))
+    return roll, pitch
+
+
+def euler_rates(gyro, roll, pitch):
+    """Body rates (rad/s) to roll, pitch and yaw rates at the given attitude"""
+    gx, gy, gz = gyro[:, 0], gyro[:, 1], gyro[:, 2]
+    sin_r, cos_r = math.sin(roll), math.cos(roll)
+    cos_p = max(math.cos(pitch), 1e-3)
+    tan_p = math.sin(pitch) / cos_p
+
+    roll_rate = gx + (gy * sin_r + gz * cos_r) * tan_p
+    pitch_rate = gy * cos_r - gz * sin_r
+    yaw_rate = (gy * sin_r + gz * cos_r) / cos_p
+    return roll_rate, pitch_rate, yaw_rate
+
+
+def blend(angle0, rate, measured, dt, gain):
+    """Solve angle[k] = gain[k] * (angle[k-1] + rate[k] * dt[k]) + (1 - gain[k]) * measured[k]
+
+    With y[k] = a[k] y[k-1] + b[k], y[k] = P[k] (y0 + sum(b[j] / P[j])),
+    P being the running product of a. Gains are >= alpha, so P stays well
+    away from zero for batch sizes this filter sees.
+    """
+    b = gain * rate * dt + (1 - gain) * measured
+    product = np.cumprod(gain)
+    return product * (angle0 + np.cumsum(b / product))
+
+
+def quaternion(roll, pitch, yaw):
+    """Euler angles (radians, ZYX) to a unit quaternion (w, x, y, z)"""
+    cr, sr = math.cos(roll / 2), math.sin(roll / 2)
+    cp, sp = math.cos(pitch / 2), math.sin(pitch / 2)
+    cy, sy = math.cos(yaw / 2), math.sin(yaw / 2)
+    return (
+        cr * cp * cy + sr * sp * sy,
+        sr * cp * cy - cr * sp * sy,
+        cr * sp * cy + sr * cp * sy,
+        cr * cp * sy - sr * sp * cy
+    )
+
+
+class ComplementaryFilter:
+    def __init__(self, alpha=0.98, accel_gate=0.15):
+        self.alpha = alpha
+        self.accel_gate = accel_gate  # ignore accel tilt when |a| is off 1 g by more than this
+        self.roll = None
+        self.pitch = None
+        self.yaw = 0.0
+        self.last_time = None
+
+    def reset(self):
+        """Start over from the next batch's accelerometer tilt"""
+        self.roll = None
+        self.pitch = None
+        self.yaw = 0.0
+        self.last_time = None
+
+    def update(self, times, accel, gyro):
+        """Fold in a batch: times (s), accel (m/s^2, N x 3), gyro (deg/s, N x 3)"""
+        accel = np.asarray(accel, dtype=np.float64)
+        gyro = np.radians(np.asarray(gyro, dtype=np.float64))
+        times = np.asarray(times, dtype=np.float64)
+
+        measured_roll, measured_pitch = accel_angles(accel)
+        if self.roll is None:
+            self.roll = float(measured_roll[0])
+            self.pitch = float(measured_pitch[0])
+            self.last_time = times[0]
+
+        dt = np.diff(times, prepend=self.last_time)
+        self.last_time = times[-1]
+
+        # While the boat accelerates or slams into waves the accelerometer
+        # doesn't point at gravity; trust only the gyro for those samples
+        norm = np.linalg.norm(accel, axis=1) / GRAVITY
+        gain = np.where(np.abs(norm - 1) > self.accel_gate, 1.0, self.alpha)
+
+        # Attitude changes little within a batch, so the rate conversion
+        # uses the attitude at the start of the batch
+        roll_rate, pitch_rate, yaw_rate = euler_rates(gyro, self.roll, self.pitch)
+
+        roll = blend(self.roll, roll_rate, measured_roll, dt, gain)
+        pitch = blend(self.pitch, pitch_rate, measured_pitch, dt, gain)
+        self.roll = float(roll[-1])
+        self.pitch = float(pitch[-1])
+        self.yaw = math.remainder(self.yaw + float(np.dot(yaw_rate, dt)), 2 * math.pi)
+        return self.get_orientation()
+
+    def get_orientation(self):
+        """Roll, pitch, yaw in degrees and the matching quaternion"""
+        if self.roll is None:
+            return None
+        w, x, y, z = quaternion(self.roll, self.pitch, self.yaw)
+        return {
+            'roll': round(math.degrees(self.roll), 2),
+            'pitch': round(math.degrees(self.pitch), 2),
+            'yaw': round(math.degrees(self.yaw), 2),
+            'quaternion': {
+                'w': round(w, 4), 'x': round(x, 4), 'y': round(y, 4), 'z': round(z, 4)
+            }
+        }
@@ -1,33 +1,243 @@
 # MPU6050 sensor reading
+import struct
+import threading
+import time
+
 import board
 import busio
+import numpy as np
 from mpu6050 import mpu6050
 
+from device_supervisor import DeviceSupervisor
+from imu_fusion import ComplementaryFilter, GRAVITY
+from imu_calibration import IMUCalibration, TEMP_OFFSET, TEMP_SCALE, correction_matrix, default_calibration
+
+# MPU6050 registers
+ACCEL_XOUT_H = 0x3B  # accel x/y/z, temperature, gyro x/y/z: 14 bytes big-endian
+CONFIG = 0x1A        # digital low-pass filter setting
+SAMPLE = struct.Struct('>7h')
+
+ACCEL_LSB_PER_G = {2: 16384.0, 4: 8192.0, 8: 4096.0, 16: 2048.0}
+GYRO_LSB_PER_DPS = {250: 131.0, 500: 65.5, 1000: 32.8, 2000: 16.4}
+
 class IMUReader:
-    def __init__(self):
+    """Samples the MPU6050 at a high rate on its own thread.
+
+    Every sample is a single 14 byte burst read of the accel, temperature
+    and gyro registers, kept as raw counts. Once per batch the counts are
+    scaled and calibrated with one precomputed affine map (see
+    imu_calibration), the orientation filter runs over the whole batch
+    with NumPy, and the batch-averaged readings plus roll/pitch/yaw are
+    published; read() returns the latest of those.
+    """
+
+    def __init__(self, config=None, devices=None):
+        config = config or {}
+        self.sample_rate = config.get('sample_rate', 200)
+        self.batch = max(2, int(round(self.sample_rate / config.get('fusion_rate', 20))))
+        self.dlpf = config.get('dlpf', 3)  # ~44 Hz bandwidth, well below half the sample rate
+        self.filter = ComplementaryFilter(config.get('alpha', 0.98), config.get('accel_gate', 0.15))
+        
         self.i2c = busio.I2C(board.SCL, board.SDA)
-        self.mpu = mpu6050(0x68)
+        self.accel_scale = GRAVITY / ACCEL_LSB_PER_G[2]
+        self.gyro_scale = 1 / GYRO_LSB_PER_DPS[250]
+        
+        # Stored calibration is applied from the first sample; no startup pause
+        self.calibration = IMUCalibration(config.get('calibration_file', 'imu_calibration.json'))
+        self.update_correction()
+        self.collector = None
+        
+        # Batch buffers, reused for every batch: time and raw counts
+        # (accel xyz, temperature, gyro xyz)
+        self.times = np.zeros(self.batch)
+        self.raw = np.zeros((self.batch, 7))
         
+        self.latest = None
+        self.lock = threading.Lock()
+        self.samples = 0
+        self.measured_rate = None
+        
+        # The supervisor owns the sensor handle and reconnects it in the background
+        self.devices = devices or DeviceSupervisor()
+        self.devices.add('imu', lambda: mpu6050(0x68), on_connect=self.setup_sensor)
+        self.devices.start()
+        
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='imu-sampler', daemon=True)
+        self.thread.start()
+
+    def setup_sensor(self, mpu):
+        """Set the low-pass filter and cache the range scale factors after every (re)connect"""
+        if hasattr(mpu, 'bus'):
+            mpu.bus.write_byte_data(mpu.address, CONFIG, self.dlpf)
+            self.accel_scale = GRAVITY / ACCEL_LSB_PER_G.get(mpu.read_accel_range(), ACCEL_LSB_PER_G[2])
+            self.gyro_scale = 1 / GYRO_LSB_PER_DPS.get(mpu.read_gyro_range(), GYRO_LSB_PER_DPS[250])
+        self.update_correction()
+        self.filter.reset()
+        
+    def update_correction(self):
+        """Precompute the raw -> corrected map for the current ranges and calibration"""
+        self.correction = correction_matrix(self.calibration.calibration, self.accel_scale, self.gyro_scale)
+        self.uncorrected = correction_matrix(default_calibration(), self.accel_scale, self.gyro_scale)
+
+    def read_sample(self, mpu):
+        """One sample as raw counts: accel xyz, temperature, gyro xyz"""
+        if not hasattr(mpu, 'bus'):
+            # Drivers without raw bus access (e.g. simulated sensors) report
+            # physical units; convert back so there is one correction path
+            accel = mpu.get_accel_data()
+            gyro = mpu.get_gyro_data()
+            a = self.accel_scale
+            g = self.gyro_scale
+            return (
+                accel['x'] / a, accel['y'] / a, accel['z'] / a,
+                (mpu.get_temp() - TEMP_OFFSET) / TEMP_SCALE,
+                gyro['x'] / g, gyro['y'] / g, gyro['z'] / g
+            )
+        
+        return SAMPLE.unpack(bytes(mpu.bus.read_i2c_block_data(mpu.address, ACCEL_XOUT_H, 14)))
+
+    def run(self):
+        """Sample at sample_rate and publish once per batch"""
+        interval = 1.0 / self.sample_rate
+        deadline = time.monotonic()
+        index = 0
+        while self.running:
+            mpu = self.devices.get('imu')
+            if mpu is None:
+                index = 0
+                time.sleep(0.1)
+                deadline = time.monotonic()
+                continue
+            
+            try:
+                sample = self.read_sample(mpu)
+            except Exception as e:
+                print(f"IMU read error: {e}")
+                self.devices.report_failure('imu', e)
+                index = 0
+                continue
+            
+            self.times[index] = time.monotonic()
+            self.raw[index] = sample
+            self.samples += 1
+            index += 1
+            
+            if index == self.batch:
+                self.publish()
+                index = 0
+            
+            deadline += interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()
+
+    def publish(self):
+        """Correct the batch, run the filter over it and publish averaged readings"""
+        matrix, constant = self.correction
+        values = self.raw @ matrix.T + constant
+        accel = values[:, 0:3]
+        gyro = values[:, 4:7]
+        
+        collector = self.collector
+        if collector is not None:
+            collector.add(self.raw @ self.uncorrected[0].T + self.uncorrected[1])
+        
+        orientation = self.filter.update(self.times, accel, gyro)
+        temp = values[:, 3].mean()
+        accel = accel.mean(axis=0)
+        gyro = gyro.mean(axis=0)
+        span = self.times[-1] - self.times[0]
+        self.measured_rate = round(float((self.batch - 1) / span), 1) if span > 0 else None
+        
+        state = {
+            'accel': {
+                'x': round(float(accel[0]), 2),
+                'y': round(float(accel[1]), 2),
+                'z': round(float(accel[2]), 2)
+            },
+            'gyro': {
+                'x': round(float(gyro[0]), 2),
+                'y': round(float(gyro[1]), 2),
+                'z': round(float(gyro[2]), 2)
+            },
+            'temp': round(float(temp), 1),
+            'calibrated': self.calibration.calibration['calibrated_at'] is not None,
+            'orientation': orientation,
+            'sample_rate': self.measured_rate
+        }
+        with self.lock:
+            self.latest = state
+
     def read(self):
-        """Read IMU data"""
+        """Latest fused IMU state (None while the sensor is unavailable)"""
+        if self.devices.get('imu') is None:
+            return None
+        with self.lock:
+            return self.latest
+
+    def collect(self, seconds):
+        """Block for `seconds` and return uncorrected (accel, gyro, temps) samples"""
+        if self.devices.get('imu') is None:
+            raise RuntimeError('IMU unavailable')
+        collector = SampleCollector(int(seconds * self.sample_rate))
+        with self.lock:
+            if self.collector is not None:
+                raise RuntimeError('Another calibration step is already running')
+            self.collector = collector
         try:
-            accel = self.mpu.get_accel_data()
-            gyro = self.mpu.get_gyro_data()
-            temp = self.mpu.get_temp()
-            
-            return {
-                'accel': {
-                    'x': round(accel['x'], 2),
-                    'y': round(accel['y'], 2),
-                    'z': round(accel['z'], 2)
-                },
-                'gyro': {
-                    'x': round(gyro['x'], 2),
-                    'y': round(gyro['y'], 2),
-                    'z': round(gyro['z'], 2)
-                },
-                'temp': round(temp, 1)
-            }
-        except Exception as e:
-            print(f"IMU read error: {e}")
-            return None
\ No newline at end of file
+            if not collector.done.wait(seconds * 2 + 1):
+                raise RuntimeError('IMU stopped producing samples')
+        finally:
+            self.collector = None
+        values = np.concatenate(collector.batches)
+        return values[:, 0:3], values[:, 4:7], values[:, 3]
+        
+    def calibrate(self, command, seconds=3.0):
+        """Run one calibration step; returns the calibration status"""
+        if command == 'gyro':
+            # Keep the IMU still
+            self.calibration.add_gyro(*self.collect(seconds))
+        elif command == 'accel_pose':
+            # Hold the IMU still in a new orientation (ideally each face up and down)
+            accel, gyro, _ = self.collect(seconds)
+            self.calibration.add_accel_pose(accel, gyro)
+        elif command == 'finish':
+            self.calibration.finish()
+            self.update_correction()
+            self.filter.reset()
+        elif command == 'cancel':
+            self.calibration.reset_session()
+        elif command == 'clear':
+            self.calibration.clear()
+            self.update_correction()
+            self.filter.reset()
+        elif command != 'status':
+            raise ValueError(f"Unknown calibration command: {command}")
+        return self.calibration.get_status()
+        
+    def cleanup(self):
+        """Stop the sampling thread"""
+        self.running = False
+        self.thread.join(timeout=1)
+
+
+class SampleCollector:
+    """Gathers uncorrected batches for a calibration measurement"""
+
+    def __init__(self, count):
+        self.count = count
+        self.batches = []
+        self.collected = 0
+        self.done = threading.Event()
+
+    def add(self, values):
+        """Called from the sampling thread with one batch"""
+        if self.done.is_set():
+            return
+        self.batches.append(values.copy())
+        self.collected += len(values)
+        if self.collected >= self.count:
+            self.done.set()
@@ -0,0 +1,167 @@
+# Resource sampling for long-running soak tests
+#
+# Enabled with soak.enabled (or AQUABOT_SOAK=1). Every `interval` seconds
+# one JSON line is appended to soak/soak_<time>.jsonl with the process
+# RSS, open file descriptors, threads, asyncio tasks, GC-tracked objects,
+# event loop lag over the interval and the sizes of the server's own
+# containers (connections, background tasks, queues...). tracemalloc runs
+# the whole time; every `snapshot_interval` seconds the heap is compared
+# with a snapshot taken after `warmup` and the call sites that grew most
+# are written with their tracebacks. soak_test.py drives churning clients
+# against a simulated server and turns the file into a report.
+import asyncio
+import gc
+import json
+import os
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import psutil
+
+# Frames kept per allocation; enough to get from json/asyncio internals
+# back to the server code that caused them
+DEFAULT_FRAMES = 10
+
+IGNORED_FILES = [tracemalloc.__file__, '<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>', '<unknown>']
+
+
+def enabled(config):
+    """Soak instrumentation requested by AQUABOT_SOAK or the soak.enabled setting"""
+    env = os.environ.get('AQUABOT_SOAK')
+    if env is not None:
+        return env.lower() in ('1', 'true', 'yes', 'on')
+    return bool(config.get('soak', {}).get('enabled', False))
+
+
+def interval_lag(histogram, previous):
+    """Mean and p99 (bucket bound, ms) of the observations since `previous` (count, sum, buckets)"""
+    buckets = histogram.cumulative()
+    count, total = histogram.count, histogram.sum
+    old_count, old_total, old_buckets = previous or (0, 0.0, [(bound, 0) for bound, _ in buckets])
+    current = (count, total, buckets)
+    observed = count - old_count
+    if observed <= 0:
+        return None, None, current
+
+    p99 = None
+    for (bound, running), (_, old_running) in zip(buckets, old_buckets):
+        if running - old_running >= 0.99 * observed:
+            p99 = bound if bound != float('inf') else histogram.max
+            break
+    return round((total - old_total) / observed, 2), p99, current
+
+
+def allocation_site(traceback, root):
+    """Innermost frame in the server's own code, or the innermost frame"""
+    for frame in reversed(traceback):
+        if frame.filename.startswith(root):
+            return f"{os.path.relpath(frame.filename, root)}:{frame.lineno}"
+    frame = traceback[-1]
+    return f"{frame.filename}:{frame.lineno}"
+
+
+class LeakMonitor:
+    def __init__(self, config, probes=None, loop_lag=None):
+        self.interval = config.get('interval', 30)
+        self.snapshot_interval = config.get('snapshot_interval', 300)
+        self.warmup = config.get('warmup', 300)
+        self.top_sites = config.get('top_sites', 15)
+        self.frames = config.get('frames', DEFAULT_FRAMES)
+        self.path = config.get('file') or os.path.join(
+            config.get('dir', 'soak'), f"soak_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        self.probes = probes or {}
+        self.loop_lag = loop_lag  # Histogram of event loop lag in ms
+        self.root = os.path.dirname(os.path.abspath(__file__))
+        self.process = psutil.Process()
+        self.start = time.monotonic()
+        self.baseline = None
+        self.last_snapshot = None
+        self.lag_state = None
+        self.samples = 0
+
+        # Tracing slows allocation-heavy code several-fold; frames 0 keeps only the counters
+        if self.frames and not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+
+    def sample(self):
+        """One row of resource counters; probes and task counts are read on the loop"""
+        memory = self.process.memory_info()
+        traced, traced_peak = tracemalloc.get_traced_memory()  # zeros when not tracing
+        row = {
+            't': round(time.monotonic() - self.start, 1),
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'warmup': self.baseline is None,
+            'rss_mb': round(memory.rss / (1024 * 1024), 2),
+            'traced_mb': round(traced / (1024 * 1024), 2),
+            'traced_peak_mb': round(traced_peak / (1024 * 1024), 2),
+            'fds': self.process.num_fds(),
+            'threads': threading.active_count(),
+            'tasks': len(asyncio.all_tasks()),
+            'gc_objects': len(gc.get_objects())
+        }
+        if self.loop_lag is not None:
+            row['loop_lag_mean_ms'], row['loop_lag_p99_ms'], self.lag_state = interval_lag(self.loop_lag, self.lag_state)
+
+        for name, probe in self.probes.items():
+            try:
+                row[name] = probe()
+            except Exception as e:
+                print(f"Soak probe error ({name}): {e}")
+        return row
+
+    def compare(self):
+        """Call sites that grew most since the baseline snapshot (blocking, seconds on a big heap)"""
+        stats = tracemalloc.take_snapshot().compare_to(self.baseline, 'traceback')
+        # Cheaper than filter_traces() on every trace of both snapshots
+        growing = [
+            stat for stat in stats
+            if stat.size_diff > 0 and stat.traceback[-1].filename not in IGNORED_FILES
+        ][:self.top_sites]
+        return [
+            {
+                'site': allocation_site(stat.traceback, self.root),
+                'size_kb': round(stat.size / 1024, 1),
+                'size_diff_kb': round(stat.size_diff / 1024, 1),
+                'count_diff': stat.count_diff,
+                'traceback': [f"{frame.filename}:{frame.lineno}" for frame in reversed(stat.traceback)]
+            }
+            for stat in growing
+        ]
+
+    def write(self, row):
+        """Append one row to the results file"""
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(row) + '\n')
+        self.samples += 1
+
+    async def run(self):
+        """Sample every interval; take the baseline after warmup, then compare snapshots"""
+        print(f"Soak monitor writing to {self.path} every {self.interval}s")
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                row = self.sample()
+                elapsed = time.monotonic() - self.start
+
+                if not tracemalloc.is_tracing():
+                    row['warmup'] = elapsed < self.warmup
+                elif self.baseline is None and elapsed >= self.warmup:
+                    self.baseline = await asyncio.to_thread(tracemalloc.take_snapshot)
+                    self.last_snapshot = elapsed
+                    row['baseline'] = True
+                elif self.baseline is not None and elapsed - self.last_snapshot >= self.snapshot_interval:
+                    started = time.monotonic()
+                    row['allocations'] = await asyncio.to_thread(self.compare)
+                    row['snapshot_seconds'] = round(time.monotonic() - started, 2)
+                    self.last_snapshot = elapsed
+
+                await asyncio.to_thread(self.write, row)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Soak monitor error: {e}")
@@ -5,17 +5,25 @@ import os
 from datetime import datetime, timezone
 import uuid
 
+from sample_store import SampleStore
+
+# Export progress is reported every this many samples
+PROGRESS_INTERVAL = 1000
+
 class DataLogger:
     def __init__(self, config):
         self.csv_file = config['csv_file']
         self.json_file = config.get('json_file', 'water_samples.json')
+        self.db_file = config.get('db_file', os.path.splitext(self.json_file)[0] + '.db')
         self.samples_dir = config.get('samples_dir', 'samples')
         
         # Create samples directory if it doesn't exist
         os.makedirs(self.samples_dir, exist_ok=True)
         
+        self.store = SampleStore(self.db_file)
+        
         self.setup_csv()
-        self.setup_json()
+        self.migrate_json()
         
     def setup_csv(self):
         """Setup CSV file with headers if it doesn't exist"""
@@ -28,19 +36,22 @@ class DataLogger:
                     'air_temp', 'battery_voltage', 'weather_conditions'
                 ])
                 
-    def setup_json(self):
-        """Setup JSON file for sample metadata"""
+    def migrate_json(self):
+        """One-time import of the legacy JSON sample file into the store"""
         if not os.path.exists(self.json_file):
-            initial_data = {
-                'metadata': {
-                    'created': datetime.now(timezone.utc).isoformat(),
-                    'version': '1.0',
-                    'boat_id': 'aquabot-001'
-                },
-                'samples': []
-            }
-            with open(self.json_file, 'w') as f:
-                json.dump(initial_data, f, indent=2)
+            return
+            
+        try:
+            imported = self.store.import_json(self.json_file)
+            
+            # Keep the original file around, but never import it twice
+            migrated_file = self.json_file + '.migrated'
+            os.replace(self.json_file, migrated_file)
+            self.store.set_meta('migrated_from', os.path.abspath(migrated_file))
+            print(f"Migrated {imported} samples from {self.json_file} to {self.db_file}")
+            
+        except Exception as e:
+            print(f"Sample migration error: {e}")
                 
     def log_sample(self, pump_id, duration, location, **kwargs):
         """Enhanced sample logging with additional data"""
@@ -75,7 +86,7 @@ class DataLogger:
                     weather
                 ])
             
-            # Log to JSON
+            # Log to sample store
             sample_data = {
                 'sample_id': sample_id,
                 'timestamp': timestamp.isoformat(),
@@ -98,18 +109,8 @@ class DataLogger:
                 'status': 'collected'
             }
             
-            # Read existing JSON data
-            with open(self.json_file, 'r') as f:
-                data = json.load(f)
-            
-            # Add new sample
-            data['samples'].append(sample_data)
-            data['metadata']['last_updated'] = timestamp.isoformat()
-            data['metadata']['total_samples'] = len(data['samples'])
-            
-            # Write back to JSON
-            with open(self.json_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            # Append to the sample store (single fsync'd insert)
+            self.store.append(sample_data)
             
             print(f"Logged sample {sample_id} from pump {pump_id} at {location}")
             return sample_id
@@ -121,30 +122,56 @@ class DataLogger:
     def get_samples(self, limit=None):
         """Get all samples or limited number"""
         try:
-            with open(self.json_file, 'r') as f:
-                data = json.load(f)
-            
-            samples = data.get('samples', [])
-            if limit:
-                samples = samples[-limit:]  # Get most recent
-                
-            return samples
+            return self.store.get_samples(limit)
         except Exception as e:
             print(f"Error reading samples: {e}")
             return []
     
-    def export_samples_csv(self, filename=None):
-        """Export samples to downloadable CSV"""
+    def get_all_samples(self):
+        """Get all samples as flat records for the dashboard"""
+        return [self.flatten_sample(s) for s in self.get_samples()]
+    
+    def query_samples(self, **filters):
+        """Indexed, paginated sample query returning flat records"""
+        result = self.store.query(**filters)
+        result['samples'] = [self.flatten_sample(s) for s in result['samples']]
+        return result
+    
+    @staticmethod
+    def flatten_sample(sample):
+        """Flatten a stored sample into the record shape used by the web client"""
+        location = sample.get('location') or {}
+        return {
+            'sample_id': sample['sample_id'],
+            'timestamp': sample['timestamp'],
+            'pump_id': sample['pump_id'],
+            'duration': sample['duration'],
+            'latitude': location.get('latitude'),
+            'longitude': location.get('longitude'),
+            'altitude': location.get('altitude'),
+            'notes': sample.get('notes', ''),
+            'status': sample.get('status')
+        }
+    
+    def export_samples_csv(self, filename=None, progress=None):
+        """Export samples to downloadable CSV.
+
+        Rows are streamed from the sample store into a temp file which is
+        renamed into place once complete. progress(done, total) is called
+        every PROGRESS_INTERVAL samples.
+        """
         if not filename:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"water_samples_export_{timestamp}.csv"
         
         export_path = os.path.join(self.samples_dir, filename)
+        temp_path = export_path + '.tmp'
         
         try:
-            samples = self.get_samples()
+            total = self.store.count()
+            done = 0
             
-            with open(export_path, 'w', newline='') as f:
+            with open(temp_path, 'w', newline='') as f:
                 writer = csv.writer(f)
                 # Write headers
                 writer.writerow([
@@ -155,7 +182,7 @@ class DataLogger:
                 ])
                 
                 # Write data
-                for sample in samples:
+                for sample in self.store.iter_samples():
                     writer.writerow([
                         sample['sample_id'],
                         sample['timestamp'],
@@ -171,27 +198,52 @@ class DataLogger:
                         sample['notes'],
                         sample['status']
                     ])
+                    done += 1
+                    if progress and done % PROGRESS_INTERVAL == 0:
+                        progress(done, total)
+                
+                f.flush()
+                os.fsync(f.fileno())
             
+            os.replace(temp_path, export_path)
+            if progress:
+                progress(done, total)
             return export_path
             
         except Exception as e:
             print(f"Export error: {e}")
+            self.remove_temp_file(temp_path)
             return None
     
-    def export_samples_geojson(self, filename=None):
-        """Export samples as GeoJSON for mapping"""
+    def export_samples_geojson(self, filename=None, progress=None):
+        """Export samples as GeoJSON for mapping.
+
+        Features are written one at a time rather than building the whole
+        FeatureCollection in memory; see export_samples_csv for progress.
+        """
         if not filename:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             filename = f"water_samples_map_{timestamp}.geojson"
         
         export_path = os.path.join(self.samples_dir, filename)
+        temp_path = export_path + '.tmp'
         
         try:
-            samples = self.get_samples()
+            total = self.store.count()
+            done = 0
+            features = 0
             
-            features = []
-            for sample in samples:
-                if sample['location']['latitude'] and sample['location']['longitude']:
+            with open(temp_path, 'w') as f:
+                f.write('{"type": "FeatureCollection", "features": [\n')
+                
+                for sample in self.store.iter_samples():
+                    done += 1
+                    if progress and done % PROGRESS_INTERVAL == 0:
+                        progress(done, total)
+                    
+                    if not (sample['location']['latitude'] and sample['location']['longitude']):
+                        continue
+                        
                     feature = {
                         "type": "Feature",
                         "properties": {
@@ -214,63 +266,77 @@ class DataLogger:
                             ]
                         }
                     }
-                    features.append(feature)
-            
-            geojson = {
-                "type": "FeatureCollection",
-                "metadata": {
+                    if features:
+                        f.write(',\n')
+                    f.write(json.dumps(feature))
+                    features += 1
+                
+                metadata = {
                     "generated": datetime.now(timezone.utc).isoformat(),
-                    "total_samples": len(features)
-                },
-                "features": features
-            }
-            
-            with open(export_path, 'w') as f:
-                json.dump(geojson, f, indent=2)
+                    "total_samples": features
+                }
+                f.write(f'\n], "metadata": {json.dumps(metadata)}}}\n')
+                f.flush()
+                os.fsync(f.fileno())
             
+            os.replace(temp_path, export_path)
+            if progress:
+                progress(done, total)
             return export_path
             
         except Exception as e:
             print(f"GeoJSON export error: {e}")
+            self.remove_temp_file(temp_path)
             return None
     
+    @staticmethod
+    def remove_temp_file(path):
+        """Remove a partially written export"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
     def get_sample_statistics(self):
-        """Get sample collection statistics"""
+        """Get sample collection statistics from the running aggregates"""
         try:
-            samples = self.get_samples()
+            stats = self.store.get_statistics()
             
-            if not samples:
+            if not stats['total']:
                 return {'total': 0}
             
-            # Calculate statistics
-            total = len(samples)
-            by_pump = {}
-            by_date = {}
-            
-            for sample in samples:
-                # Count by pump
-                pump_id = sample['pump_id']
-                by_pump[pump_id] = by_pump.get(pump_id, 0) + 1
-                
-                # Count by date
-                date = sample['timestamp'][:10]  # YYYY-MM-DD
-                by_date[date] = by_date.get(date, 0) + 1
-            
-            # Get date range
-            timestamps = [datetime.fromisoformat(s['timestamp'].replace('Z', '+00:00')) for s in samples]
-            first_sample = min(timestamps)
-            last_sample = max(timestamps)
-            
             return {
-                'total': total,
-                'by_pump': by_pump,
-                'by_date': by_date,
+                'total': stats['total'],
+                'by_pump': stats['by_pump'],
+                'by_date': stats['by_date'],
+                'duration_by_date': stats['duration_by_date'],
                 'date_range': {
-                    'first': first_sample.isoformat(),
-                    'last': last_sample.isoformat()
+                    'first': datetime.fromtimestamp(stats['first_ts'], timezone.utc).isoformat(),
+                    'last': datetime.fromtimestamp(stats['last_ts'], timezone.utc).isoformat()
                 }
             }
             
         except Exception as e:
             print(f"Statistics error: {e}")
-            return {'total': 0, 'error': str(e)}
\ No newline at end of file
+            return {'total': 0, 'error': str(e)}
+    
+    def rebuild_statistics(self):
+        """Recompute the running aggregates from the stored samples"""
+        self.store.rebuild_statistics()
+        return self.get_statistics()
+    
+    def get_statistics(self):
+        """Get statistics in the shape used by the web client"""
+        stats = self.get_sample_statistics()
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        stats['total_samples'] = stats.get('total', 0)
+        stats['samples_today'] = stats.get('by_date', {}).get(today, 0)
+        return stats
+    
+    def export_to_csv(self, filename=None, progress=None):
+        """Export samples to CSV (alias used by the WebSocket handlers)"""
+        return self.export_samples_csv(filename, progress)
+    
+    def export_to_geojson(self, filename=None, progress=None):
+        """Export samples to GeoJSON (alias used by the WebSocket handlers)"""
+        return self.export_samples_geojson(filename, progress)
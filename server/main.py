@@ -3,43 +3,119 @@ import json
 import os
 import signal
 import sys
-import cv2  # Added missing import
+import time
 import base64  # Added missing import
+from http import HTTPStatus
 from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosedOK
 
 # Add the server directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '../config/settings.json')
+
+def load_config():
+    """Load config/settings.json, or the file named by AQUABOT_CONFIG"""
+    with open(os.environ.get('AQUABOT_CONFIG', CONFIG_PATH)) as f:
+        return json.load(f)
+
+# Off the boat, stand-ins for the hardware libraries have to be registered
+# before the modules below import them (AQUABOT_SIMULATE=1 or simulation.enabled),
+# as do the recording taps (AQUABOT_RECORD=1) and replayed devices (AQUABOT_REPLAY=file)
+import simulator
+import session_recording
+startup_config = load_config()
+SESSION_REPLAY = None
+SESSION_RECORDER = None
+if session_recording.replay_settings(startup_config)[0]:
+    SESSION_REPLAY = session_recording.install_replay(startup_config)
+    SIMULATED_BOAT = None
+else:
+    SIMULATED_BOAT = simulator.install(startup_config) if simulator.enabled(startup_config) else None
+    if session_recording.recording_enabled(startup_config):
+        SESSION_RECORDER = session_recording.install_recorder(startup_config)
+
 from camera_stream import CameraStream
+from video_pipeline import VideoPipeline
+from adaptive_video import AdaptiveQuality, load_tiers
 from gps_reader import GPSReader
 from imu_reader import IMUReader
 from battery_monitor import BatteryMonitor
 from motor_control import MotorController
 from pump_control import PumpController
 from servo_controller import ServoController
+from pigpio_pool import shared_pool
 from system_status import SystemStatus
+from sensor_hub import SensorHub
+from navigation_filter import NavigationFilter
+from device_supervisor import DeviceSupervisor
 from logger import DataLogger
+from telemetry_recorder import TelemetryRecorder
+from telemetry_history import TelemetryHistory
+from telemetry_protocol import TelemetryEncoder, SCHEMA_VERSION, get_schema
+from client_connection import ClientConnection
+from metrics import MetricsRegistry
+from histogram import FAST_BOUNDS_MS
+from binary_frames import FILE_CHUNK_SIZE, pack_file_chunk, pack_video_frame
+from session_recording import ReplaySocket
+import leak_monitor
+from leak_monitor import LeakMonitor
 
 class BoatServer:
     def __init__(self):
         # Load configuration
-        config_path = os.path.join(os.path.dirname(__file__), '../config/settings.json')
-        with open(config_path) as f:
-            self.config = json.load(f)
+        self.config = load_config()
         
         # Initialize components
-        self.camera = CameraStream()
-        self.gps = GPSReader(self.config['gps'])
-        self.imu = IMUReader()
-        self.battery = BatteryMonitor()
-        self.motors = MotorController(self.config['pins'], self.config['esc_range'])
-        self.pumps = PumpController(self.config['pins']['pumps'], self.config['pump_durations'])
-        self.servos = ServoController(self.config['pins'])
-        self.system = SystemStatus()
+        video_config = self.config.get('video', {})
+        self.video_tiers = load_tiers(video_config)
+        self.video_adaptive = video_config.get('adaptive', True)
+        self.video_adapt_interval = video_config.get('adapt_interval', 2)
+        self.quality = AdaptiveQuality(self.video_tiers)
+        self.camera = CameraStream(self.video_tiers[0]['size'], video_config.get('lores_size', (320, 240)))
+        self.video = VideoPipeline(self.camera, self.video_tiers)
+        
+        # Hardware handles are owned by the supervisor, which reconnects them in the background
+        self.devices = DeviceSupervisor(**self.config.get('devices', {}))
+        self.gps = GPSReader(self.config['gps'], self.devices)
+        self.imu = IMUReader(self.config.get('imu', {}), self.devices)
+        self.battery = BatteryMonitor(self.devices)
+        self.gpio = shared_pool(self.devices)  # one pigpio connection for motors, pumps and servos
+        self.motors = MotorController(self.config['pins'], self.config['esc_range'], self.devices)
+        self.pumps = PumpController(self.config['pins']['pumps'], self.config['pump_durations'], self.devices)
+        self.servos = ServoController(self.config['pins'], self.devices, self.config.get('servos', {}))
+        self.system = SystemStatus(self.config.get('system', {}))
+        self.navigation = NavigationFilter(self.config.get('navigation', {}))
+        self.sensors = self.setup_sensors(self.config.get('sensors', {}))
         self.logger = DataLogger(self.config['data_logging'])
+        self.recorder = TelemetryRecorder(
+            self.config['data_logging'].get('telemetry', {}),
+            self.config['data_logging'].get('log_interval', 0.1)
+        )
+        self.history = TelemetryHistory(self.recorder)
+        self.telemetry_encoder = TelemetryEncoder(
+            self.config['websocket'].get('telemetry_keyframe_interval', 10)
+        )
+        
+        # Raw sensor inputs and client messages, recorded or replayed (see session_recording)
+        self.session_recorder = SESSION_RECORDER
+        self.replay = SESSION_REPLAY
+        
+        # WebSocket connections, each with its own outbound queues
+        self.connections = {}
+        
+        # Latency histograms and counters, scraped over HTTP at /metrics
+        self.metrics_config = self.config.get('metrics', {})
+        self.metrics = self.setup_metrics()
         
-        # WebSocket connections
-        self.connections = set()
+        # Resource and allocation sampling for soak tests (see soak_test.py)
+        self.soak = None
+        if leak_monitor.enabled(self.config):
+            self.soak = LeakMonitor(self.config.get('soak', {}), self.leak_probes(), self.system.loop_lag_histogram)
+        
+        # Background tasks (exports, downloads) and file transfer ids
+        self.background_tasks = set()
+        self.transfer_id = 0
         
         # Data storage
         self.telemetry_data = {
@@ -47,13 +123,145 @@ class BoatServer:
             'imu': None,
             'battery': None,
             'system': None,
-            'servos': None
+            'servos': None,
+            'nav': None,
+            'devices': None
+        }
+
+    def setup_sensors(self, sensor_config):
+        """Poll every sensor on its own thread and schedule"""
+        hub = SensorHub()
+        reads = {
+            'gps': (self.gps.read, 0.1),
+            'imu': (self.imu.read, 0.05),
+            'battery': (self.battery.read, 1.0),
+            'system': (self.system.get_status, 1.0),
+            'servos': (self.servos.get_status, 0.1),
+            'nav': (self.update_navigation, 0.05)
         }
+        for name, (read, interval) in reads.items():
+            settings = sensor_config.get(name, {})
+            hub.add(
+                name,
+                read,
+                settings.get('interval', interval),
+                settings.get('timeout'),
+                settings.get('max_age')
+            )
+        return hub
+
+    def leak_probes(self):
+        """Sizes of the server's own containers, watched for growth during soak tests"""
+        def clients():
+            return list(self.connections.values())
+        
+        return {
+            'connections': lambda: len(self.connections),
+            'background_tasks': lambda: len(self.background_tasks),
+            'pump_tasks': lambda: len(self.pumps.tasks),
+            'queued_messages': lambda: sum(len(q) for c in clients() for q in c.queues.values()),
+            'write_buffer_bytes': lambda: sum(c.write_buffer_size() for c in clients()),
+            'history_cache': lambda: len(self.history.cache) + len(self.history.file_cache),
+            'recorder_rows': lambda: len(self.recorder.rows),
+            'metric_series': lambda: sum(len(family.children) for family in self.metrics.families)
+        }
+
+    def setup_metrics(self):
+        """Register hot-path histograms and collectors for existing counters"""
+        metrics = MetricsRegistry()
+        
+        # Observed directly on the hot paths
+        self.serialize_latency = metrics.histogram(
+            'serialize_seconds', 'Time to build outbound messages', ('kind',), FAST_BOUNDS_MS)
+        self.message_latency = metrics.histogram(
+            'message_handler_seconds', 'Time to handle an incoming WebSocket message', ('type',), FAST_BOUNDS_MS)
+        send_latency = metrics.histogram(
+            'client_send_seconds', 'Time for one WebSocket send to a client', ('channel',))
+        self.send_latency = {channel: send_latency.labels(channel) for channel in ClientConnection.CHANNELS}
+        
+        # Histograms and counters the components already keep, read at scrape time
+        metrics.histogram('video_capture_seconds', 'Camera capture time',
+                          collect=lambda: {(): self.video.capture_latency})
+        metrics.histogram('video_encode_seconds', 'JPEG encode time for all due tiers of a frame',
+                          collect=lambda: {(): self.video.encode_latency})
+        metrics.counter('video_frames_total', 'Frames encoded',
+                        collect=lambda: {(): self.video.sequence})
+        metrics.counter('video_dropped_frames_total', 'Captured frames replaced before encoding',
+                        collect=lambda: {(): self.video.dropped})
+        metrics.counter('video_capture_errors_total', 'Failed camera captures',
+                        collect=lambda: {(): self.video.capture_errors})
+        metrics.histogram('sensor_read_seconds', 'Sensor read time', ('sensor',),
+                          collect=lambda: {(name,): p.latency for name, p in self.sensors.pollers.items()})
+        for name, help_text in (('reads', 'Sensor reads'), ('errors', 'Sensor reads that failed or returned nothing'),
+                                ('timeouts', 'Sensor reads slower than their timeout')):
+            metrics.counter(f'sensor_{name}_total', help_text, ('sensor',),
+                            collect=lambda name=name: {
+                                (sensor,): getattr(p, name) for sensor, p in self.sensors.pollers.items()})
+        metrics.gauge('sensor_age_seconds', 'Age of the latest reading', ('sensor',),
+                      collect=lambda: {(name,): self.sensors.cache.age(name) for name in self.sensors.pollers})
+        metrics.histogram('event_loop_lag_seconds', 'How late the event loop wakes from a sleep',
+                          collect=lambda: {(): self.system.loop_lag_histogram})
+        metrics.gauge('device_up', 'Whether a hardware device is connected', ('device',),
+                      collect=lambda: {(name,): int(d['state'] == 'ok') for name, d in self.devices.get_status().items()})
+        metrics.counter('device_failures_total', 'Hardware device failures', ('device',),
+                        collect=lambda: {(name,): d['failures'] for name, d in self.devices.get_status().items()})
+        for name, help_text in (('commands', 'Servo commands received'), ('writes', 'Servo pulse widths written to pigpio'),
+                                ('status_pushes', 'Servo status messages pushed to clients')):
+            metrics.counter(f'servo_{name}_total', help_text,
+                            collect=lambda name=name: {(): self.servos.stats[name]})
+        metrics.histogram('pigpio_update_seconds', 'Time until pigpiod has replied to every command of a batched update',
+                          collect=lambda: {(): self.gpio.latency})
+        metrics.histogram('pigpio_skew_seconds', 'Duration of batched updates needing several pin commands, bounding their pin skew',
+                          collect=lambda: {(): self.gpio.skew})
+        for name, help_text in (('updates', 'Batched pigpio updates'), ('sequential', 'Batches set one pin at a time'),
+                                ('busy', 'Script runs refused while the script was still running')):
+            metrics.counter(f'pigpio_{name}_total', help_text,
+                            collect=lambda name=name: {(): self.gpio.stats[name]})
+        metrics.gauge('clients', 'Connected WebSocket clients',
+                      collect=lambda: {(): len(self.connections)})
+        for field, help_text in (('cpu_usage', 'CPU usage percent'), ('cpu_temp', 'CPU temperature in C'),
+                                 ('memory_usage', 'Memory usage percent'), ('disk_usage', 'Disk usage percent'),
+                                 ('process_rss_mb', 'Server resident memory in MB'),
+                                 ('throttled', 'Firmware throttling bits')):
+            metrics.gauge(f'system_{field}', help_text,
+                          collect=lambda field=field: {(): self.system.values.get(field)})
+        return metrics
+
+    def process_request(self, connection, request):
+        """Answer plain HTTP scrapes of /metrics; everything else continues as a WebSocket"""
+        if request.path == self.metrics_config.get('path', '/metrics') and self.metrics_config.get('enabled', True):
+            return connection.respond(HTTPStatus.OK, self.metrics.render())
+        return None
+
+    def update_navigation(self):
+        """Advance the GPS/IMU filter with the latest readings"""
+        return self.navigation.step(self.gps.read(), self.imu.read(), time.monotonic())
+
+    def add_client(self, websocket):
+        """Register a connection and start its writer"""
+        client = ClientConnection(
+            websocket,
+            self.config['websocket'].get('video_queue_size', 1),
+            self.config['websocket'].get('telemetry_queue_size', 1),
+            self.send_latency
+        )
+        self.connections[websocket] = client
+        client.start()
+        self.update_video_tiers()
+        print(f"New connection: {websocket.remote_address}")
+        return client
+
+    async def remove_client(self, websocket):
+        """Unregister a connection and stop its writer"""
+        client = self.connections.pop(websocket)
+        self.update_video_tiers()
+        await client.stop()
 
     async def handle_connection(self, websocket):
         """Handle a new WebSocket connection"""
-        self.connections.add(websocket)
-        print(f"New connection: {websocket.remote_address}")
+        self.add_client(websocket)
+        if self.session_recorder:
+            self.session_recorder.client_event(websocket, 'connect')
         
         try:
             # Send initial configuration
@@ -64,38 +272,119 @@ class BoatServer:
             
             # Handle messages from client
             async for message in websocket:
+                if self.session_recorder:
+                    self.session_recorder.client_event(websocket, 'message', message)
                 await self.handle_message(message, websocket)
                 
         except Exception as e:
             print(f"Connection error: {e}")
         finally:
-            self.connections.remove(websocket)
+            if self.session_recorder:
+                self.session_recorder.client_event(websocket, 'disconnect')
+            await self.remove_client(websocket)
+
+    async def replay_clients(self):
+        """Feed recorded client sessions through the message handlers, then shut down"""
+        sockets = {}
+        lap = 0
+        async for event_lap, event in self.replay.client_events():
+            if event_lap != lap:
+                # Looping back to the start: the recorded clients reconnect
+                for websocket in sockets.values():
+                    await self.remove_client(websocket)
+                sockets.clear()
+                lap = event_lap
+            
+            client = event['client']
+            if event['event'] == 'connect':
+                sockets[client] = ReplaySocket(client)
+                self.add_client(sockets[client])
+            elif client in sockets:
+                if event['event'] == 'message':
+                    await self.handle_message(event['message'], sockets[client])
+                else:
+                    await self.remove_client(sockets.pop(client))
+        
+        print(f"Replay finished: {json.dumps(self.replay.get_status())}")
+        asyncio.create_task(shutdown(self))
 
     async def handle_message(self, message, websocket):
         """Handle incoming WebSocket messages"""
+        start = time.perf_counter()
+        msg_type = 'invalid'
         try:
             data = json.loads(message)
             msg_type = data.get('type')
             
             if msg_type == 'control':
-                # Handle motor control
+                # Handle motor control; the pigpio update may wait on the servo
+                # loop's script run, so it runs on a worker thread like that loop
                 command = data.get('command')
                 if command in ['forward', 'backward', 'left', 'right', 'stop']:
-                    self.motors.handle_command(command)
+                    await asyncio.to_thread(self.motors.handle_command, command)
+                if 'ack' in data:
+                    # Echoed once the command is applied, so clients can measure round trips
+                    await websocket.send(json.dumps({
+                        'type': 'control_ack',
+                        'ack': data['ack'],
+                        'command': command
+                    }))
                     
-            elif msg_type == 'servo':
-                # Handle servo camera control
-                command = data.get('command')
-                value = data.get('value', {})
-                result = self.servos.handle_command(command, value)
+            elif msg_type == 'video_mode':
+                # Clients opt in to raw JPEG binary frames
+                client = self.connections.get(websocket)
+                if client:
+                    client.binary_video = data.get('mode') == 'binary'
+                    
+            elif msg_type == 'telemetry_mode':
+                # Clients opt in to compact binary telemetry; JSON stays the default
+                client = self.connections.get(websocket)
+                if client:
+                    client.binary_telemetry = (
+                        data.get('mode') == 'binary'
+                        and data.get('version', SCHEMA_VERSION) == SCHEMA_VERSION
+                    )
+                    if client.binary_telemetry:
+                        self.telemetry_encoder.request_keyframe()
+                    await websocket.send(json.dumps({
+                        'type': 'telemetry_mode',
+                        'data': {
+                            'mode': 'binary' if client.binary_telemetry else 'json',
+                            'schema': get_schema() if client.binary_telemetry else None
+                        }
+                    }))
+                    
+            elif msg_type == 'client_stats':
+                await websocket.send(json.dumps({
+                    'type': 'client_stats',
+                    'data': self.get_client_stats()
+                }))
+                
+            elif msg_type == 'device_status':
+                await websocket.send(json.dumps({
+                    'type': 'device_status',
+                    'data': self.devices.get_status()
+                }))
+                
+            elif msg_type == 'sensor_stats':
+                await websocket.send(json.dumps({
+                    'type': 'sensor_stats',
+                    'data': self.sensors.get_stats()
+                }))
                 
-                # Send servo status back to client
-                servo_status = self.servos.get_status()
+            elif msg_type == 'video_stats':
                 await websocket.send(json.dumps({
-                    'type': 'servo_status',
-                    'data': servo_status
+                    'type': 'video_stats',
+                    'data': self.get_video_stats()
                 }))
                     
+            elif msg_type == 'servo':
+                # Handle servo camera control; commands only move the targets and
+                # the control loop pushes servo_status while the camera moves
+                command = data.get('command')
+                value = data.get('value', {})
+                self.servos.handle_command(command, value)
+                    
             elif msg_type == 'pump':
                 # Handle pump control
                 pump_id = data.get('pump_id')
@@ -109,18 +398,27 @@ class BoatServer:
                     sample_location = None
                     
                 # Activate pump
-                self.pumps.activate_pump(pump_id, duration, sample_location)
+                activated = self.pumps.activate_pump(pump_id, duration, sample_location)
                 
-                # Log sample if location is available
-                if sample_location:
-                    self.logger.log_sample(pump_id, duration, sample_location)
+                # Log sample if the pump ran and location is available
+                if activated and sample_location:
+                    await asyncio.to_thread(self.logger.log_sample, pump_id, duration, sample_location)
                     
+            elif msg_type == 'imu_calibration':
+                # Calibration steps sample the IMU for a few seconds on a worker thread
+                self.start_task(self.run_imu_calibration(data, websocket))
+                
+            elif msg_type == 'history':
+                # Recorded telemetry, downsampled on a worker thread
+                self.start_task(self.send_history(data, websocket))
+                
             elif msg_type == 'samples':
-                # Handle sample data requests
+                # Handle sample data requests; store reads and writes run on a
+                # worker thread so a slow disk never stalls the event loop
                 command = data.get('command')
                 
                 if command == 'get_all':
-                    samples = self.logger.get_all_samples()
+                    samples = await asyncio.to_thread(self.logger.get_all_samples)
                     await websocket.send(json.dumps({
                         'type': 'samples_data',
                         'data': {
@@ -129,65 +427,257 @@ class BoatServer:
                         }
                     }))
                     
-                elif command == 'get_statistics':
-                    stats = self.logger.get_statistics()
+                elif command == 'query':
+                    # Filtered, paginated query so the map only fetches what is in view
+                    query = data.get('query', {})
+                    result = await asyncio.to_thread(
+                        self.logger.query_samples,
+                        bbox=query.get('bbox'),
+                        center=query.get('center'),
+                        radius_m=query.get('radius_m'),
+                        start=query.get('start'),
+                        end=query.get('end'),
+                        pump_id=query.get('pump_id'),
+                        cursor=query.get('cursor'),
+                        limit=query.get('limit', 500),
+                        newest_first=query.get('newest_first', False)
+                    )
                     await websocket.send(json.dumps({
-                        'type': 'samples_data', 
+                        'type': 'samples_data',
                         'data': {
-                            'command': 'statistics',
-                            'statistics': stats
+                            'command': 'query_results',
+                            'request_id': data.get('request_id'),
+                            'samples': result['samples'],
+                            'next_cursor': result['next_cursor']
                         }
                     }))
                     
-                elif command == 'export_geojson':
-                    geojson_file = self.logger.export_to_geojson()
+                elif command == 'get_statistics':
+                    stats = await asyncio.to_thread(self.logger.get_statistics)
                     await websocket.send(json.dumps({
-                        'type': 'samples_data',
+                        'type': 'samples_data', 
                         'data': {
-                            'command': 'geojson_exported',
-                            'file': geojson_file,
-                            'message': f'GeoJSON exported to {geojson_file}'
+                            'command': 'statistics',
+                            'statistics': stats
                         }
                     }))
                     
-                elif command == 'export_csv':
-                    csv_file = self.logger.export_to_csv()
+                elif command == 'rebuild_statistics':
+                    stats = await asyncio.to_thread(self.logger.rebuild_statistics)
                     await websocket.send(json.dumps({
                         'type': 'samples_data',
                         'data': {
-                            'command': 'csv_exported', 
-                            'file': csv_file,
-                            'message': f'CSV exported to {csv_file}'
+                            'command': 'statistics',
+                            'statistics': stats
                         }
                     }))
                     
+                elif command in ('export_geojson', 'export_csv'):
+                    # Exports run on a worker thread so video and telemetry keep flowing
+                    self.start_task(self.run_export(command, websocket, data.get('download', False)))
+                    
         except json.JSONDecodeError:
             print(f"Invalid JSON message: {message}")
         except Exception as e:
             print(f"Error handling message: {e}")
+        finally:
+            self.message_latency.labels(msg_type).observe((time.perf_counter() - start) * 1000)
+
+    def get_video_stats(self):
+        """Achieved fps and per-stage latency of the video pipeline"""
+        return self.video.get_stats()
+
+    def get_client_stats(self):
+        """Send/drop counters and queue depth for every connected client"""
+        return [client.get_stats() for client in self.connections.values()]
+
+    def start_task(self, coro):
+        """Start a background task and keep a reference until it finishes"""
+        task = asyncio.create_task(coro)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+
+    def publish_servo_status(self, status):
+        """Queue the servo position for every client; an unsent older one is replaced"""
+        message = json.dumps({'type': 'servo_status', 'data': status})
+        for client in self.connections.values():
+            client.enqueue('status', message)
+
+    async def send_json(self, websocket, message):
+        """Send a JSON message to one client, ignoring closed connections"""
+        try:
+            await websocket.send(json.dumps(message))
+        except ConnectionClosedOK:
+            pass
+        except Exception as e:
+            print(f"Send error: {e}")
+
+    async def run_export(self, command, websocket, download=False):
+        """Export samples on a worker thread, then optionally send the file"""
+        loop = asyncio.get_running_loop()
+        export_format = 'geojson' if command == 'export_geojson' else 'csv'
+        last_report = [0.0]
+        
+        def progress(done, total):
+            # Called from the export thread; throttle to a couple of updates per second
+            now = time.monotonic()
+            if done < total and now - last_report[0] < 0.5:
+                return
+            last_report[0] = now
+            asyncio.run_coroutine_threadsafe(self.send_json(websocket, {
+                'type': 'samples_data',
+                'data': {
+                    'command': 'export_progress',
+                    'format': export_format,
+                    'done': done,
+                    'total': total
+                }
+            }), loop)
+        
+        try:
+            if export_format == 'geojson':
+                export_file = await asyncio.to_thread(self.logger.export_to_geojson, None, progress)
+            else:
+                export_file = await asyncio.to_thread(self.logger.export_to_csv, None, progress)
+                
+            if not export_file:
+                await self.send_json(websocket, {
+                    'type': 'samples_data',
+                    'data': {
+                        'command': 'export_failed',
+                        'format': export_format,
+                        'message': f'{export_format.upper()} export failed'
+                    }
+                })
+                return
+                
+            label = 'GeoJSON' if export_format == 'geojson' else 'CSV'
+            await self.send_json(websocket, {
+                'type': 'samples_data',
+                'data': {
+                    'command': f'{export_format}_exported',
+                    'file': export_file,
+                    'message': f'{label} exported to {export_file}'
+                }
+            })
+            
+            if download:
+                await self.send_file(websocket, export_file)
+                
+        except Exception as e:
+            print(f"Export error: {e}")
+
+    async def send_history(self, data, websocket):
+        """Reply to a history request with downsampled telemetry series"""
+        try:
+            result = await asyncio.to_thread(
+                self.history.get_history,
+                data.get('start'),
+                data.get('end'),
+                data.get('duration', 3600),
+                data.get('fields'),
+                data.get('points', 500),
+                data.get('method', 'lttb')
+            )
+            await self.send_json(websocket, {
+                'type': 'history',
+                'data': dict(result, request_id=data.get('request_id'))
+            })
+        except Exception as e:
+            print(f"History error: {e}")
+            await self.send_json(websocket, {
+                'type': 'history',
+                'data': {'request_id': data.get('request_id'), 'error': str(e)}
+            })
+
+    async def run_imu_calibration(self, data, websocket):
+        """Run one IMU calibration step and reply with the calibration status"""
+        command = data.get('command', 'status')
+        try:
+            # Long enough for a usable average, short enough not to tie up a worker thread
+            seconds = min(max(float(data.get('seconds', 3.0)), 0.5), 30.0)
+            status = await asyncio.to_thread(self.imu.calibrate, command, seconds)
+            await self.send_json(websocket, {
+                'type': 'imu_calibration',
+                'data': dict(status, command=command)
+            })
+        except Exception as e:
+            print(f"IMU calibration error: {e}")
+            await self.send_json(websocket, {
+                'type': 'imu_calibration',
+                'data': {'command': command, 'error': str(e)}
+            })
+
+    async def send_file(self, websocket, path):
+        """Send a file to one client as chunked binary frames"""
+        self.transfer_id = (self.transfer_id + 1) % 65536
+        transfer_id = self.transfer_id
+        size = os.path.getsize(path)
+        
+        await websocket.send(json.dumps({
+            'type': 'samples_data',
+            'data': {
+                'command': 'download_start',
+                'transfer_id': transfer_id,
+                'filename': os.path.basename(path),
+                'size': size,
+                'chunks': (size + FILE_CHUNK_SIZE - 1) // FILE_CHUNK_SIZE
+            }
+        }))
+        
+        with open(path, 'rb') as f:
+            index = 0
+            while True:
+                payload = await asyncio.to_thread(f.read, FILE_CHUNK_SIZE)
+                if not payload:
+                    break
+                # send() waits for the transport to drain, pacing the download to the link
+                await websocket.send(pack_file_chunk(transfer_id, index, payload))
+                index += 1
+                
+        await websocket.send(json.dumps({
+            'type': 'samples_data',
+            'data': {
+                'command': 'download_complete',
+                'transfer_id': transfer_id
+            }
+        }))
 
     async def broadcast_telemetry(self):
         """Broadcast telemetry data to all connected clients"""
         while True:
             try:
-                # Update telemetry data
-                self.telemetry_data['gps'] = self.gps.read()
-                self.telemetry_data['imu'] = self.imu.read()
-                self.telemetry_data['battery'] = self.battery.read()
-                self.telemetry_data['system'] = self.system.get_status()
-                self.telemetry_data['servos'] = self.servos.get_status()
+                # Snapshot the latest readings; the sensors are polled on their own threads
+                self.telemetry_data.update(self.sensors.snapshot())
+                self.telemetry_data['devices'] = {
+                    'degraded': self.devices.degraded()
+                }
                 
-                # Broadcast to all connections
-                if self.connections:
+                # Record every snapshot for history and post-run analysis
+                self.recorder.record(self.telemetry_data)
+                
+                # Serialize once per format in use, then queue for all
+                # connections; unsent older snapshots are replaced
+                clients = list(self.connections.values())
+                if any(not client.binary_telemetry for client in clients):
+                    start = time.perf_counter()
                     message = json.dumps({
                         'type': 'telemetry',
                         'data': self.telemetry_data
                     })
-                    
-                    await asyncio.gather(
-                        *[conn.send(message) for conn in self.connections],
-                        return_exceptions=True
-                    )
+                    self.serialize_latency.labels('telemetry_json').observe((time.perf_counter() - start) * 1000)
+                    for client in clients:
+                        if not client.binary_telemetry:
+                            client.enqueue('telemetry', message)
+                            
+                if any(client.binary_telemetry for client in clients):
+                    start = time.perf_counter()
+                    frame = self.telemetry_encoder.encode(self.telemetry_data, time.time())
+                    self.serialize_latency.labels('telemetry_binary').observe((time.perf_counter() - start) * 1000)
+                    for client in clients:
+                        if client.binary_telemetry:
+                            client.enqueue('telemetry', frame)
                     
                 await asyncio.sleep(0.1)
                 
@@ -196,46 +686,102 @@ class BoatServer:
                 await asyncio.sleep(1)
 
     async def broadcast_video(self):
-        """Broadcast video frames to all connected clients"""
+        """Broadcast encoded frames from the video pipeline to all clients"""
         while True:
             try:
-                frame = self.camera.capture_frame()
-                if frame is not None:
-                    # Convert frame to base64
-                    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                    jpg_as_text = base64.b64encode(buffer).decode('utf-8')
-                    
-                    # Broadcast to all connections
-                    if self.connections:
-                        message = json.dumps({
-                            'type': 'video',
-                            'data': f"data:image/jpeg;base64,{jpg_as_text}"
-                        })
-                        
-                        await asyncio.gather(
-                            *[conn.send(message) for conn in self.connections],
-                            return_exceptions=True
-                        )
-                else:
-                    print("Warning: No frame captured from camera")
+                frame = await self.video.get_frame()
                 
-                await asyncio.sleep(0.033)  # ~30 FPS
+                # Each message is built once per (tier, format) actually in use
+                messages = {}
+                for client in list(self.connections.values()):
+                    jpeg = frame.jpegs.get(client.video_tier)
+                    if jpeg is None:
+                        continue  # Not a frame for this client's tier/frame rate
+                        
+                    key = (client.video_tier, client.binary_video)
+                    if key not in messages:
+                        start = time.perf_counter()
+                        messages[key] = self.build_video_message(frame, jpeg, client.binary_video)
+                        kind = 'video_binary' if client.binary_video else 'video_base64'
+                        self.serialize_latency.labels(kind).observe((time.perf_counter() - start) * 1000)
+                    client.enqueue('video', messages[key])
                 
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
                 print(f"Video broadcast error: {e}")
                 await asyncio.sleep(1)
 
+    def build_video_message(self, frame, jpeg, binary):
+        """Binary JPEG frame, or the legacy base64 data URL for older dashboards"""
+        if binary:
+            return pack_video_frame(frame.sequence, frame.capture_time, jpeg)
+        jpg_as_text = base64.b64encode(jpeg).decode('utf-8')
+        return json.dumps({
+            'type': 'video',
+            'data': f"data:image/jpeg;base64,{jpg_as_text}"
+        })
+
+    def update_video_tiers(self):
+        """Tell the video pipeline which quality tiers are in use"""
+        self.video.set_active_tiers({c.video_tier for c in self.connections.values()})
+
+    async def monitor_event_loop(self):
+        """Measure how late the event loop wakes up from a short sleep"""
+        interval = self.config.get('system', {}).get('loop_lag_interval', 0.1)
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.system.record_loop_lag(loop.time() - start - interval)
+
+    async def adapt_video(self):
+        """Periodically step each client's video quality up or down"""
+        while True:
+            try:
+                await asyncio.sleep(self.video_adapt_interval)
+                
+                if self.video_adaptive:
+                    for client in list(self.connections.values()):
+                        if self.quality.evaluate(client):
+                            tier = self.video_tiers[client.video_tier]
+                            print(f"Video quality for {client.remote_address}: {tier['name']}")
+                            self.start_task(self.send_json(client.websocket, {
+                                'type': 'video_quality',
+                                'data': dict(tier, tier=client.video_tier)
+                            }))
+                
+                self.update_video_tiers()
+                
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Video adaptation error: {e}")
+
     async def run_server(self):
         """Run the WebSocket server with the new API"""
         # Start background tasks
+        self.video.start()
+        self.sensors.start()
         asyncio.create_task(self.broadcast_telemetry())
         asyncio.create_task(self.broadcast_video())
+        asyncio.create_task(self.adapt_video())
+        asyncio.create_task(self.recorder.run())
+        asyncio.create_task(self.monitor_event_loop())
+        asyncio.create_task(self.servos.run(self.publish_servo_status))
+        if self.session_recorder:
+            asyncio.create_task(self.session_recorder.run())
+        if self.replay:
+            asyncio.create_task(self.replay_clients())
+        if self.soak:
+            asyncio.create_task(self.soak.run())
         
         # Start WebSocket server with new API
         async with serve(
             self.handle_connection,
             self.config['websocket']['host'],
-            self.config['websocket']['port']
+            self.config['websocket']['port'],
+            process_request=self.process_request
         ) as server:
             print(f"WebSocket server running on ws://{self.config['websocket']['host']}:{self.config['websocket']['port']}")
             await server.serve_forever()
@@ -243,11 +789,18 @@ class BoatServer:
     def cleanup(self):
         """Clean up resources"""
         try:
+            self.devices.stop()
             self.motors.stop()
             self.pumps.cleanup()
             self.servos.cleanup()
+            self.video.stop()
+            self.sensors.stop()
             self.camera.cleanup()
             self.gps.cleanup()
+            self.imu.cleanup()
+            self.recorder.flush()
+            if self.session_recorder:
+                self.session_recorder.flush()
             print("Server cleanup completed")
         except Exception as e:
             print(f"Error during cleanup: {e}")
@@ -276,12 +829,11 @@ async def shutdown(server):
     tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
     for task in tasks:
         task.cancel()
+    # Cancelling main() ends asyncio.run() once every task has finished
     try:
         await asyncio.gather(*tasks, return_exceptions=True)
     except Exception as e:
         print(f"Error during shutdown: {e}")
-    finally:
-        asyncio.get_event_loop().stop()
 
 if __name__ == "__main__":
     try:
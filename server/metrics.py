@@ -0,0 +1,162 @@
+# Metrics registry with a Prometheus text exposition
+#
+# Hot paths only touch a Histogram (a bisect and a locked increment) or a
+# Counter. Values the components already track (sensor reads, frame
+# counts, device state) are read by collect callbacks when /metrics is
+# scraped, so they cost nothing in between. Histograms record
+# milliseconds like the rest of the server and are exposed in seconds,
+# as Prometheus expects.
+import math
+import threading
+
+from histogram import Histogram, DEFAULT_BOUNDS_MS
+
+# Label sets per family beyond which new ones are folded into 'other',
+# so a client sending made-up message types can't grow the registry
+MAX_SERIES = 64
+
+
+def format_value(value):
+    """Sample value in exposition format"""
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int):
+        return str(value)
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def escape_label(value):
+    """Label value with backslashes, quotes and newlines escaped"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(pairs):
+    """{name="value",...} or an empty string"""
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Add to the counter"""
+        with self.lock:
+            self.value += amount
+
+
+class Gauge:
+    """Value that can go up and down"""
+
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        """Set the current value"""
+        self.value = value
+
+
+class MetricFamily:
+    """One metric name with a child per label set.
+
+    Either children are created on demand with labels() and updated by
+    the code being measured, or collect() returns {label values: value}
+    (a number, or a Histogram for histogram families) at scrape time.
+    """
+
+    def __init__(self, name, kind, help_text, labels=(), bounds=DEFAULT_BOUNDS_MS, scale=1.0, collect=None):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self.bounds = bounds
+        self.scale = scale
+        self.collect = collect
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        """Child for one label set, created on first use"""
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is not None:
+            return child
+        with self.lock:
+            if key not in self.children and len(self.children) >= MAX_SERIES:
+                key = ('other',) * len(self.label_names)
+            if key not in self.children:
+                self.children[key] = self.new_child()
+            return self.children[key]
+
+    def new_child(self):
+        """Empty child of this family's kind"""
+        if self.kind == 'histogram':
+            return Histogram(self.bounds)
+        if self.kind == 'counter':
+            return Counter()
+        return Gauge()
+
+    def series(self):
+        """{label values: value or Histogram} as of now"""
+        if self.collect is not None:
+            return self.collect()
+        with self.lock:
+            return {key: child if self.kind == 'histogram' else child.value
+                    for key, child in self.children.items()}
+
+    def render(self, lines):
+        """Append this family in exposition format"""
+        lines.append(f'# HELP {self.name} {self.help_text}')
+        lines.append(f'# TYPE {self.name} {self.kind}')
+        for key, value in sorted(self.series().items()):
+            pairs = list(zip(self.label_names, key))
+            if self.kind == 'histogram':
+                buckets = value.cumulative()
+                for bound, count in buckets:
+                    le = '+Inf' if math.isinf(bound) else format_value(bound * self.scale)
+                    lines.append(f'{self.name}_bucket{format_labels(pairs + [("le", le)])} {count}')
+                lines.append(f'{self.name}_sum{format_labels(pairs)} {format_value(value.sum * self.scale)}')
+                lines.append(f'{self.name}_count{format_labels(pairs)} {buckets[-1][1]}')
+            elif value is not None:
+                lines.append(f'{self.name}{format_labels(pairs)} {format_value(value)}')
+
+
+class MetricsRegistry:
+    def __init__(self, prefix='aquabot_'):
+        self.prefix = prefix
+        self.families = []
+
+    def add(self, family):
+        """Register a family and return it"""
+        self.families.append(family)
+        return family
+
+    def counter(self, name, help_text, labels=(), collect=None):
+        """Counter family"""
+        return self.add(MetricFamily(self.prefix + name, 'counter', help_text, labels, collect=collect))
+
+    def gauge(self, name, help_text, labels=(), collect=None):
+        """Gauge family"""
+        return self.add(MetricFamily(self.prefix + name, 'gauge', help_text, labels, collect=collect))
+
+    def histogram(self, name, help_text, labels=(), bounds=DEFAULT_BOUNDS_MS, collect=None):
+        """Histogram family observed in milliseconds and exposed in seconds"""
+        return self.add(MetricFamily(self.prefix + name, 'histogram', help_text, labels, bounds, 0.001, collect))
+
+    def render(self):
+        """Every family in Prometheus text format"""
+        lines = []
+        for family in self.families:
+            try:
+                family.render(lines)
+            except Exception as e:
+                print(f"Metrics error ({family.name}): {e}")
+        return '\n'.join(lines) + '\n'
@@ -1,21 +1,32 @@
 import pigpio
 
-class MotorController:
-    def __init__(self, pin_config, esc_config):
-        self.pi = pigpio.pi()  # Connect to local pigpio daemon
-
-        if not self.pi.connected:
-            raise RuntimeError("Failed to connect to pigpio daemon. Is 'pigpiod' running?")
+from device_supervisor import DeviceSupervisor
+from pigpio_pool import shared_pool
 
+class MotorController:
+    def __init__(self, pin_config, esc_config, devices=None):
         self.left_pin = pin_config['motor_left']
         self.right_pin = pin_config['motor_right']
         self.min_pulse = esc_config['min']
         self.max_pulse = esc_config['max']
 
-        # Setup pins
-        self.pi.set_mode(self.left_pin, pigpio.OUTPUT)
-        self.pi.set_mode(self.right_pin, pigpio.OUTPUT)
-        self.stop()
+        # One pigpio connection shared with the other actuators; the supervisor
+        # reconnects it in the background
+        self.devices = devices or DeviceSupervisor()
+        self.gpio = shared_pool(self.devices)
+        self.gpio.add_setup(self.setup_pins)
+
+    def setup_pins(self, pi):
+        """Configure the ESC pins and stop the motors after every (re)connect"""
+        pi.set_mode(self.left_pin, pigpio.OUTPUT)
+        pi.set_mode(self.right_pin, pigpio.OUTPUT)
+        pi.set_servo_pulsewidth(self.left_pin, self.min_pulse)
+        pi.set_servo_pulsewidth(self.right_pin, self.min_pulse)
+
+    def set_pulses(self, left, right):
+        """Set both ESC pulse widths in one batch, so differential thrust changes together;
+        returns False while pigpio is down"""
+        return self.gpio.update(pulses=[(self.left_pin, left), (self.right_pin, right)])
 
     def handle_command(self, command):
         """Handle motor control commands"""
@@ -34,26 +45,21 @@ class MotorController:
 
     def forward(self):
         """Move forward"""
-        self.pi.set_servo_pulsewidth(self.left_pin, self.max_pulse)
-        self.pi.set_servo_pulsewidth(self.right_pin, self.max_pulse)
+        self.set_pulses(self.max_pulse, self.max_pulse)
 
     def backward(self):
         """Move backward"""
         mid = (self.max_pulse + self.min_pulse) // 2
-        self.pi.set_servo_pulsewidth(self.left_pin, mid)
-        self.pi.set_servo_pulsewidth(self.right_pin, mid)
+        self.set_pulses(mid, mid)
 
     def left(self):
         """Turn left"""
-        self.pi.set_servo_pulsewidth(self.left_pin, self.min_pulse)
-        self.pi.set_servo_pulsewidth(self.right_pin, self.max_pulse)
+        self.set_pulses(self.min_pulse, self.max_pulse)
 
     def right(self):
         """Turn right"""
-        self.pi.set_servo_pulsewidth(self.left_pin, self.max_pulse)
-        self.pi.set_servo_pulsewidth(self.right_pin, self.min_pulse)
+        self.set_pulses(self.max_pulse, self.min_pulse)
 
     def stop(self):
         """Stop motors"""
-        self.pi.set_servo_pulsewidth(self.left_pin, self.min_pulse)
-        self.pi.set_servo_pulsewidth(self.right_pin, self.min_pulse)
+        self.set_pulses(self.min_pulse, self.min_pulse)
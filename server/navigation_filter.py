@@ -0,0 +1,265 @@
+# GPS/IMU extended Kalman filter for position, speed and heading
+#
+# State: east and north position (m) in a local plane around the first
+# fix, speed over ground (m/s), heading (rad, clockwise from north) and
+# the gyro's residual yaw-rate bias (rad/s). The IMU drives the
+# prediction at the filter rate (yaw rate from the gyro, forward
+# acceleration from the accelerometer); GPS fixes correct it whenever a
+# new one arrives. Fixes whose innovation is implausible are rejected,
+# and the filter restarts from the fix after several rejections in a row.
+#
+# Assumes the IMU is mounted with x pointing forward and z up.
+import math
+
+import numpy as np
+
+from sample_store import METERS_PER_DEGREE
+
+GRAVITY = 9.80665
+KNOTS_TO_MS = 1852.0 / 3600.0
+
+PX, PY, SPEED, HEADING, BIAS = range(5)
+
+# Chi-square 99.9% bounds for 2 and 1 degrees of freedom
+GATE_2D = 13.8
+GATE_1D = 10.8
+
+
+def wrap(angle):
+    """Wrap an angle to [-pi, pi)"""
+    return (angle + math.pi) % (2 * math.pi) - math.pi
+
+
+class NavigationFilter:
+    def __init__(self, config=None):
+        config = config or {}
+        self.accel_noise = config.get('accel_noise', 0.5)          # m/s^2
+        self.gyro_noise = config.get('gyro_noise', 0.02)           # rad/s
+        self.bias_noise = config.get('bias_noise', 1e-4)           # rad/s per sqrt(s)
+        self.drift_noise = config.get('drift_noise', 0.1)          # m^2/s, currents and wind
+        self.gps_uere = config.get('gps_uere', 2.5)                # m per unit of HDOP
+        self.min_course_speed = config.get('min_course_speed', 0.5)  # m/s
+        self.max_rejections = config.get('max_rejections', 5)
+        self.max_gap = config.get('max_gap', 1.0)                  # s, longest single prediction
+        self.yaw_rate_sign = config.get('yaw_rate_sign', -1)       # z up: counterclockwise is positive
+
+        self.x = None
+        self.P = None
+        self.origin = None
+        self.time = None
+        self.last_fix_key = None
+        self.last_fix_time = None
+        self.rejections = 0
+
+        self.fixes_used = 0
+        self.fixes_rejected = 0
+        self.resets = 0
+
+    def to_local(self, lat, lon):
+        """Latitude/longitude to east/north metres from the origin"""
+        lat0, lon0 = self.origin
+        east = (lon - lon0) * METERS_PER_DEGREE * math.cos(math.radians(lat0))
+        north = (lat - lat0) * METERS_PER_DEGREE
+        return east, north
+
+    def to_global(self, east, north):
+        """East/north metres from the origin to latitude/longitude"""
+        lat0, lon0 = self.origin
+        lat = lat0 + north / METERS_PER_DEGREE
+        lon = lon0 + east / (METERS_PER_DEGREE * math.cos(math.radians(lat0)))
+        return lat, lon
+
+    def reset(self, fix, now):
+        """Start from a GPS fix"""
+        self.origin = (fix['lat'], fix['lon'])
+        speed, course = self.fix_velocity(fix)
+        sigma = self.position_sigma(fix)
+
+        self.x = np.array([0.0, 0.0, speed or 0.0, course or 0.0, 0.0])
+        self.P = np.diag([
+            sigma ** 2, sigma ** 2,
+            1.0 if speed is not None else 4.0,
+            0.1 if course is not None else math.pi ** 2,
+            0.01 ** 2
+        ])
+        self.time = now
+        self.rejections = 0
+        self.resets += 1
+
+    def predict(self, now, yaw_rate=None, accel=None):
+        """Propagate to `now` using the gyro yaw rate (rad/s) and forward acceleration (m/s^2)"""
+        dt = now - self.time
+        if dt <= 0:
+            return
+        self.time = now
+        dt = min(dt, self.max_gap)
+
+        px, py, v, heading, bias = self.x
+        rate = 0.0 if yaw_rate is None else yaw_rate - bias
+        a = 0.0 if accel is None else accel
+        sin_h, cos_h = math.sin(heading), math.cos(heading)
+
+        self.x = np.array([
+            px + v * sin_h * dt,
+            py + v * cos_h * dt,
+            max(0.0, v + a * dt),
+            wrap(heading + rate * dt),
+            bias
+        ])
+
+        F = np.eye(5)
+        F[PX, SPEED] = sin_h * dt
+        F[PX, HEADING] = v * cos_h * dt
+        F[PY, SPEED] = cos_h * dt
+        F[PY, HEADING] = -v * sin_h * dt
+        if yaw_rate is not None:
+            F[HEADING, BIAS] = -dt
+
+        # Without IMU input the speed and heading are random walks with more noise
+        accel_noise = self.accel_noise if accel is not None else 2 * self.accel_noise
+        gyro_noise = self.gyro_noise if yaw_rate is not None else 0.2
+        Q = np.diag([
+            self.drift_noise * dt,
+            self.drift_noise * dt,
+            accel_noise ** 2 * dt,
+            gyro_noise ** 2 * dt,
+            self.bias_noise ** 2 * dt
+        ])
+        self.P = F @ self.P @ F.T + Q
+
+    def update(self, z, H, R, angle_index=None, gate=GATE_2D):
+        """Kalman update with a chi-square innovation gate; returns False if rejected"""
+        y = z - H @ self.x
+        if angle_index is not None:
+            y[angle_index] = wrap(y[angle_index])
+        S = H @ self.P @ H.T + R
+        S_inv = np.linalg.inv(S)
+        if float(y @ S_inv @ y) > gate:
+            return False
+
+        K = self.P @ H.T @ S_inv
+        self.x = self.x + K @ y
+        self.x[HEADING] = wrap(self.x[HEADING])
+        self.x[SPEED] = max(0.0, self.x[SPEED])
+        I_KH = np.eye(5) - K @ H
+        self.P = I_KH @ self.P @ I_KH.T + K @ R @ K.T  # Joseph form stays symmetric
+        return True
+
+    def update_gps(self, fix):
+        """Correct with a GPS fix: position, plus speed and course when moving"""
+        sigma = self.position_sigma(fix)
+        H = np.zeros((2, 5))
+        H[0, PX] = H[1, PY] = 1.0
+        accepted = self.update(np.array(self.to_local(fix['lat'], fix['lon'])), H, np.eye(2) * sigma ** 2)
+
+        speed, course = self.fix_velocity(fix)
+        if accepted and speed is not None:
+            H = np.zeros((1, 5))
+            H[0, SPEED] = 1.0
+            self.update(np.array([speed]), H, np.array([[0.2 ** 2]]), gate=GATE_1D)
+            if course is not None:
+                H = np.zeros((1, 5))
+                H[0, HEADING] = 1.0
+                # Course from GPS gets noisier as the boat slows down
+                course_sigma = max(0.05, 0.5 / max(speed, 0.1))
+                self.update(np.array([course]), H, np.array([[course_sigma ** 2]]), angle_index=0, gate=GATE_1D)
+        return accepted
+
+    def position_sigma(self, fix):
+        """1-sigma horizontal GPS error in metres"""
+        hdop = fix.get('hdop')
+        return self.gps_uere * max(hdop if hdop else 2.0, 0.8)
+
+    def fix_velocity(self, fix):
+        """GPS speed (m/s) and course (rad), course only when moving fast enough"""
+        knots = fix.get('speed_knots')
+        if knots is None:
+            return None, None
+        speed = knots * KNOTS_TO_MS
+        course = fix.get('course')
+        if course is None or speed < self.min_course_speed:
+            return speed, None
+        return speed, wrap(math.radians(course))
+
+    def step(self, gps, imu, now):
+        """Advance to `now` with the latest readings; returns the estimate or None"""
+        fix = gps if gps and gps.get('fix') and 'lat' in gps else None
+        fix_key = None if fix is None else (
+            fix.get('utc'), fix['lat'], fix['lon'], fix.get('speed_knots'), fix.get('course')
+        )
+        new_fix = fix is not None and fix_key != self.last_fix_key
+
+        if self.x is None:
+            if not new_fix:
+                return None
+            self.last_fix_key = fix_key
+            self.last_fix_time = now
+            self.reset(fix, now)
+            return self.get_estimate()
+
+        yaw_rate, accel = self.imu_inputs(imu)
+        self.predict(now, yaw_rate, accel)
+
+        if new_fix:
+            self.last_fix_key = fix_key
+            self.last_fix_time = now
+            if self.update_gps(fix):
+                self.fixes_used += 1
+                self.rejections = 0
+            else:
+                self.fixes_rejected += 1
+                self.rejections += 1
+                if self.rejections >= self.max_rejections:
+                    # Consistently disagreeing with GPS: trust GPS and start over
+                    self.reset(fix, now)
+
+        return self.get_estimate()
+
+    def imu_inputs(self, imu):
+        """Yaw rate (rad/s, clockwise positive) and forward acceleration (m/s^2)"""
+        if not imu or not imu.get('gyro'):
+            return None, None
+        yaw_rate = self.yaw_rate_sign * math.radians(imu['gyro']['z'])
+
+        accel = imu.get('accel') or {}
+        orientation = imu.get('orientation') or {}
+        if accel.get('x') is None:
+            return yaw_rate, None
+        # Remove the part of gravity the pitch projects onto the forward axis
+        pitch = math.radians(orientation.get('pitch') or 0.0)
+        return yaw_rate, accel['x'] + GRAVITY * math.sin(pitch)
+
+    def get_estimate(self):
+        """Fused position, velocity and heading with 1-sigma uncertainties"""
+        if self.x is None:
+            return None
+        px, py, v, heading, bias = (float(value) for value in self.x)
+        lat, lon = self.to_global(px, py)
+        sd = np.sqrt(np.maximum(np.diag(self.P), 0))
+        return {
+            'lat': round(lat, 7),
+            'lon': round(lon, 7),
+            'speed': round(v, 2),
+            'heading': round(math.degrees(heading) % 360, 1),
+            'velocity': {
+                'east': round(v * math.sin(heading), 2),
+                'north': round(v * math.cos(heading), 2)
+            },
+            'sigma': {
+                'east': round(float(sd[PX]), 2),
+                'north': round(float(sd[PY]), 2),
+                'speed': round(float(sd[SPEED]), 2),
+                'heading': round(math.degrees(sd[HEADING]), 1)
+            },
+            'position_error': round(math.hypot(sd[PX], sd[PY]), 2),
+            'gyro_bias': round(math.degrees(bias), 3),
+            'fix_age': None if self.last_fix_time is None else round(self.time - self.last_fix_time, 2)
+        }
+
+    def get_stats(self):
+        """Fix counters"""
+        return {
+            'fixes_used': self.fixes_used,
+            'fixes_rejected': self.fixes_rejected,
+            'resets': self.resets
+        }
@@ -0,0 +1,247 @@
+# Incremental NMEA 0183 parser
+#
+# Bytes from the serial port are fed in whatever chunks they arrive in;
+# complete sentences are checksum-verified and folded into one fix state
+# combining GGA (position, fix quality), RMC (status, date, speed, course),
+# VTG (speed, course), GSA (2D/3D, DOPs) and GSV (satellites in view).
+import threading
+import time
+from datetime import datetime, timezone
+
+MAX_SENTENCE_LENGTH = 120  # NMEA allows 82; leave room for vendor extensions
+
+FIX_TYPES = {1: 'none', 2: '2D', 3: '3D'}
+
+
+def checksum_ok(sentence):
+    """True if a '$...*hh' sentence (without line ending) has a valid checksum"""
+    star = sentence.rfind(b'*')
+    if star < 1 or len(sentence) < star + 3:
+        return False
+    try:
+        expected = int(sentence[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+
+    checksum = 0
+    for byte in sentence[1:star]:
+        checksum ^= byte
+    return checksum == expected
+
+
+def parse_coordinate(value, hemisphere):
+    """ddmm.mmmm / dddmm.mmmm plus N/S/E/W to signed decimal degrees"""
+    if not value:
+        return None
+    raw = float(value)
+    degrees = int(raw // 100)
+    result = degrees + (raw - degrees * 100) / 60
+    return -result if hemisphere in ('S', 'W') else result
+
+
+def parse_float(value):
+    """Float field, None when empty"""
+    return float(value) if value else None
+
+
+def parse_int(value):
+    """Integer field, None when empty"""
+    return int(value) if value else None
+
+
+class NMEAParser:
+    def __init__(self, fix_timeout=3.0):
+        self.fix_timeout = fix_timeout
+        self.buffer = b''
+        self.lock = threading.Lock()
+
+        self.state = {
+            'lat': None, 'lon': None, 'alt': None,
+            'fix_quality': 0, 'fix_type': 'none', 'rmc_valid': False,
+            'satellites': 0, 'satellites_in_view': 0, 'snr_mean': None,
+            'hdop': None, 'pdop': None, 'vdop': None,
+            'speed_knots': None, 'speed_kmh': None, 'course': None,
+            'utc_time': None, 'utc_date': None
+        }
+        self.position_time = None
+        self.gsv = {}  # talker -> (satellites in view, SNRs) of the last complete cycle
+        self.gsv_partial = {}
+
+        self.sentences = 0
+        self.checksum_errors = 0
+        self.parse_errors = 0
+        self.counts = {}
+
+    def feed(self, data):
+        """Consume raw bytes; returns the number of sentences parsed"""
+        self.buffer += data
+        if b'\n' not in self.buffer:
+            if len(self.buffer) > MAX_SENTENCE_LENGTH:
+                self.buffer = b''  # line noise without line endings
+            return 0
+
+        *lines, self.buffer = self.buffer.split(b'\n')
+        parsed = 0
+        for line in lines:
+            start = line.rfind(b'$')
+            if start < 0:
+                continue
+            sentence = line[start:].rstrip(b'\r')
+            if len(sentence) > MAX_SENTENCE_LENGTH:
+                continue
+            if not checksum_ok(sentence):
+                self.checksum_errors += 1
+                continue
+            if self.handle(sentence[1:sentence.rfind(b'*')].decode('ascii', errors='replace')):
+                parsed += 1
+        return parsed
+
+    def handle(self, body):
+        """Apply one checksum-verified sentence (without '$' and checksum)"""
+        fields = body.split(',')
+        address = fields[0]
+        if len(address) != 5 or address.startswith('P'):
+            return False  # proprietary sentence
+        talker, kind = address[:2], address[2:]
+
+        handler = getattr(self, f"handle_{kind.lower()}", None)
+        if handler is None:
+            return False
+
+        try:
+            with self.lock:
+                handler(talker, fields)
+        except (ValueError, IndexError):
+            self.parse_errors += 1
+            return False
+
+        self.sentences += 1
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        return True
+
+    def set_position(self, lat, lon):
+        """Store a new position if both coordinates are present"""
+        if lat is not None and lon is not None:
+            self.state['lat'] = lat
+            self.state['lon'] = lon
+            self.position_time = time.monotonic()
+
+    def handle_gga(self, talker, f):
+        """Time, position, fix quality, satellites used, HDOP, altitude"""
+        self.state['utc_time'] = f[1] or self.state['utc_time']
+        quality = parse_int(f[6]) or 0
+        self.state['fix_quality'] = quality
+        self.state['satellites'] = parse_int(f[7]) or 0
+        self.state['hdop'] = parse_float(f[8])
+        if quality > 0:
+            self.set_position(parse_coordinate(f[2], f[3]), parse_coordinate(f[4], f[5]))
+            self.state['alt'] = parse_float(f[9])
+
+    def handle_rmc(self, talker, f):
+        """Time, status, position, speed, course and date"""
+        self.state['utc_time'] = f[1] or self.state['utc_time']
+        self.state['rmc_valid'] = f[2] == 'A'
+        if f[2] == 'A':
+            self.set_position(parse_coordinate(f[3], f[4]), parse_coordinate(f[5], f[6]))
+            speed = parse_float(f[7])
+            if speed is not None:
+                self.state['speed_knots'] = speed
+                self.state['speed_kmh'] = speed * 1.852
+            self.state['course'] = parse_float(f[8])
+        self.state['utc_date'] = f[9] or self.state['utc_date']
+
+    def handle_vtg(self, talker, f):
+        """Course over ground and speed in knots and km/h"""
+        if len(f) > 9 and f[9] == 'N':
+            return  # mode indicator: data not valid
+        course = parse_float(f[1])
+        if course is not None:
+            self.state['course'] = course
+        knots = parse_float(f[5])
+        kmh = parse_float(f[7])
+        if knots is not None:
+            self.state['speed_knots'] = knots
+            self.state['speed_kmh'] = kmh if kmh is not None else knots * 1.852
+
+    def handle_gsa(self, talker, f):
+        """2D/3D fix type and dilution of precision"""
+        self.state['fix_type'] = FIX_TYPES.get(parse_int(f[2]), 'none')
+        self.state['pdop'] = parse_float(f[15])
+        self.state['hdop'] = parse_float(f[16])
+        self.state['vdop'] = parse_float(f[17])
+
+    def handle_gsv(self, talker, f):
+        """Satellites in view; one cycle spans several sentences per talker"""
+        total, number = int(f[1]), int(f[2])
+        in_view = parse_int(f[3]) or 0
+        if number == 1:
+            self.gsv_partial[talker] = []
+
+        snrs = self.gsv_partial.setdefault(talker, [])
+        # Groups of PRN, elevation, azimuth, SNR; an optional signal id may follow
+        for i in range(4, len(f) - 3, 4):
+            snr = parse_int(f[i + 3])
+            if f[i] and snr:
+                snrs.append(snr)
+
+        if number == total:
+            self.gsv[talker] = (in_view, self.gsv_partial.pop(talker))
+            all_snrs = [snr for _, talker_snrs in self.gsv.values() for snr in talker_snrs]
+            self.state['satellites_in_view'] = sum(count for count, _ in self.gsv.values())
+            self.state['snr_mean'] = round(sum(all_snrs) / len(all_snrs), 1) if all_snrs else None
+
+    def get_fix(self):
+        """Snapshot of the current fix; position fields only when it is valid"""
+        with self.lock:
+            state = dict(self.state)
+            position_time = self.position_time
+
+        age = None if position_time is None else time.monotonic() - position_time
+        valid = (
+            age is not None and age <= self.fix_timeout
+            and (state['fix_quality'] > 0 or state['rmc_valid'])
+        )
+
+        fix = {
+            'fix': valid,
+            'satellites': state['satellites'],
+            'satellites_in_view': state['satellites_in_view'],
+            'snr_mean': state['snr_mean'],
+            'fix_quality': state['fix_quality'] if valid else 0,
+            'fix_type': state['fix_type'] if valid else 'none',
+            'hdop': state['hdop'],
+            'pdop': state['pdop'],
+            'vdop': state['vdop'],
+            'utc': self.utc_timestamp(state['utc_date'], state['utc_time'])
+        }
+        if valid:
+            fix.update({
+                'lat': round(state['lat'], 6),
+                'lon': round(state['lon'], 6),
+                'alt': round(state['alt'], 1) if state['alt'] is not None else 0,
+                'speed_knots': state['speed_knots'],
+                'speed_kmh': None if state['speed_kmh'] is None else round(state['speed_kmh'], 2),
+                'course': state['course'],
+                'age': round(age, 2)
+            })
+        return fix
+
+    @staticmethod
+    def utc_timestamp(date, utc_time):
+        """ISO timestamp from RMC date (ddmmyy) and hhmmss.ss time"""
+        if not date or not utc_time:
+            return None
+        try:
+            parsed = datetime.strptime(date + utc_time.split('.')[0], '%d%m%y%H%M%S')
+            return parsed.replace(tzinfo=timezone.utc).isoformat()
+        except ValueError:
+            return None
+
+    def get_stats(self):
+        """Sentence counters"""
+        return {
+            'sentences': self.sentences,
+            'by_type': dict(self.counts),
+            'checksum_errors': self.checksum_errors,
+            'parse_errors': self.parse_errors
+        }
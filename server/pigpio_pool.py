@@ -0,0 +1,230 @@
+# One pigpio connection shared by every actuator, with batched pin updates
+#
+# Motors, pumps and servos used to open a socket to pigpiod each and set
+# pins one round-trip at a time, so the two ESCs of a turn changed a
+# round-trip apart. Now the supervisor owns a single 'pigpio' device and
+# every controller registers its pin setup with the pool. update() applies
+# several pin changes as one operation: servo/ESC pulse widths through a
+# short script stored on the daemon (run with the widths as parameters,
+# so all pins change within microseconds of each other) and relay levels
+# through bank set/clear writes. Script runs are serialized, since every
+# caller with the same pin count shares a script. Every update's round-trip
+# is recorded, and so is the time taken by updates that still needed more
+# than one pin command, which bounds how far apart their pins changed.
+import atexit
+import threading
+import time
+import weakref
+
+import pigpio
+
+from device_supervisor import DeviceSupervisor, open_pigpio, close_pigpio, check_pigpio
+from histogram import Histogram, FAST_BOUNDS_MS
+
+# Script parameters p0-p9 hold (pin, width) pairs
+MAX_SCRIPT_PULSES = 5
+
+# Seconds to wait for a script to halt, and between "script busy" messages
+SCRIPT_HALT_TIMEOUT = 0.05
+BUSY_REPORT_INTERVAL = 10.0
+
+_pools = weakref.WeakKeyDictionary()
+_pools_lock = threading.Lock()
+
+
+def shared_pool(devices=None):
+    """The pigpio pool of a supervisor, created on first use"""
+    devices = devices or DeviceSupervisor()
+    with _pools_lock:
+        pool = _pools.get(devices)
+        if pool is None:
+            pool = _pools[devices] = PigpioPool(devices)
+    return pool
+
+
+def pulse_script(count):
+    """Script text setting `count` servo pulses from its parameters"""
+    return ' '.join(f'SERVO p{2 * i} p{2 * i + 1}' for i in range(count))
+
+
+class PigpioPool:
+    def __init__(self, devices):
+        self.devices = devices
+        self.setups = []
+        self.scripts = {}  # pulse count -> stored script id, for the current connection
+        self.lock = threading.Lock()
+        self.script_lock = threading.Lock()  # one script run at a time
+        self.busy_reported = 0.0
+        self.latency = Histogram(FAST_BOUNDS_MS)  # ms per update, first command to last reply
+        self.skew = Histogram(FAST_BOUNDS_MS)     # ms per update needing several pin commands
+        self.stats = {'updates': 0, 'pins': 0, 'scripted': 0, 'sequential': 0, 'busy': 0, 'errors': 0}
+
+        self.devices.add('pigpio', open_pigpio, self.close, check_pigpio, self.setup)
+        self.devices.start()
+        atexit.register(self.cleanup)
+
+    def add_setup(self, setup):
+        """Run setup(pi) now if connected and after every (re)connect"""
+        with self.lock:
+            self.setups.append(setup)
+        pi = self.get()
+        if pi is not None:
+            try:
+                setup(pi)
+            except Exception as e:
+                print(f"pigpio setup error: {e}")
+                self.devices.report_failure('pigpio', e)
+
+    def setup(self, pi):
+        """Put every actuator into a known state on a new connection"""
+        with self.lock:
+            self.scripts = {}
+            setups = list(self.setups)
+        for setup in setups:
+            setup(pi)
+
+    def get(self):
+        """Current connection, or None while pigpio is down"""
+        return self.devices.get('pigpio')
+
+    def update(self, pulses=(), levels=()):
+        """Apply several pin changes as one operation; returns False while pigpio is down.
+
+        pulses are (pin, width) servo/ESC pulse widths, levels are (pin, 0/1) outputs.
+        """
+        pi = self.get()
+        if pi is None:
+            return False
+        pulses = list(pulses)
+        levels = list(levels)
+        start = time.perf_counter()
+        try:
+            commands = self.set_pulses(pi, pulses) + self.set_levels(pi, levels)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"pigpio error: {e}")
+            self.devices.report_failure('pigpio', e)
+            return False
+
+        elapsed = (time.perf_counter() - start) * 1000
+        self.latency.observe(elapsed)
+        if commands > 1:
+            # The first pin changed after the first command, the last before the
+            # final reply; a single script or bank write has no client-side skew
+            self.skew.observe(elapsed)
+        self.stats['updates'] += 1
+        self.stats['pins'] += len(pulses) + len(levels)
+        return True
+
+    def set_pulses(self, pi, pulses):
+        """Pulse widths in one script run where possible; returns the number of pin commands"""
+        if len(pulses) == 1:
+            pi.set_servo_pulsewidth(*pulses[0])
+            return 1
+        commands = 0
+        for offset in range(0, len(pulses), MAX_SCRIPT_PULSES):
+            chunk = pulses[offset:offset + MAX_SCRIPT_PULSES]
+            script_id = self.script(pi, len(chunk))
+            if script_id is not None and self.run_script(pi, script_id, chunk):
+                commands += 1
+                continue
+
+            self.stats['sequential'] += 1
+            for pin, width in chunk:
+                pi.set_servo_pulsewidth(pin, width)
+            commands += len(chunk)
+        return commands
+
+    def run_script(self, pi, script_id, chunk):
+        """Run a pulse script, waiting once for a previous run to halt; False if it stays busy"""
+        params = [value for pulse in chunk for value in pulse]
+        with self.script_lock:
+            try:
+                pi.run_script(script_id, params)
+            except pigpio.error:
+                try:
+                    self.wait_halted(pi, script_id)
+                    pi.run_script(script_id, params)
+                except pigpio.error as e:
+                    self.report_busy(e)
+                    return False
+            self.stats['scripted'] += 1
+        return True
+
+    def wait_halted(self, pi, script_id):
+        """Poll until a script is no longer running"""
+        deadline = time.monotonic() + SCRIPT_HALT_TIMEOUT
+        while pi.script_status(script_id)[0] == pigpio.PI_SCRIPT_RUNNING:
+            if time.monotonic() > deadline:
+                raise pigpio.error('script still running')
+            time.sleep(0.001)
+
+    def report_busy(self, error):
+        """Count a busy script, printing at most every BUSY_REPORT_INTERVAL seconds"""
+        self.stats['busy'] += 1
+        now = time.monotonic()
+        if now - self.busy_reported >= BUSY_REPORT_INTERVAL:
+            self.busy_reported = now
+            print(f"pigpio script busy, setting pins one by one ({self.stats['busy']} so far): {error}")
+
+    def set_levels(self, pi, levels):
+        """Output levels with one bank write per direction; returns the number of pin commands"""
+        if len(levels) == 1:
+            pi.write(*levels[0])
+            return 1
+        high = sum(1 << pin for pin, level in levels if level)
+        low = sum(1 << pin for pin, level in levels if not level)
+        if high:
+            pi.set_bank_1(high)
+        if low:
+            pi.clear_bank_1(low)
+        return bool(high) + bool(low)
+
+    def script(self, pi, count):
+        """Id of the script for `count` pulses, stored on first use; None if the daemon refuses it"""
+        with self.lock:
+            if count not in self.scripts:
+                self.scripts[count] = self.store_script(pi, count)
+            return self.scripts[count]
+
+    def store_script(self, pi, count):
+        """Store a pulse script and wait until the daemon has checked it"""
+        try:
+            script_id = pi.store_script(pulse_script(count).encode())
+            deadline = time.monotonic() + 0.5
+            while pi.script_status(script_id)[0] == pigpio.PI_SCRIPT_INITING:
+                if time.monotonic() > deadline:
+                    raise pigpio.error('script not ready')
+                time.sleep(0.001)
+            return script_id
+        except pigpio.error as e:
+            # Not retried on this connection
+            print(f"pigpio script unavailable, setting pins one by one: {e}")
+            return None
+
+    def close(self, pi):
+        """Delete the stored scripts (they outlive the connection) and disconnect"""
+        with self.lock:
+            scripts, self.scripts = self.scripts, {}
+        for script_id in scripts.values():
+            if script_id is not None:
+                try:
+                    pi.delete_script(script_id)
+                except Exception:
+                    pass
+        close_pigpio(pi)
+
+    def cleanup(self):
+        """Close the shared connection at exit, after every actuator's own cleanup"""
+        pi = self.get()
+        if pi is not None and pi.connected:
+            self.close(pi)
+
+    def get_stats(self):
+        """Update counts and latency/skew percentiles"""
+        return dict(
+            self.stats,
+            latency_p50_ms=self.latency.percentile(0.5),
+            latency_p99_ms=self.latency.percentile(0.99),
+            skew_p99_ms=self.skew.percentile(0.99)
+        )
@@ -2,39 +2,58 @@
 import pigpio
 import asyncio
 
+from device_supervisor import DeviceSupervisor
+from pigpio_pool import shared_pool
+
 class PumpController:
-    def __init__(self, pump_pins, pump_config):
-        self.pi = pigpio.pi()
+    def __init__(self, pump_pins, pump_config, devices=None):
         self.pump_pins = pump_pins
         self.default_duration = pump_config['default']
+        self.tasks = set()  # pending turn-offs, referenced so they can't be garbage collected
         
-        # Setup pump pins
+        # One pigpio connection shared with the other actuators; the supervisor
+        # reconnects it in the background
+        self.devices = devices or DeviceSupervisor()
+        self.gpio = shared_pool(self.devices)
+        self.gpio.add_setup(self.setup_pins)
+
+    def setup_pins(self, pi):
+        """Configure the relay pins with every pump off after each (re)connect"""
         for pin in self.pump_pins:
-            self.pi.set_mode(pin, pigpio.OUTPUT)
-            self.pi.write(pin, 1)  # Turn off initially
-            
+            pi.set_mode(pin, pigpio.OUTPUT)
+            pi.write(pin, 1)  # Turn off initially
+
+    def write(self, pin, level):
+        """Drive one relay pin; returns False while pigpio is down"""
+        return self.gpio.update(levels=[(pin, level)])
+
     def activate_pump(self, pump_id, duration, location=None):
         """Activate a pump for specified duration"""
         if pump_id < 1 or pump_id > len(self.pump_pins):
             print(f"Invalid pump ID: {pump_id}")
-            return
-            
+            return False
+        
         pin = self.pump_pins[pump_id - 1]
         
         # Turn on pump
-        self.pi.write(pin, 0)
+        if not self.write(pin, 0):
+            print(f"Pump {pump_id} not activated: pump controller unavailable")
+            return False
         print(f"Pump {pump_id} activated for {duration}s")
         
         # Schedule turn off
-        asyncio.create_task(self.deactivate_pump(pin, duration))
-        
+        task = asyncio.create_task(self.deactivate_pump(pin, duration))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return True
+
     async def deactivate_pump(self, pin, duration):
         """Deactivate pump after duration"""
         await asyncio.sleep(duration)
-        self.pi.write(pin, 1)
+        # If pigpio dropped meanwhile, the reconnect turns every pump off
+        self.write(pin, 1)
         print(f"Pump on pin {pin} deactivated")
-        
+
     def cleanup(self):
         """Clean up pump resources"""
-        for pin in self.pump_pins:
-            self.pi.write(pin, 1)  # Turn off all pumps
\ No newline at end of file
+        self.gpio.update(levels=[(pin, 1) for pin in self.pump_pins])  # Turn off all pumps
@@ -0,0 +1,138 @@
+# Replay recorded telemetry through the navigation filter
+#
+# Runs GPS and IMU columns from telemetry recordings through
+# NavigationFilter using the recorded timestamps, as fast as the CPU
+# allows, so filter settings can be tuned against real runs offline.
+#
+#   python replay_navigation.py telemetry/telemetry_20250101_120000.tlm.gz
+#   python replay_navigation.py --dir telemetry --config tuned.json --csv out.csv
+import argparse
+import csv
+import glob
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+from navigation_filter import NavigationFilter
+from sample_store import distance_m
+from telemetry_recorder import read_file
+
+
+def value(columns, name, i):
+    """Column value at row i, None when missing or not recorded"""
+    column = columns.get(name)
+    if column is None or np.isnan(column[i]):
+        return None
+    return float(column[i])
+
+
+def readings(chunks):
+    """(time s, gps dict, imu dict) for every recorded row"""
+    for columns in chunks:
+        for i in range(len(columns['time_ms'])):
+            gps = {
+                'fix': bool(value(columns, 'gps_fix', i)),
+                'speed_knots': value(columns, 'gps_speed', i),
+                'course': value(columns, 'gps_course', i),
+                'hdop': value(columns, 'gps_hdop', i)
+            }
+            lat = value(columns, 'gps_lat', i)
+            lon = value(columns, 'gps_lon', i)
+            if gps['fix'] and lat is not None and lon is not None:
+                gps.update(lat=lat, lon=lon)
+
+            imu = None
+            gyro_z = value(columns, 'imu_gyro_z', i)
+            if gyro_z is not None:
+                imu = {
+                    'gyro': {'z': gyro_z},
+                    'accel': {'x': value(columns, 'imu_accel_x', i)},
+                    'orientation': {'pitch': value(columns, 'imu_pitch', i)}
+                }
+            yield columns['time_ms'][i] / 1000.0, gps, imu
+
+
+def replay(paths, config=None, csv_path=None):
+    """Run the filter over the recordings; returns summary statistics"""
+    nav = NavigationFilter(config)
+    writer = None
+    if csv_path:
+        out = open(csv_path, 'w', newline='')
+        writer = csv.writer(out)
+        writer.writerow(['time', 'gps_lat', 'gps_lon', 'lat', 'lon', 'speed', 'heading', 'position_error'])
+
+    rows = 0
+    first = last = None
+    residuals = []
+    last_fix = None
+    started = time.perf_counter()
+    try:
+        for path in paths:
+            for now, gps, imu in readings(read_file(path)):
+                if last is not None and now <= last:
+                    continue  # overlapping or out of order rows
+                first = now if first is None else first
+                last = now
+                rows += 1
+
+                estimate = nav.step(gps, imu, now)
+                if estimate is None:
+                    continue
+
+                fix = (gps.get('lat'), gps.get('lon'))
+                if fix[0] is not None and fix != last_fix:
+                    residuals.append(distance_m(fix[0], fix[1], estimate['lat'], estimate['lon']))
+                    last_fix = fix
+
+                if writer:
+                    writer.writerow([
+                        round(now, 3), gps.get('lat'), gps.get('lon'), estimate['lat'], estimate['lon'],
+                        estimate['speed'], estimate['heading'], estimate['position_error']
+                    ])
+    finally:
+        if writer:
+            out.close()
+
+    elapsed = time.perf_counter() - started
+    duration = float(last - first) if rows else 0.0
+    return {
+        'rows': rows,
+        'duration': round(duration, 1),
+        'wall_time': round(elapsed, 3),
+        'speedup': round(duration / elapsed, 1) if elapsed > 0 else None,
+        'fix_residual_rms': round(math.sqrt(np.mean(np.square(residuals))), 2) if residuals else None,
+        **nav.get_stats()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay telemetry recordings through the navigation filter')
+    parser.add_argument('files', nargs='*', help='telemetry_*.tlm.gz files, replayed in the given order')
+    parser.add_argument('--dir', help='replay every recording in this directory')
+    parser.add_argument('--config', help='JSON file with navigation settings (defaults to config/settings.json)')
+    parser.add_argument('--csv', help='write the fused track to this CSV file')
+    args = parser.parse_args()
+
+    paths = list(args.files)
+    if args.dir:
+        paths += sorted(glob.glob(os.path.join(args.dir, 'telemetry_*.tlm.gz')))
+    if not paths:
+        parser.error('no recordings given')
+
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+    else:
+        with open(os.path.join(os.path.dirname(__file__), '../config/settings.json')) as f:
+            config = json.load(f).get('navigation', {})
+
+    result = replay(paths, config, args.csv)
+    for key, item in result.items():
+        print(f"{key}: {item}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+# Append-only sample store backed by SQLite in WAL mode
+import json
+import math
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+STATS_VERSION = '1'
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE = 111320.0
+
+
+def parse_timestamp(value):
+    """Convert an ISO timestamp string or epoch number to epoch seconds"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    dt = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def try_parse_timestamp(value):
+    """parse_timestamp, or None for a value it cannot read"""
+    try:
+        return parse_timestamp(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def distance_m(lat1, lon1, lat2, lon2):
+    """Haversine distance in meters"""
+    if lat1 is None or lon1 is None:
+        return None
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+class SampleStore:
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.lock = threading.Lock()
+        self.extent = None
+
+        db_dir = os.path.dirname(db_file)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.conn = self.connect()
+        self.setup_schema()
+
+        # Stores created before the aggregates existed need one rebuild
+        if self.get_meta('stats_version') != STATS_VERSION:
+            self.rebuild_statistics()
+
+    def connect(self):
+        """Open a connection with WAL journaling and fsync on every commit"""
+        conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=FULL')
+        conn.create_function('distance_m', 4, distance_m, deterministic=True)
+        return conn
+
+    def setup_schema(self):
+        """Create tables if they don't exist"""
+        with self.lock, self.conn:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS samples (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sample_id TEXT UNIQUE NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    ts REAL,
+                    pump_id INTEGER,
+                    duration REAL,
+                    latitude REAL,
+                    longitude REAL,
+                    altitude REAL,
+                    data TEXT NOT NULL
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+            ''')
+            self.upgrade_schema()
+            
+            # Indexes for time-window and pump queries
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_samples_ts ON samples (ts)')
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_samples_pump ON samples (pump_id, ts)')
+            
+            # R-tree spatial index, kept in sync by a trigger on insert
+            new_rtree = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'samples_rtree'"
+            ).fetchone() is None
+            self.conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS samples_rtree USING rtree (
+                    id, min_lat, max_lat, min_lon, max_lon
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS samples_rtree_insert
+                AFTER INSERT ON samples
+                WHEN NEW.latitude IS NOT NULL AND NEW.longitude IS NOT NULL
+                BEGIN
+                    INSERT INTO samples_rtree VALUES (
+                        NEW.id, NEW.latitude, NEW.latitude, NEW.longitude, NEW.longitude
+                    );
+                END
+            ''')
+            if new_rtree:
+                # Index rows stored before the R-tree existed, once
+                self.conn.execute('''
+                    INSERT INTO samples_rtree
+                    SELECT id, latitude, latitude, longitude, longitude FROM samples
+                    WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                ''')
+            
+            # Running per-day, per-pump aggregates, updated in the same
+            # transaction as each insert so statistics never need a rescan
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS sample_daily_stats (
+                    day TEXT NOT NULL,
+                    pump_id INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    duration_total REAL NOT NULL,
+                    first_ts REAL,
+                    last_ts REAL,
+                    PRIMARY KEY (day, pump_id)
+                )
+            ''')
+            self.conn.execute('''
+                CREATE TRIGGER IF NOT EXISTS sample_stats_insert
+                AFTER INSERT ON samples
+                BEGIN
+                    INSERT INTO sample_daily_stats
+                        (day, pump_id, count, duration_total, first_ts, last_ts)
+                    VALUES (
+                        substr(NEW.timestamp, 1, 10), COALESCE(NEW.pump_id, 0), 1,
+                        COALESCE(NEW.duration, 0), NEW.ts, NEW.ts
+                    )
+                    ON CONFLICT (day, pump_id) DO UPDATE SET
+                        count = count + 1,
+                        duration_total = duration_total + excluded.duration_total,
+                        first_ts = MIN(first_ts, excluded.first_ts),
+                        last_ts = MAX(last_ts, excluded.last_ts);
+                END
+            ''')
+
+    def upgrade_schema(self):
+        """Add columns missing from stores created by older versions"""
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(samples)')}
+        if 'ts' not in columns:
+            self.conn.execute('ALTER TABLE samples ADD COLUMN ts REAL')
+            rows = self.conn.execute('SELECT id, timestamp FROM samples').fetchall()
+            self.conn.executemany(
+                'UPDATE samples SET ts = ? WHERE id = ?',
+                # An unreadable legacy timestamp leaves ts NULL rather than
+                # failing the upgrade on every startup
+                [(try_parse_timestamp(timestamp), row_id) for row_id, timestamp in rows]
+            )
+
+    def _row_values(self, sample):
+        """Flatten a sample dict into column values"""
+        location = sample.get('location') or {}
+        return (
+            sample['sample_id'],
+            sample['timestamp'],
+            parse_timestamp(sample['timestamp']),
+            sample.get('pump_id'),
+            sample.get('duration'),
+            location.get('latitude'),
+            location.get('longitude'),
+            location.get('altitude'),
+            json.dumps(sample, separators=(',', ':'))
+        )
+
+    def append(self, sample):
+        """Append a single sample; committed and fsync'd before returning"""
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO samples '
+                '(sample_id, timestamp, ts, pump_id, duration, latitude, longitude, altitude, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                self._row_values(sample)
+            )
+            self._grow_extent(sample)
+        return cursor.rowcount == 1
+
+    def _grow_extent(self, sample):
+        """Keep the cached spatial extent current without rescanning"""
+        location = sample.get('location') or {}
+        lat, lon = location.get('latitude'), location.get('longitude')
+        if self.extent is None or lat is None or lon is None:
+            return
+        lat_lo, lat_hi, lon_lo, lon_hi = self.extent
+        if lat_lo is None:
+            self.extent = (lat, lat, lon, lon)
+        else:
+            self.extent = (min(lat_lo, lat), max(lat_hi, lat), min(lon_lo, lon), max(lon_hi, lon))
+
+    def append_many(self, samples):
+        """Append several samples in one transaction, returns number inserted"""
+        with self.lock, self.conn:
+            cursor = self.conn.executemany(
+                'INSERT OR IGNORE INTO samples '
+                '(sample_id, timestamp, ts, pump_id, duration, latitude, longitude, altitude, data) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [self._row_values(s) for s in samples]
+            )
+            self.extent = None
+        return max(cursor.rowcount, 0)
+
+    def count(self):
+        """Total number of stored samples"""
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM samples').fetchone()[0]
+
+    def get_samples(self, limit=None):
+        """Get samples in insertion order, optionally only the most recent"""
+        query = 'SELECT data FROM samples ORDER BY id'
+        params = ()
+        if limit:
+            query = 'SELECT data FROM (SELECT id, data FROM samples ORDER BY id DESC LIMIT ?) ORDER BY id'
+            params = (limit,)
+
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def iter_samples(self, batch_size=500):
+        """Stream samples in insertion order without loading them all.
+
+        Uses its own connection so it can run on a worker thread while
+        the main connection keeps accepting inserts.
+        """
+        conn = sqlite3.connect(self.db_file)
+        try:
+            cursor = conn.execute('SELECT data FROM samples ORDER BY id')
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield json.loads(row[0])
+        finally:
+            conn.close()
+
+    def bbox_coverage(self, min_lat, min_lon, max_lat, max_lon):
+        """Fraction of the stored samples' extent covered by a bounding box"""
+        with self.lock:
+            if self.extent is None:
+                self.extent = self.conn.execute(
+                    'SELECT MIN(min_lat), MAX(max_lat), MIN(min_lon), MAX(max_lon) FROM samples_rtree'
+                ).fetchone()
+            lat_lo, lat_hi, lon_lo, lon_hi = self.extent
+
+        if lat_lo is None:
+            return 0.0
+        area = max(lat_hi - lat_lo, 1e-9) * max(lon_hi - lon_lo, 1e-9)
+        overlap_lat = max(0.0, min(max_lat, lat_hi) - max(min_lat, lat_lo))
+        overlap_lon = max(0.0, min(max_lon, lon_hi) - max(min_lon, lon_lo))
+        return overlap_lat * overlap_lon / area
+
+    def query(self, bbox=None, center=None, radius_m=None, start=None, end=None,
+              pump_id=None, cursor=None, limit=500, newest_first=False):
+        """Filtered, paginated sample query.
+
+        bbox is (min_lat, min_lon, max_lat, max_lon), center is (lat, lon)
+        used with radius_m, start/end are ISO strings or epoch seconds.
+        Pages are keyed on the row id, so pass the returned next_cursor
+        back in to continue.
+        """
+        limit = max(1, min(int(limit), 5000))
+        where = []
+        params = []
+
+        if center is not None and radius_m is not None:
+            lat, lon = float(center[0]), float(center[1])
+            radius_m = float(radius_m)
+            dlat = radius_m / METERS_PER_DEGREE
+            dlon = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+            radius_box = (lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+            bbox = radius_box if bbox is None else (
+                max(bbox[0], radius_box[0]), max(bbox[1], radius_box[1]),
+                min(bbox[2], radius_box[2]), min(bbox[3], radius_box[3])
+            )
+            where.append('distance_m(latitude, longitude, ?, ?) <= ?')
+            params.extend([lat, lon, radius_m])
+
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = (float(v) for v in bbox)
+            if self.bbox_coverage(min_lat, min_lon, max_lat, max_lon) < 0.05:
+                # The R-tree stores float32 boxes rounded outward, so it can only
+                # narrow the candidates by overlap; the exact test below decides
+                where.append(
+                    'id IN (SELECT id FROM samples_rtree '
+                    'WHERE max_lat >= ? AND min_lat <= ? AND max_lon >= ? AND min_lon <= ?)'
+                )
+                params.extend([min_lat, max_lat, min_lon, max_lon])
+            # Otherwise the box covers most of the data; walking rows in id order
+            # is cheaper than materializing most of the R-tree
+            where.append('latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?')
+            params.extend([min_lat, max_lat, min_lon, max_lon])
+
+        if start is not None:
+            where.append('ts >= ?')
+            params.append(parse_timestamp(start))
+        if end is not None:
+            where.append('ts <= ?')
+            params.append(parse_timestamp(end))
+        if pump_id is not None:
+            where.append('pump_id = ?')
+            params.append(int(pump_id))
+
+        if cursor is not None:
+            where.append('id < ?' if newest_first else 'id > ?')
+            params.append(int(cursor))
+
+        sql = 'SELECT id, data FROM samples'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY id DESC' if newest_first else ' ORDER BY id'
+        sql += ' LIMIT ?'
+        params.append(limit + 1)
+
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            'samples': [json.loads(row[1]) for row in rows],
+            'next_cursor': rows[-1][0] if has_more else None
+        }
+
+    def get_statistics(self):
+        """Read the running aggregates (one row per day and pump)"""
+        with self.lock:
+            rows = self.conn.execute(
+                'SELECT day, pump_id, count, duration_total, first_ts, last_ts '
+                'FROM sample_daily_stats ORDER BY day, pump_id'
+            ).fetchall()
+
+        total = 0
+        by_pump = {}
+        by_date = {}
+        duration_by_date = {}
+        first_ts = None
+        last_ts = None
+
+        for day, pump_id, count, duration_total, row_first, row_last in rows:
+            total += count
+            by_pump[pump_id] = by_pump.get(pump_id, 0) + count
+            by_date[day] = by_date.get(day, 0) + count
+            duration_by_date[day] = duration_by_date.get(day, 0) + duration_total
+            if row_first is not None and (first_ts is None or row_first < first_ts):
+                first_ts = row_first
+            if row_last is not None and (last_ts is None or row_last > last_ts):
+                last_ts = row_last
+
+        return {
+            'total': total,
+            'by_pump': by_pump,
+            'by_date': by_date,
+            'duration_by_date': duration_by_date,
+            'first_ts': first_ts,
+            'last_ts': last_ts
+        }
+
+    def rebuild_statistics(self):
+        """Recompute the aggregates from scratch with a single scan"""
+        with self.lock, self.conn:
+            self.conn.execute('DELETE FROM sample_daily_stats')
+            self.conn.execute('''
+                INSERT INTO sample_daily_stats
+                    (day, pump_id, count, duration_total, first_ts, last_ts)
+                SELECT substr(timestamp, 1, 10), COALESCE(pump_id, 0), COUNT(*),
+                       SUM(COALESCE(duration, 0)), MIN(ts), MAX(ts)
+                FROM samples
+                GROUP BY substr(timestamp, 1, 10), COALESCE(pump_id, 0)
+            ''')
+            self.conn.execute(
+                'INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)',
+                ('stats_version', STATS_VERSION)
+            )
+
+    def get_meta(self, key, default=None):
+        """Read a value from the metadata table"""
+        with self.lock:
+            row = self.conn.execute('SELECT value FROM metadata WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        """Write a value to the metadata table"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)',
+                (key, value)
+            )
+
+    def import_json(self, json_file):
+        """One-time import of a legacy water_samples.json file"""
+        with open(json_file, 'r') as f:
+            data = json.load(f)
+
+        samples = [s for s in data.get('samples', []) if s.get('sample_id') and s.get('timestamp')]
+        readable = [s for s in samples if try_parse_timestamp(s['timestamp']) is not None]
+        if len(readable) < len(samples):
+            # One bad row must not keep the whole file from migrating
+            print(f"Skipped {len(samples) - len(readable)} samples with unreadable timestamps in {json_file}")
+        return self.append_many(readable)
+
+    def close(self):
+        """Close the store connection"""
+        with self.lock:
+            self.conn.close()
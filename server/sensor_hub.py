@@ -0,0 +1,160 @@
+# Per-sensor polling threads feeding a shared latest-value cache
+import threading
+import time
+
+from histogram import Histogram
+
+
+class SensorCache:
+    """Latest value of every sensor with the time it was read"""
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def update(self, name, value, timestamp=None):
+        """Publish a new reading"""
+        with self.lock:
+            self.values[name] = (value, timestamp or time.monotonic())
+
+    def get(self, name, max_age=None):
+        """Latest value, or None if missing or older than max_age seconds"""
+        with self.lock:
+            entry = self.values.get(name)
+        if entry is None:
+            return None
+        value, timestamp = entry
+        if max_age is not None and time.monotonic() - timestamp > max_age:
+            return None
+        return value
+
+    def age(self, name):
+        """Seconds since the sensor last published, or None"""
+        with self.lock:
+            entry = self.values.get(name)
+        return None if entry is None else time.monotonic() - entry[1]
+
+
+class SensorPoller:
+    """Polls one sensor on its own thread at its own rate.
+
+    Blocking reads can't be interrupted from Python, so the timeout is
+    enforced on the consumer side: a reading older than max_age (for
+    example because the read is stuck) is reported as missing instead of
+    stale data, and reads slower than the timeout are counted.
+    """
+
+    def __init__(self, name, read, cache, interval, timeout=None, max_age=None):
+        self.name = name
+        self.read = read
+        self.cache = cache
+        self.interval = interval
+        self.timeout = timeout or max(interval, 1.0)
+        self.max_age = max_age or max(5 * interval, self.timeout)
+
+        self.latency = Histogram()
+        self.read_interval = None  # moving average of time between reads
+        self.reads = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.last_read = None
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start the polling thread"""
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name=f"sensor-{self.name}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop polling (a read already in progress is left to finish)"""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=self.timeout)
+            self.thread = None
+
+    def run(self):
+        """Read, publish and sleep until the next deadline"""
+        deadline = time.monotonic()
+        while self.running:
+            start = time.monotonic()
+            try:
+                value = self.read()
+            except Exception as e:
+                print(f"{self.name} read error: {e}")
+                value = None
+            end = time.monotonic()
+
+            self.reads += 1
+            self.latency.observe((end - start) * 1000)
+            if value is None:
+                self.errors += 1
+            if end - start > self.timeout:
+                self.timeouts += 1
+            if self.last_read is not None:
+                elapsed = end - self.last_read
+                if self.read_interval is None:
+                    self.read_interval = elapsed
+                else:
+                    self.read_interval += 0.1 * (elapsed - self.read_interval)
+            self.last_read = end
+            self.cache.update(self.name, value, end)
+
+            # Same pacing as the video capture loop: don't try to catch up
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()
+
+    def get_stats(self):
+        """Target and achieved rate, age of the last reading and read latency"""
+        interval = self.read_interval
+        age = self.cache.age(self.name)
+        return {
+            'target_hz': round(1.0 / self.interval, 2),
+            'rate_hz': round(1.0 / interval, 2) if interval else 0,
+            'age_ms': None if age is None else round(age * 1000, 1),
+            'stale': age is None or age > self.max_age,
+            'reads': self.reads,
+            'errors': self.errors,
+            'timeouts': self.timeouts,
+            'latency_ms': self.latency.get_stats()
+        }
+
+
+class SensorHub:
+    """Runs one poller per sensor and snapshots their latest values"""
+
+    def __init__(self):
+        self.cache = SensorCache()
+        self.pollers = {}
+
+    def add(self, name, read, interval, timeout=None, max_age=None):
+        """Register a sensor read function"""
+        self.pollers[name] = SensorPoller(name, read, self.cache, interval, timeout, max_age)
+
+    def start(self):
+        """Start every poller"""
+        for poller in self.pollers.values():
+            poller.start()
+
+    def stop(self):
+        """Stop every poller"""
+        for poller in self.pollers.values():
+            poller.running = False
+        for poller in self.pollers.values():
+            poller.stop()
+
+    def snapshot(self):
+        """Latest fresh value of every sensor; stale ones are None"""
+        return {
+            name: self.cache.get(name, poller.max_age)
+            for name, poller in self.pollers.items()
+        }
+
+    def get_stats(self):
+        """Per-sensor polling stats"""
+        return {name: poller.get_stats() for name, poller in self.pollers.items()}
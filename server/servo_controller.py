@@ -1,36 +1,79 @@
 import pigpio
+import asyncio
 import time
-from threading import Lock
+from threading import Lock, Timer
+
+from device_supervisor import DeviceSupervisor
+from pigpio_pool import shared_pool
+from servo_motion import Axis
 
 class ServoController:
-    def __init__(self, pin_config):
-        self.pi = pigpio.pi()
-        
-        if not self.pi.connected:
-            raise RuntimeError("Failed to connect to pigpio daemon. Is 'pigpiod' running?")
-        
+    def __init__(self, pin_config, devices=None, motion_config=None):
         self.pan_pin = pin_config.get('camera_pan', 12)  # GPIO12 default
         self.tilt_pin = pin_config.get('camera_tilt', 13)  # GPIO13 default
         
         # Servo angle limits (0-180 degrees)
-        self.pan_angle = 90   # Center position
-        self.tilt_angle = 90  # Center position
         self.min_angle = 0
         self.max_angle = 180
+        self.pan = Axis(90, self.min_angle, self.max_angle)   # Center position
+        self.tilt = Axis(90, self.min_angle, self.max_angle)  # Center position
         
         # Servo PWM pulse width range (500-2500 microseconds)
         self.min_pulse = 500
         self.max_pulse = 2500
         
+        # Motion planning: commands set targets, run() moves the servos there
+        # at a fixed rate with limited speed and acceleration (see servo_motion)
+        motion_config = motion_config or {}
+        self.rate = motion_config.get('rate', 50)
+        self.max_velocity = motion_config.get('max_velocity', 120.0)        # deg/s
+        self.max_acceleration = motion_config.get('max_acceleration', 480.0)  # deg/s^2
+        self.jog_velocity = motion_config.get('jog_velocity', 30.0)         # deg/s while a button is held
+        self.status_interval = motion_config.get('status_interval', 0.1)
+        self.loop = None  # set while run() is going; without it angles are written at once
+        self.wake = None
+        self.pulses = {}  # last pulse width written per pin
+        self.stats = {'commands': 0, 'writes': 0, 'status_pushes': 0}
+        
         # Thread safety
         self.lock = Lock()
         
-        # Setup pins
-        self.pi.set_mode(self.pan_pin, pigpio.OUTPUT)
-        self.pi.set_mode(self.tilt_pin, pigpio.OUTPUT)
+        # The supervisor owns the pigpio connection and reconnects it in the background;
+        # servos start centered
+        self.devices = devices or DeviceSupervisor()
+        self.gpio = shared_pool(self.devices)
+        self.gpio.add_setup(self.setup_pins)
         
-        # Initialize servos to center position
-        self.set_angles(self.pan_angle, self.tilt_angle)
+    @property
+    def pan_angle(self):
+        return self.pan.position
+    
+    @property
+    def tilt_angle(self):
+        return self.tilt.position
+    
+    def setup_pins(self, pi):
+        """Configure the servo pins and restore the last angles after every (re)connect"""
+        pi.set_mode(self.pan_pin, pigpio.OUTPUT)
+        pi.set_mode(self.tilt_pin, pigpio.OUTPUT)
+        with self.lock:
+            for pin, axis in ((self.pan_pin, self.pan), (self.tilt_pin, self.tilt)):
+                pulse_width = self.angle_to_pulse_width(axis.position)
+                pi.set_servo_pulsewidth(pin, pulse_width)
+                self.pulses[pin] = pulse_width
+        
+    def set_pulse_widths(self, pulses):
+        """Send (pin, pulse width) pairs in one batch; returns False while pigpio is down"""
+        if not self.gpio.update(pulses=pulses):
+            return False
+        for pin, pulse_width in pulses:
+            self.pulses[pin] = pulse_width
+        self.stats['writes'] += len(pulses)
+        return True
+    
+    def set_pulse_width(self, pin, pulse_width):
+        """Send one pulse width; returns False while pigpio is down"""
+        return self.set_pulse_widths([(pin, pulse_width)])
         
     def angle_to_pulse_width(self, angle):
         """Convert servo angle (0-180) to pulse width (500-2500μs)"""
@@ -44,54 +87,97 @@ class ServoController:
         pulse_width = self.min_pulse + (angle / angle_range) * pulse_range
         return int(pulse_width)
     
+    def changed_pulses(self):
+        """(pin, pulse width) pairs that differ from the last write"""
+        changed = []
+        for pin, axis in ((self.pan_pin, self.pan), (self.tilt_pin, self.tilt)):
+            pulse_width = self.angle_to_pulse_width(axis.position)
+            if self.pulses.get(pin) != pulse_width:
+                changed.append((pin, pulse_width))
+        return changed
+    
+    def write_angles(self):
+        """Write the pulse widths that changed since the last write, both pins at once"""
+        changed = self.changed_pulses()
+        return self.set_pulse_widths(changed) if changed else True
+    
+    def move_to(self, targets, max_velocity=None):
+        """Set axis targets; the control loop moves there, or they are written at once without it"""
+        with self.lock:
+            self.stats['commands'] += 1
+            for axis, angle in targets:
+                if self.loop is None:
+                    axis.jump(angle)
+                else:
+                    axis.set_target(angle, max_velocity)
+            if self.loop is None:
+                return self.write_angles()
+        # Commands arrive on the event loop, so the loop task can be woken directly
+        self.wake.set()
+        return self.gpio.get() is not None
+    
     def set_pan_angle(self, angle):
         """Set pan servo angle"""
-        with self.lock:
-            if self.min_angle <= angle <= self.max_angle:
-                self.pan_angle = angle
-                pulse_width = self.angle_to_pulse_width(angle)
-                self.pi.set_servo_pulsewidth(self.pan_pin, pulse_width)
-                return True
-            return False
+        if self.min_angle <= angle <= self.max_angle:
+            return self.move_to([(self.pan, angle)])
+        return False
     
     def set_tilt_angle(self, angle):
         """Set tilt servo angle"""
-        with self.lock:
-            if self.min_angle <= angle <= self.max_angle:
-                self.tilt_angle = angle
-                pulse_width = self.angle_to_pulse_width(angle)
-                self.pi.set_servo_pulsewidth(self.tilt_pin, pulse_width)
-                return True
-            return False
+        if self.min_angle <= angle <= self.max_angle:
+            return self.move_to([(self.tilt, angle)])
+        return False
     
     def set_angles(self, pan_angle, tilt_angle):
         """Set both servo angles simultaneously"""
-        success_pan = self.set_pan_angle(pan_angle)
-        success_tilt = self.set_tilt_angle(tilt_angle)
-        return success_pan and success_tilt
+        if self.min_angle <= pan_angle <= self.max_angle and self.min_angle <= tilt_angle <= self.max_angle:
+            return self.move_to([(self.pan, pan_angle), (self.tilt, tilt_angle)])
+        return False
     
     def move_pan(self, direction, step=1):
-        """Move pan servo by step amount in given direction"""
+        """Move pan target by step amount in given direction"""
         if direction == "left":
-            new_angle = min(self.pan_angle + step, self.max_angle)
+            new_angle = min(self.pan.target + step, self.max_angle)
         elif direction == "right":
-            new_angle = max(self.pan_angle - step, self.min_angle)
+            new_angle = max(self.pan.target - step, self.min_angle)
         else:
             return False
             
         return self.set_pan_angle(new_angle)
     
     def move_tilt(self, direction, step=1):
-        """Move tilt servo by step amount in given direction"""
+        """Move tilt target by step amount in given direction"""
         if direction == "up":
-            new_angle = max(self.tilt_angle - step, self.min_angle)
+            new_angle = max(self.tilt.target - step, self.min_angle)
         elif direction == "down":
-            new_angle = min(self.tilt_angle + step, self.max_angle)
+            new_angle = min(self.tilt.target + step, self.max_angle)
         else:
             return False
             
         return self.set_tilt_angle(new_angle)
     
+    def jog(self, axis_name, direction):
+        """Start moving one axis at jog speed toward its limit, until halt()"""
+        limits = {
+            ("pan", "left"): self.max_angle,
+            ("pan", "right"): self.min_angle,
+            ("tilt", "up"): self.min_angle,
+            ("tilt", "down"): self.max_angle
+        }
+        if (axis_name, direction) not in limits:
+            return False
+        axis = self.pan if axis_name == "pan" else self.tilt
+        if self.loop is None:
+            return self.move_pan(direction) if axis_name == "pan" else self.move_tilt(direction)
+        return self.move_to([(axis, limits[(axis_name, direction)])], self.jog_velocity)
+    
+    def halt(self, axis_name=None):
+        """Brake one axis (or both) to a stop as quickly as allowed"""
+        axes = [self.pan, self.tilt] if axis_name is None else [self.pan if axis_name == "pan" else self.tilt]
+        with self.lock:
+            targets = [(axis, axis.stopping_point(self.max_acceleration)) for axis in axes]
+        return self.move_to(targets)
+    
     def center_camera(self):
         """Center both servos to 90 degrees"""
         return self.set_angles(90, 90)
@@ -117,6 +203,12 @@ class ServoController:
                 angle = value.get("angle")
                 return self.set_tilt_angle(angle)
                 
+            elif command == "jog":
+                return self.jog(value.get("axis"), value.get("direction"))
+                
+            elif command == "halt":
+                return self.halt(value.get("axis"))
+                
             elif command == "center":
                 return self.center_camera()
                 
@@ -150,15 +242,77 @@ class ServoController:
     
     def get_status(self):
         """Get current servo positions"""
-        return {
-            "pan_angle": self.pan_angle,
-            "tilt_angle": self.tilt_angle,
-            "pan_pin": self.pan_pin,
-            "tilt_pin": self.tilt_pin
-        }
+        with self.lock:
+            return {
+                "pan_angle": round(self.pan.position, 1),
+                "tilt_angle": round(self.tilt.position, 1),
+                "pan_target": round(self.pan.target, 1),
+                "tilt_target": round(self.tilt.target, 1),
+                "moving": self.pan.moving or self.tilt.moving,
+                "pan_pin": self.pan_pin,
+                "tilt_pin": self.tilt_pin
+            }
+    
+    def get_stats(self):
+        """Commands received, pigpio writes made and status messages pushed"""
+        return dict(self.stats)
+    
+    async def run(self, publish=None):
+        """Fixed-rate control loop: step toward the targets, write changed pulse widths,
+        and pass status to publish() at most every status_interval while moving"""
+        self.loop = asyncio.get_running_loop()
+        self.wake = asyncio.Event()
+        period = 1.0 / self.rate
+        last_status = 0.0
+        previous = tick = time.monotonic()
+        try:
+            while True:
+                try:
+                    if not (self.pan.moving or self.tilt.moving):
+                        # Final resting position, then sleep until the next command
+                        if publish and last_status:
+                            self.stats['status_pushes'] += 1
+                            publish(self.get_status())
+                            last_status = 0.0
+                        self.wake.clear()
+                        await self.wake.wait()
+                        previous = tick = time.monotonic()
+                    
+                    tick += period
+                    await asyncio.sleep(max(0.0, tick - time.monotonic()))
+                    now = time.monotonic()
+                    if now - tick > period:
+                        tick = now  # fell behind; don't try to catch up
+                    dt = min(now - previous, 3 * period)
+                    previous = now
+                    
+                    with self.lock:
+                        for axis in (self.pan, self.tilt):
+                            axis.step(dt, self.max_velocity, self.max_acceleration)
+                        changed = self.changed_pulses()
+                    if changed:
+                        # The pigpio round-trip runs on a worker thread, outside the
+                        # lock, so commands and other tasks never wait on the socket
+                        await asyncio.to_thread(self.set_pulse_widths, changed)
+                    
+                    if publish and now - last_status >= self.status_interval:
+                        self.stats['status_pushes'] += 1
+                        publish(self.get_status())
+                        last_status = now
+                        
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    print(f"Servo control loop error: {e}")
+                    await asyncio.sleep(1)
+        finally:
+            self.loop = None
     
     def smooth_move(self, target_pan, target_tilt, steps=20, delay=0.02):
-        """Smooth movement to target position"""
+        """Smooth movement to target position; with the control loop running this only sets the targets"""
+        if self.loop is not None:
+            return self.set_angles(target_pan, target_tilt)
+        
         current_pan = self.pan_angle
         current_tilt = self.tilt_angle
         
@@ -175,16 +329,14 @@ class ServoController:
     def cleanup(self):
         """Clean up servo resources"""
         try:
-            # Center servos before shutdown
+            # Center servos before shutdown; the control loop no longer runs
+            self.loop = None
             self.center_camera()
-            time.sleep(0.5)
-            
-            # Turn off PWM
-            self.pi.set_servo_pulsewidth(self.pan_pin, 0)
-            self.pi.set_servo_pulsewidth(self.tilt_pin, 0)
             
-            # Close pigpio connection
-            self.pi.stop()
+            # Turn off PWM once they have had time to get there. The timer keeps
+            # the event loop free, and interpreter exit waits for it before the
+            # shared pigpio connection is closed
+            Timer(0.5, self.set_pulse_widths, [[(self.pan_pin, 0), (self.tilt_pin, 0)]]).start()
             print("Servo controller cleanup completed")
             
         except Exception as e:
@@ -0,0 +1,71 @@
+# Trapezoidal motion profiles for the camera servos
+#
+# Commands only move an axis' target. A fixed-rate control loop (see
+# ServoController.run) steps every axis toward its target with bounded
+# velocity and acceleration: speed up, cruise, then brake just soon
+# enough to stop on the target. A new target mid-move bends the current
+# trajectory instead of restarting it, so a burst of pan/tilt messages
+# turns into one smooth motion, and a pulse width is only written when
+# its rounded value changes.
+import math
+
+# Closer than this (degrees) and slower than one step of acceleration counts as arrived
+ARRIVED = 0.05
+
+
+class Axis:
+    """Position, velocity and target of one servo, in degrees"""
+
+    def __init__(self, position, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.position = float(position)
+        self.velocity = 0.0
+        self.target = self.position
+        self.max_velocity = None  # per-move limit (jogging); None uses the planner's
+
+    def clamp(self, angle):
+        """Angle limited to the axis range"""
+        return min(max(float(angle), self.minimum), self.maximum)
+
+    def set_target(self, angle, max_velocity=None):
+        """Move toward `angle`; the profile continues from the current velocity"""
+        self.target = self.clamp(angle)
+        self.max_velocity = max_velocity
+        return self.target
+
+    def jump(self, angle):
+        """Be at `angle` now, at rest (no control loop running)"""
+        self.position = self.target = self.clamp(angle)
+        self.velocity = 0.0
+        self.max_velocity = None
+
+    def stopping_point(self, max_acceleration):
+        """Where the axis comes to rest if it brakes as hard as allowed from now"""
+        return self.clamp(self.position + self.velocity * abs(self.velocity) / (2 * max_acceleration))
+
+    @property
+    def moving(self):
+        return self.velocity != 0.0 or self.position != self.target
+
+    def step(self, dt, max_velocity, max_acceleration):
+        """Advance one control period"""
+        error = self.target - self.position
+        change = max_acceleration * dt
+        if abs(error) <= ARRIVED and abs(self.velocity) <= change:
+            self.position = self.target
+            self.velocity = 0.0
+            return
+
+        # Fastest speed from which the axis can still stop on the target
+        direction = 1.0 if error > 0 else -1.0
+        limit = max_velocity if self.max_velocity is None else min(max_velocity, self.max_velocity)
+        desired = direction * min(limit, math.sqrt(2 * max_acceleration * abs(error)))
+        self.velocity += min(max(desired - self.velocity, -change), change)
+
+        position = self.position + self.velocity * dt
+        if (self.target - position) * direction < 0 and self.velocity * direction > 0:
+            # Would pass the target within this period: land on it
+            position = self.target
+            self.velocity = 0.0
+        self.position = self.clamp(position)
@@ -0,0 +1,625 @@
+# Recording and replay of raw hardware inputs and operator commands
+#
+# install_recorder() wraps the hardware libraries (the real ones or the
+# simulator's) so every GPS serial read, MPU6050 register burst, INA3221
+# voltage and camera frame is logged with its monotonic time, as are
+# device errors and each WebSocket client's connects, messages and
+# disconnects. Records are buffered in memory and flushed as gzip
+# members like the telemetry recorder, so a file cut short by a power
+# loss still reads up to its last flush. Frames are logged by time and
+# metadata only, not pixels.
+#
+# install_replay() registers stand-ins that serve a recording back on a
+# clock running `speed` times real time. GPS bytes, camera frames and
+# client messages arrive as they come due, so at 10x the NMEA parser,
+# video pipeline and message handlers do ten times the work; the IMU and
+# battery are polled at their own rate and return the latest due reading.
+# Recorded device errors are raised again at the same point in the run.
+# Outputs (motors, pumps, servos) go to the simulator.
+import asyncio
+import glob
+import gzip
+import json
+import os
+import struct
+import sys
+import threading
+import time
+import types
+from bisect import bisect_right
+from datetime import datetime
+
+import numpy as np
+
+import simulator
+from telemetry_recorder import read_complete_members
+
+FILE_MAGIC = b'AQREC1\n'
+RECORD = struct.Struct('<dBBI')  # seconds since start, stream, kind, payload length
+BATTERY_VALUE = struct.Struct('<d')
+
+# Streams; append-only, the ids are stored in the files
+META, GPS, IMU, BATTERY, CAMERA, CLIENT = range(6)
+STREAM_NAMES = {META: 'meta', GPS: 'gps', IMU: 'imu', BATTERY: 'battery', CAMERA: 'camera', CLIENT: 'client'}
+
+# Record kinds
+DATA, ERROR = 0, 1
+
+_replaced = {}
+_simulated = False
+
+
+def recording_enabled(config):
+    """Recording requested by AQUABOT_RECORD or the recording.enabled setting"""
+    env = os.environ.get('AQUABOT_RECORD')
+    if env is not None:
+        return env.lower() in ('1', 'true', 'yes', 'on')
+    return bool(config.get('recording', {}).get('enabled', False))
+
+
+def replay_settings(config):
+    """(path, speed, loop) from AQUABOT_REPLAY* or the replay settings; path is None when off"""
+    settings = config.get('replay', {})
+    path = os.environ.get('AQUABOT_REPLAY', settings.get('file'))
+    speed = float(os.environ.get('AQUABOT_REPLAY_SPEED', settings.get('speed', 1.0)))
+    loop = os.environ.get('AQUABOT_REPLAY_LOOP', str(settings.get('loop', False))).lower() in ('1', 'true', 'yes', 'on')
+    return path or None, speed, loop
+
+
+def list_recordings(directory):
+    """Recording files, oldest first"""
+    return sorted(glob.glob(os.path.join(directory, 'session_*.rec.gz')))
+
+
+def read_recording(path):
+    """({stream: [(time, kind, payload), ...]}, meta) from a recording file"""
+    data = read_complete_members(path)
+    if not data.startswith(FILE_MAGIC):
+        raise ValueError(f"{path} is not a session recording")
+
+    streams = {stream: [] for stream in STREAM_NAMES}
+    offset = len(FILE_MAGIC)
+    while offset + RECORD.size <= len(data):
+        t, stream, kind, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        payload = data[offset:offset + length]
+        offset += length
+        if stream in streams and len(payload) == length:
+            streams[stream].append((t, kind, payload))
+
+    meta = json.loads(streams[META][0][2]) if streams[META] else {}
+    return streams, meta
+
+
+class SessionRecorder:
+    def __init__(self, config, settings=None):
+        self.directory = config.get('dir', 'recordings')
+        self.flush_interval = config.get('flush_interval', 5)
+        self.max_files = config.get('max_files', 20)
+        self.compress_level = config.get('compress_level', 1)  # cheap; the IMU alone is ~5 KB/s
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.remove_old_files()
+        self.path = os.path.join(self.directory, f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}.rec.gz")
+
+        self.start = time.monotonic()
+        self.lock = threading.Lock()
+        self.buffer = [FILE_MAGIC]
+        self.counts = {stream: 0 for stream in STREAM_NAMES}
+        self.errors = 0
+        self.bytes_written = 0
+        self.clients = {}
+        self.next_client = 1
+
+        self.add(META, json.dumps({
+            'version': 1,
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'config': settings
+        }).encode())
+
+    def add(self, stream, payload, kind=DATA):
+        """Buffer one record; cheap enough for the sampling threads"""
+        record = RECORD.pack(time.monotonic() - self.start, stream, kind, len(payload)) + payload
+        with self.lock:
+            self.buffer.append(record)
+            self.counts[stream] += 1
+
+    def error(self, stream, error):
+        """A device call that raised"""
+        self.errors += 1
+        self.add(stream, str(error).encode(), ERROR)
+
+    def client_event(self, websocket, event, message=None):
+        """A client connecting, sending a message or disconnecting"""
+        client = self.clients.get(websocket)
+        if client is None:
+            client = self.clients[websocket] = self.next_client
+            self.next_client += 1
+        if event == 'disconnect':
+            del self.clients[websocket]
+        if isinstance(message, bytes):
+            message = message.decode('utf-8', 'replace')
+        self.add(CLIENT, json.dumps({'client': client, 'event': event, 'message': message}).encode())
+
+    def flush(self):
+        """Write buffered records as one gzip member (blocking, run off the loop)"""
+        with self.lock:
+            records, self.buffer = self.buffer, []
+        if not records:
+            return 0
+
+        payload = gzip.compress(b''.join(records), compresslevel=self.compress_level)
+        with open(self.path, 'ab') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.bytes_written += len(payload)
+        return len(records)
+
+    def remove_old_files(self):
+        """Keep at most max_files recordings, counting the one about to start"""
+        files = list_recordings(self.directory)
+        for path in files[:max(0, len(files) - self.max_files + 1)]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Session recording cleanup error: {e}")
+
+    def get_status(self):
+        """Recorder counters"""
+        return {
+            'file': self.path,
+            'records': {STREAM_NAMES[stream]: count for stream, count in self.counts.items()},
+            'errors': self.errors,
+            'bytes_written': self.bytes_written
+        }
+
+    async def run(self):
+        """Periodically flush buffered records on a worker thread"""
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await asyncio.to_thread(self.flush)
+            except asyncio.CancelledError:
+                self.flush()
+                raise
+            except Exception as e:
+                print(f"Session recorder error: {e}")
+
+
+def tap_serial(recorder, module):
+    """Serial subclass logging every read"""
+
+    class Serial(module.Serial):
+        def read(self, size=1):
+            try:
+                data = super().read(size)
+            except Exception as e:
+                recorder.error(GPS, e)
+                raise
+            if data:
+                recorder.add(GPS, bytes(data))
+            return data
+
+    return {'Serial': Serial}
+
+
+def tap_mpu6050(recorder, module):
+    """mpu6050 subclass logging every register burst read"""
+
+    class BusTap:
+        def __init__(self, bus):
+            self.bus = bus
+
+        def __getattr__(self, name):
+            return getattr(self.bus, name)
+
+        def read_i2c_block_data(self, address, register, length):
+            try:
+                data = self.bus.read_i2c_block_data(address, register, length)
+            except Exception as e:
+                recorder.error(IMU, e)
+                raise
+            recorder.add(IMU, bytes(data))
+            return data
+
+    class mpu6050(module.mpu6050):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if hasattr(self, 'bus'):
+                self.bus = BusTap(self.bus)
+
+    return {'mpu6050': mpu6050}
+
+
+def tap_ina3221(recorder, module):
+    """INA3221 subclass logging every voltage read"""
+
+    class INA3221(module.INA3221):
+        @property
+        def bus_voltage(self):
+            try:
+                value = super().bus_voltage
+            except Exception as e:
+                recorder.error(BATTERY, e)
+                raise
+            recorder.add(BATTERY, BATTERY_VALUE.pack(value))
+            return value
+
+    return {'INA3221': INA3221}
+
+
+def tap_picamera2(recorder, module):
+    """Picamera2 subclass logging the time and metadata of every capture"""
+
+    class Picamera2(module.Picamera2):
+        def capture_arrays(self, names, *args, **kwargs):
+            try:
+                arrays, metadata = super().capture_arrays(names, *args, **kwargs)
+            except Exception as e:
+                recorder.error(CAMERA, e)
+                raise
+            recorder.add(CAMERA, json.dumps({
+                'streams': list(names),
+                'metadata': {k: v for k, v in (metadata or {}).items() if isinstance(v, (int, float))}
+            }).encode())
+            return arrays, metadata
+
+    return {'Picamera2': Picamera2}
+
+
+def install_recorder(config):
+    """Wrap whichever hardware libraries are importable; returns the SessionRecorder"""
+    recorder = SessionRecorder(config.get('recording', {}), config)
+    taps = {
+        'serial': tap_serial,
+        'mpu6050': tap_mpu6050,
+        'adafruit_ina3221': tap_ina3221,
+        'picamera2': tap_picamera2
+    }
+    wrapped = []
+    for name, tap in taps.items():
+        try:
+            original = __import__(name)
+        except ImportError:
+            continue  # left missing, so the device is disabled as before
+        module = types.ModuleType(name)
+        module.__dict__.update(original.__dict__)
+        module.__dict__.update(tap(recorder, original))
+        _replaced.setdefault(name, sys.modules.get(name))
+        sys.modules[name] = module
+        wrapped.append(name)
+
+    print(f"Recording {', '.join(wrapped) or 'no devices'} and client messages to {recorder.path}")
+    return recorder
+
+
+class ReplayClock:
+    """Recording time advancing `speed` times faster than real time"""
+
+    def __init__(self, duration, speed, loop):
+        self.duration = duration
+        self.speed = speed
+        self.loop = loop and duration > 0
+        self.start = time.monotonic()
+
+    def position(self):
+        """(lap, seconds into the recording)"""
+        t = (time.monotonic() - self.start) * self.speed
+        if self.loop:
+            return int(t // self.duration), t % self.duration
+        return 0, t
+
+    def delay(self, lap, t):
+        """Real seconds until the clock reaches t in the given lap"""
+        return self.start + (lap * self.duration + t) / self.speed - time.monotonic()
+
+    def finished(self):
+        """Past the end of a recording that doesn't loop"""
+        return not self.loop and self.position()[1] > self.duration
+
+
+class ReplayStream:
+    """One recorded stream consumed as the replay clock passes its records"""
+
+    def __init__(self, records, clock):
+        self.records = records
+        self.times = [record[0] for record in records]
+        self.clock = clock
+        self.lap = 0
+        self.index = 0
+        self.current = None
+        self.delivered = 0
+        self.skipped = 0
+
+    def due(self):
+        """Records that came due since the last call"""
+        lap, now = self.clock.position()
+        records = []
+        if lap != self.lap:
+            # Finish the previous lap first; laps passed over entirely are skipped
+            records = self.records[self.index:]
+            self.skipped += max(lap - self.lap - 1, 0) * len(self.records)
+            self.lap, self.index = lap, 0
+        end = bisect_right(self.times, now, self.index)
+        records += self.records[self.index:end]
+        self.index = end
+        self.delivered += len(records)
+        return records
+
+    def latest(self):
+        """Most recent due record, waiting for the first one; older ones are skipped"""
+        records = self.due()
+        if not records and self.current is None:
+            self.wait()
+            records = self.due()
+        if records:
+            self.skipped += len(records) - 1
+            self.current = records[-1]
+        return self.current
+
+    def wait(self, timeout=None):
+        """Sleep until the next record is due, at most `timeout` seconds"""
+        if self.index < len(self.records):
+            delay = self.clock.delay(self.lap, self.times[self.index])
+        elif self.clock.loop:
+            delay = self.clock.delay(self.lap + 1, 0.0)
+        else:
+            delay = timeout if timeout is not None else 0.1
+        if timeout is not None:
+            delay = min(delay, timeout)
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_stats(self):
+        """Records delivered and skipped so far"""
+        return {'records': len(self.records), 'delivered': self.delivered, 'skipped': self.skipped}
+
+
+def replay_error(record, name):
+    """Raise the recorded error if a record is one, or if there is nothing recorded"""
+    if record is None:
+        raise OSError(f"No recorded {name} data")
+    if record[1] == ERROR:
+        raise OSError(f"Replayed {name} error: {record[2].decode('utf-8', 'replace')}")
+
+
+def build_replay_serial(stream):
+    """pyserial stand-in delivering recorded GPS bytes"""
+    module = types.ModuleType('serial')
+    module.EIGHTBITS = 8
+    module.PARITY_NONE = 'N'
+    module.STOPBITS_ONE = 1
+    module.SerialException = OSError
+
+    class Serial:
+        def __init__(self, port=None, baudrate=9600, timeout=None, **kwargs):
+            self.port = port
+            self.timeout = timeout
+            self.is_open = True
+            self.buffer = bytearray()
+            self.error = None
+
+        def fill(self):
+            """Move due bytes into the buffer; an error stops at that point"""
+            for record in stream.due():
+                if record[1] == ERROR:
+                    self.error = record
+                    break
+                self.buffer += record[2]
+
+        @property
+        def in_waiting(self):
+            self.fill()
+            return len(self.buffer)
+
+        def read(self, size=1):
+            self.fill()
+            if not self.buffer and self.error is None:
+                stream.wait(self.timeout)
+                self.fill()
+            if not self.buffer and self.error is not None:
+                error, self.error = self.error, None
+                replay_error(error, 'GPS')
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+        def close(self):
+            self.is_open = False
+
+    module.Serial = Serial
+    return module
+
+
+def build_replay_mpu6050(stream):
+    """mpu6050 stand-in serving recorded register bursts"""
+    module = types.ModuleType('mpu6050')
+
+    class Bus:
+        def write_byte_data(self, address, register, value):
+            pass
+
+        def read_i2c_block_data(self, address, register, length):
+            record = stream.latest()
+            replay_error(record, 'IMU')
+            return list(record[2][:length])
+
+    class mpu6050:
+        def __init__(self, address, bus=1):
+            self.address = address
+            self.bus = Bus()
+
+        def read_accel_range(self, raw=False):
+            return 2
+
+        def read_gyro_range(self, raw=False):
+            return 250
+
+    module.mpu6050 = mpu6050
+    return module
+
+
+def build_replay_ina3221(stream):
+    """adafruit_ina3221 stand-in serving recorded voltages"""
+    module = types.ModuleType('adafruit_ina3221')
+
+    class INA3221:
+        def __init__(self, i2c, address=0x40):
+            pass
+
+        @property
+        def bus_voltage(self):
+            record = stream.latest()
+            replay_error(record, 'battery')
+            return BATTERY_VALUE.unpack(record[2])[0]
+
+    module.INA3221 = INA3221
+    return module
+
+
+def build_replay_picamera2(stream):
+    """picamera2 stand-in delivering a fixed scene at the recorded frame times"""
+    import cv2
+
+    module = types.ModuleType('picamera2')
+    rng = np.random.default_rng(0)
+
+    class Picamera2:
+        def __init__(self, camera_num=0):
+            self.main = None
+            self.lores = None
+            self.frame = 0
+
+        def create_preview_configuration(self, main=None, lores=None, **kwargs):
+            return {'main': main or {'size': (640, 480)}, 'lores': lores}
+
+        def configure(self, config):
+            width, height = config['main']['size']
+            # Textured so JPEG sizes stay close to a real scene
+            self.main = np.empty((height, width, 3), dtype=np.uint8)
+            self.main[:height // 2] = (200, 160, 110)
+            self.main[height // 2:] = (110, 80, 30)
+            self.main[height // 2:] += rng.integers(0, 40, (height - height // 2, width, 1), dtype=np.uint8)
+            if config.get('lores'):
+                small = cv2.resize(self.main, tuple(config['lores']['size']), interpolation=cv2.INTER_AREA)
+                self.lores = cv2.cvtColor(small, cv2.COLOR_BGR2YUV_I420)
+
+        def start(self):
+            pass
+
+        def stop(self):
+            pass
+
+        def capture_arrays(self, names):
+            records = stream.due()
+            while not records:
+                if stream.clock.finished():
+                    raise OSError('Replay finished')
+                stream.wait(0.5)
+                records = stream.due()
+            stream.skipped += len(records) - 1
+            record = records[-1]
+            replay_error(record, 'camera')
+            self.frame += 1
+
+            main = self.main.copy()
+            cv2.putText(main, f"REPLAY {self.frame} t={record[0]:.2f}s", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            arrays = [self.lores if name == 'lores' and self.lores is not None else main for name in names]
+            return arrays, json.loads(record[2]).get('metadata', {})
+
+    module.Picamera2 = Picamera2
+    return module
+
+
+class ReplaySocket:
+    """Stands in for a recorded client's WebSocket; replies are counted and dropped"""
+
+    def __init__(self, client):
+        self.remote_address = ('replay', client)
+        self.messages_sent = 0
+        self.bytes_sent = 0
+
+    async def send(self, message):
+        self.messages_sent += 1
+        self.bytes_sent += len(message)
+
+
+class SessionReplay:
+    def __init__(self, path, speed=1.0, loop=False):
+        if os.path.isdir(path):
+            files = list_recordings(path)
+            if not files:
+                raise FileNotFoundError(f"No session recordings in {path}")
+            path = files[-1]
+        self.path = path
+        records, self.meta = read_recording(path)
+        duration = max((stream[-1][0] for stream in records.values() if stream), default=0.0)
+        self.clock = ReplayClock(duration, speed, loop)
+        self.streams = {stream: ReplayStream(records[stream], self.clock) for stream in STREAM_NAMES if stream != META}
+
+    async def client_events(self):
+        """Yield (lap, event) for each recorded client event as it comes due"""
+        stream = self.streams[CLIENT]
+        while not self.clock.finished():
+            for record in stream.due():
+                yield stream.lap, json.loads(record[2])
+            await asyncio.sleep(min(0.05, max(0.0, self.next_client_delay(stream))))
+
+    def next_client_delay(self, stream):
+        """Real seconds until the next client event"""
+        if stream.index < len(stream.records):
+            return self.clock.delay(stream.lap, stream.times[stream.index])
+        return 0.05
+
+    def get_status(self):
+        """Replay position and per-stream counters"""
+        lap, position = self.clock.position()
+        return {
+            'file': self.path,
+            'speed': self.clock.speed,
+            'duration': round(self.clock.duration, 1),
+            'position': round(min(position, self.clock.duration), 1),
+            'lap': lap,
+            'streams': {STREAM_NAMES[stream]: replay.get_stats() for stream, replay in self.streams.items()}
+        }
+
+
+def install_replay(config):
+    """Register stand-ins serving the configured recording; returns the SessionReplay"""
+    global _simulated
+    path, speed, loop = replay_settings(config)
+    replay = SessionReplay(path, speed, loop)
+
+    # The simulator provides pigpio and the I2C bus for everything not in the recording
+    simulator.install(config)
+    _simulated = True
+
+    modules = {
+        'serial': build_replay_serial(replay.streams[GPS]),
+        'mpu6050': build_replay_mpu6050(replay.streams[IMU]),
+        'adafruit_ina3221': build_replay_ina3221(replay.streams[BATTERY]),
+        'picamera2': build_replay_picamera2(replay.streams[CAMERA])
+    }
+    for name, module in modules.items():
+        _replaced.setdefault(name, sys.modules.get(name))
+        sys.modules[name] = module
+
+    print(f"Replaying {replay.path} ({replay.clock.duration:.0f} s) at {speed}x{' in a loop' if loop else ''}")
+    return replay
+
+
+def uninstall():
+    """Restore the hardware modules replaced by install_recorder() or install_replay()"""
+    global _simulated
+    for name, module in _replaced.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+    _replaced.clear()
+    if _simulated:
+        simulator.uninstall()
+        _simulated = False
@@ -0,0 +1,635 @@
+# Simulated hardware for running the server off the boat
+#
+# install() registers stand-ins for the hardware libraries (picamera2,
+# pigpio, serial, board, busio, mpu6050, adafruit_ina3221) in sys.modules
+# before the server imports them, so every server module, the device
+# supervisor and the NMEA parser run unchanged on any Linux box.
+#
+# All fakes share one simulated boat. ESC pulses sent through the pigpio
+# fake drive it; the GPS fake streams NMEA along its track, the MPU6050
+# fake serves its motion as raw registers, the INA3221 fake drains the
+# battery with motor load and the camera renders a horizon that rolls
+# and pitches with the waves. Every device can be given extra latency and
+# a failure rate, to exercise the reconnect and degraded paths.
+import math
+import os
+import random
+import sys
+import threading
+import time
+import types
+from datetime import datetime, timezone
+
+import numpy as np
+
+GRAVITY = 9.80665
+METERS_PER_DEGREE = 111320.0
+KNOTS_PER_MS = 3600.0 / 1852.0
+
+# LiFePO4 resting voltage by state of charge, as battery_monitor reads it back
+LIFEPO4_CURVE = [
+    (0, 12.0), (10, 12.4), (20, 12.6), (30, 12.7), (40, 12.8), (50, 12.9),
+    (60, 13.0), (70, 13.1), (80, 13.2), (90, 13.3), (95, 13.4), (100, 13.6)
+]
+
+DEFAULT_DEVICE = {'latency': 0.0, 'jitter': 0.0, 'failure_rate': 0.0, 'open_failure_rate': 0.0}
+
+_replaced = {}
+
+
+def enabled(config):
+    """Simulation requested by AQUABOT_SIMULATE or the simulation.enabled setting"""
+    env = os.environ.get('AQUABOT_SIMULATE')
+    if env is not None:
+        return env.lower() in ('1', 'true', 'yes', 'on')
+    return bool(config.get('simulation', {}).get('enabled', False))
+
+
+class Faults:
+    """Injected latency and failures for one simulated device"""
+
+    def __init__(self, name, config, rng):
+        self.name = name
+        settings = dict(DEFAULT_DEVICE, **config)
+        self.latency = settings['latency']
+        self.jitter = settings['jitter']
+        self.failure_rate = settings['failure_rate']
+        self.open_failure_rate = settings['open_failure_rate']
+        self.rng = rng
+        self.calls = 0
+        self.failures = 0
+
+    def open(self):
+        """Called when the device is opened"""
+        if self.open_failure_rate and self.rng.random() < self.open_failure_rate:
+            self.failures += 1
+            raise OSError(f"Simulated {self.name} open failure")
+
+    def call(self):
+        """Called on every device operation"""
+        self.calls += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self.rng.uniform(0, self.jitter))
+        if self.failure_rate and self.rng.random() < self.failure_rate:
+            self.failures += 1
+            raise OSError(f"Simulated {self.name} failure")
+
+
+class Boat:
+    """Shared simulated boat: motion, waves, battery and actuator state"""
+
+    def __init__(self, config, pins, esc_range):
+        self.rng = random.Random(config.get('seed'))
+        self.noise = np.random.default_rng(config.get('seed'))
+        self.lat, self.lon = config.get('start', [47.6062, -122.3321])
+        self.heading = math.radians(config.get('heading', 0.0))  # clockwise from north
+        self.speed = 0.0
+        self.max_speed = config.get('max_speed', 3.0)            # m/s at full throttle
+        self.max_turn_rate = math.radians(config.get('max_turn_rate', 20.0))
+        self.speed_tau = config.get('speed_tau', 3.0)            # s to reach ~63% of target speed
+        self.idle_speed = config.get('idle_speed', 1.5)          # cruise when no throttle is applied
+        self.idle_turn_rate = math.radians(config.get('idle_turn_rate', 2.0))
+        self.roll_amplitude = math.radians(config.get('roll_amplitude', 8.0))
+        self.pitch_amplitude = math.radians(config.get('pitch_amplitude', 3.0))
+        self.wave_period = config.get('wave_period', 4.0)
+
+        self.capacity_ah = config.get('battery_capacity_ah', 20.0)
+        self.charge = config.get('battery_percent', 90.0)
+        self.idle_current = config.get('idle_current', 0.8)      # A for the Pi, camera and sensors
+        self.motor_current = config.get('motor_current', 15.0)   # A per motor at full throttle
+        self.pump_current = config.get('pump_current', 2.0)      # A per running pump
+
+        self.left_pin = pins.get('motor_left')
+        self.right_pin = pins.get('motor_right')
+        self.tilt_pin = pins.get('camera_tilt')
+        self.pump_pins = set(pins.get('pumps', []))
+        self.esc_min = esc_range.get('min', 1000)
+        self.esc_max = esc_range.get('max', 2000)
+
+        self.pulses = {}
+        self.levels = {}
+        self.start = time.monotonic()
+        self.time = self.start
+        self.accel = 0.0
+        self.yaw_rate = 0.0
+        self.faults = {}
+        self.lock = threading.Lock()
+
+    def throttle(self, pin):
+        """0..1 throttle of one ESC from its pulse width"""
+        pulse = self.pulses.get(pin)
+        if not pulse:
+            return 0.0
+        return min(1.0, max(0.0, (pulse - self.esc_min) / (self.esc_max - self.esc_min)))
+
+    def set_pulse(self, pin, pulse):
+        """Servo/ESC pulse width from the pigpio fake"""
+        with self.lock:
+            self.advance()
+            self.pulses[pin] = pulse
+
+    def set_level(self, pin, level):
+        """Digital output from the pigpio fake (pump relays are active low)"""
+        with self.lock:
+            self.advance()
+            self.levels[pin] = level
+
+    def advance(self):
+        """Integrate motion and battery up to now (lock held)"""
+        now = time.monotonic()
+        dt = now - self.time
+        if dt <= 0:
+            return
+        self.time = now
+
+        left, right = self.throttle(self.left_pin), self.throttle(self.right_pin)
+        if left == 0 and right == 0:
+            target, self.yaw_rate = self.idle_speed, self.idle_turn_rate
+        else:
+            target = self.max_speed * (left + right) / 2
+            self.yaw_rate = self.max_turn_rate * (left - right)
+
+        # Approach the target speed with a first-order lag; exact for any dt
+        previous = self.speed
+        self.speed = target + (self.speed - target) * math.exp(-dt / self.speed_tau)
+        self.accel = (self.speed - previous) / dt
+        self.heading = (self.heading + self.yaw_rate * dt) % (2 * math.pi)
+
+        distance = self.speed * dt
+        self.lat += distance * math.cos(self.heading) / METERS_PER_DEGREE
+        self.lon += distance * math.sin(self.heading) / (METERS_PER_DEGREE * math.cos(math.radians(self.lat)))
+
+        pumps = sum(1 for pin in self.pump_pins if self.levels.get(pin) == 0)
+        current = self.idle_current + self.motor_current * (left + right) + self.pump_current * pumps
+        self.charge = max(0.0, self.charge - current * dt / 3600 / self.capacity_ah * 100)
+
+    def waves(self, t):
+        """Roll, pitch (rad) and their rates (rad/s) at time t"""
+        w = 2 * math.pi / self.wave_period
+        roll = self.roll_amplitude * math.sin(w * t)
+        pitch = self.pitch_amplitude * math.sin(0.7 * w * t + 1.0)
+        return roll, pitch, self.roll_amplitude * w * math.cos(w * t), self.pitch_amplitude * 0.7 * w * math.cos(0.7 * w * t + 1.0)
+
+    def state(self):
+        """Consistent snapshot of the boat"""
+        with self.lock:
+            self.advance()
+            roll, pitch, roll_rate, pitch_rate = self.waves(self.time - self.start)
+            tilt_pulse = self.pulses.get(self.tilt_pin) or 1500
+            return {
+                'lat': self.lat, 'lon': self.lon,
+                'speed': self.speed, 'heading': self.heading,
+                'accel': self.accel, 'yaw_rate': self.yaw_rate,
+                'roll': roll, 'pitch': pitch,
+                'roll_rate': roll_rate, 'pitch_rate': pitch_rate,
+                'camera_tilt': math.radians((tilt_pulse - 1500) / 2000 * 180),
+                'charge': self.charge
+            }
+
+    def voltage(self):
+        """Battery voltage for the current state of charge"""
+        charge = self.state()['charge']
+        for (c1, v1), (c2, v2) in zip(LIFEPO4_CURVE, LIFEPO4_CURVE[1:]):
+            if charge <= c2:
+                return v1 + (charge - c1) * (v2 - v1) / (c2 - c1)
+        return LIFEPO4_CURVE[-1][1]
+
+
+def nmea_sentence(body):
+    """'$body*hh' with checksum and line ending, as bytes"""
+    checksum = 0
+    for byte in body.encode('ascii'):
+        checksum ^= byte
+    return f"${body}*{checksum:02X}\r\n".encode('ascii')
+
+
+def nmea_coordinate(value, width):
+    """Signed degrees to (d)ddmm.mmmm"""
+    value = abs(value)
+    degrees = int(value)
+    return f"{degrees:0{width}d}{(value - degrees) * 60:07.4f}"
+
+
+def build_pigpio(boat, faults):
+    """pigpio module stand-in"""
+    module = types.ModuleType('pigpio')
+    module.OUTPUT = 1
+    module.INPUT = 0
+    module.PI_SCRIPT_INITING = 0
+    module.PI_SCRIPT_HALTED = 1
+    module.PI_SCRIPT_RUNNING = 2
+
+    class error(Exception):
+        pass
+    module.error = error
+
+    class pi:
+        def __init__(self, host=None, port=None):
+            faults.open()
+            self.connected = True
+            self.modes = {}
+            self.scripts = {}
+            self.running = set()
+            self.start = time.monotonic()
+
+        def set_mode(self, pin, mode):
+            faults.call()
+            self.modes[pin] = mode
+
+        def write(self, pin, level):
+            faults.call()
+            boat.set_level(pin, level)
+
+        def set_servo_pulsewidth(self, pin, pulse_width):
+            faults.call()
+            boat.set_pulse(pin, pulse_width)
+
+        def set_bank_1(self, bits):
+            faults.call()
+            for pin in range(32):
+                if bits & (1 << pin):
+                    boat.set_level(pin, 1)
+
+        def clear_bank_1(self, bits):
+            faults.call()
+            for pin in range(32):
+                if bits & (1 << pin):
+                    boat.set_level(pin, 0)
+
+        def store_script(self, script):
+            """Only SERVO and WRITE with parameter operands, as the pulse scripts use"""
+            faults.call()
+            words = script.decode().split()
+            steps = [(words[i], int(words[i + 1][1:]), int(words[i + 2][1:])) for i in range(0, len(words), 3)]
+            if any(command not in ('SERVO', 'WRITE') for command, _, _ in steps):
+                raise error('unsupported script command')
+            script_id = len(self.scripts)
+            self.scripts[script_id] = steps
+            return script_id
+
+        def script_status(self, script_id):
+            faults.call()
+            state = module.PI_SCRIPT_RUNNING if script_id in self.running else module.PI_SCRIPT_HALTED
+            return state, [0] * 10
+
+        def run_script(self, script_id, params=None):
+            """The script counts as running until the reply, so overlapping runs are refused"""
+            if script_id in self.running:
+                faults.call()
+                raise error('script not halted')
+            self.running.add(script_id)
+            try:
+                faults.call()
+                if script_id not in self.scripts:
+                    raise error('unknown script id')
+                for command, pin, value in self.scripts[script_id]:
+                    if command == 'SERVO':
+                        boat.set_pulse(params[pin], params[value])
+                    else:
+                        boat.set_level(params[pin], params[value])
+            finally:
+                self.running.discard(script_id)
+
+        def delete_script(self, script_id):
+            faults.call()
+            self.scripts.pop(script_id, None)
+
+        def get_servo_pulsewidth(self, pin):
+            faults.call()
+            return boat.pulses.get(pin, 0)
+
+        def get_current_tick(self):
+            faults.call()
+            return int((time.monotonic() - self.start) * 1e6) & 0xFFFFFFFF
+
+        def stop(self):
+            self.connected = False
+
+    module.pi = pi
+    return module
+
+
+def build_serial(boat, faults, config):
+    """pyserial module stand-in streaming NMEA from the simulated boat"""
+    module = types.ModuleType('serial')
+    module.EIGHTBITS = 8
+    module.PARITY_NONE = 'N'
+    module.STOPBITS_ONE = 1
+    module.SerialException = OSError
+    rate = config.get('rate', 1.0)
+    hdop = config.get('hdop', 0.9)
+    satellites = config.get('satellites', 9)
+
+    class Serial:
+        def __init__(self, port=None, baudrate=9600, timeout=None, **kwargs):
+            faults.open()
+            self.port = port
+            self.baudrate = baudrate
+            self.timeout = timeout
+            self.is_open = True
+            self.buffer = bytearray()
+            self.epoch = 0
+            self.next_epoch = time.monotonic()
+
+        def generate(self):
+            """Queue the sentences of every epoch that is due"""
+            now = time.monotonic()
+            while now >= self.next_epoch:
+                self.buffer += self.epoch_sentences()
+                self.epoch += 1
+                self.next_epoch += 1.0 / rate
+
+        def epoch_sentences(self):
+            """GGA, GSA, RMC and VTG for one fix; GSV every fifth epoch"""
+            state = boat.state()
+            sigma = 2.5 * hdop
+            north = boat.noise.normal(0, sigma)
+            east = boat.noise.normal(0, sigma)
+            lat = state['lat'] + north / METERS_PER_DEGREE
+            lon = state['lon'] + east / (METERS_PER_DEGREE * math.cos(math.radians(state['lat'])))
+            knots = max(0.0, state['speed'] + boat.noise.normal(0, 0.05)) * KNOTS_PER_MS
+            course = (math.degrees(state['heading']) + boat.noise.normal(0, 1.0)) % 360
+
+            utc = datetime.now(timezone.utc)
+            hms = utc.strftime('%H%M%S') + f".{utc.microsecond // 10000:02d}"
+            date = utc.strftime('%d%m%y')
+            lat_field = f"{nmea_coordinate(lat, 2)},{'N' if lat >= 0 else 'S'}"
+            lon_field = f"{nmea_coordinate(lon, 3)},{'E' if lon >= 0 else 'W'}"
+            prns = ','.join(f"{prn:02d}" for prn in range(1, satellites + 1)[:12])
+            prns += ',' * (12 - min(satellites, 12))
+
+            sentences = [
+                f"GPGGA,{hms},{lat_field},{lon_field},1,{satellites:02d},{hdop:.1f},12.0,M,-17.0,M,,",
+                f"GPGSA,A,3,{prns},{hdop * 1.6:.1f},{hdop:.1f},{hdop * 1.3:.1f}",
+                f"GPRMC,{hms},A,{lat_field},{lon_field},{knots:.2f},{course:.1f},{date},,,A",
+                f"GPVTG,{course:.1f},T,,M,{knots:.2f},N,{knots * 1.852:.2f},K,A"
+            ]
+            if self.epoch % 5 == 0:
+                groups = [f"{prn:02d},{30 + prn * 4 % 50:02d},{prn * 37 % 360:03d},{30 + prn * 7 % 15:02d}"
+                          for prn in range(1, satellites + 1)]
+                total = (len(groups) + 3) // 4
+                for i in range(total):
+                    sentences.append(f"GPGSV,{total},{i + 1},{satellites:02d}," + ','.join(groups[i * 4:i * 4 + 4]))
+            return b''.join(nmea_sentence(s) for s in sentences)
+
+        @property
+        def in_waiting(self):
+            self.generate()
+            return len(self.buffer)
+
+        def read(self, size=1):
+            faults.call()
+            if not self.is_open:
+                raise OSError('Port is closed')
+            self.generate()
+            if not self.buffer:
+                # Block like a serial port: until data arrives or the timeout
+                wait = self.next_epoch - time.monotonic()
+                if self.timeout is not None and wait > self.timeout:
+                    time.sleep(self.timeout)
+                    return b''
+                time.sleep(max(0.0, wait))
+                self.generate()
+            data = bytes(self.buffer[:size])
+            del self.buffer[:size]
+            return data
+
+        def close(self):
+            self.is_open = False
+
+    module.Serial = Serial
+    return module
+
+
+def build_i2c_modules():
+    """board and busio stand-ins; the simulated I2C bus does nothing itself"""
+    board = types.ModuleType('board')
+    board.SCL = 3
+    board.SDA = 2
+    busio = types.ModuleType('busio')
+
+    class I2C:
+        def __init__(self, scl, sda, frequency=100000):
+            self.scl = scl
+            self.sda = sda
+
+        def deinit(self):
+            pass
+
+    busio.I2C = I2C
+    return board, busio
+
+
+def build_mpu6050(boat, faults, config):
+    """mpu6050 module stand-in serving the boat's motion as raw registers"""
+    module = types.ModuleType('mpu6050')
+    accel_noise = config.get('accel_noise', 0.05)   # m/s^2
+    gyro_noise = config.get('gyro_noise', 0.05)     # deg/s
+    gyro_bias = config.get('gyro_bias', [0.5, -0.3, 0.2])
+    temperature = config.get('temperature', 30.0)
+
+    def sample():
+        """Accel (m/s^2), temperature (C) and gyro (deg/s) in the body frame"""
+        s = boat.state()
+        roll, pitch = s['roll'], s['pitch']
+        # Gravity seen by a z-up sensor, plus surge along x
+        accel = [
+            -GRAVITY * math.sin(pitch) + s['accel'],
+            GRAVITY * math.sin(roll) * math.cos(pitch),
+            GRAVITY * math.cos(roll) * math.cos(pitch)
+        ]
+        # The boat turns clockwise for a positive yaw rate; z up sees that as negative
+        gyro = [
+            math.degrees(s['roll_rate']),
+            math.degrees(s['pitch_rate']),
+            -math.degrees(s['yaw_rate'])
+        ]
+        accel = [a + n for a, n in zip(accel, boat.noise.normal(0, accel_noise, 3))]
+        gyro = [g + b + n for g, b, n in zip(gyro, gyro_bias, boat.noise.normal(0, gyro_noise, 3))]
+        return accel, temperature + boat.noise.normal(0, 0.05), gyro
+
+    class Bus:
+        def __init__(self):
+            self.registers = {}
+
+        def write_byte_data(self, address, register, value):
+            faults.call()
+            self.registers[register] = value
+
+        def read_i2c_block_data(self, address, register, length):
+            faults.call()
+            accel, temp, gyro = sample()
+            counts = [a / GRAVITY * 16384 for a in accel] + [(temp - 36.53) * 340] + [g * 131 for g in gyro]
+            data = bytearray()
+            for value in counts:
+                data += int(max(-32768, min(32767, round(value)))).to_bytes(2, 'big', signed=True)
+            return list(data[:length])
+
+    class mpu6050:
+        def __init__(self, address, bus=1):
+            faults.open()
+            self.address = address
+            self.bus = Bus()
+
+        def read_accel_range(self, raw=False):
+            return 2
+
+        def read_gyro_range(self, raw=False):
+            return 250
+
+        def get_accel_data(self, g=False):
+            faults.call()
+            accel, _, _ = sample()
+            return {'x': accel[0], 'y': accel[1], 'z': accel[2]}
+
+        def get_gyro_data(self):
+            faults.call()
+            _, _, gyro = sample()
+            return {'x': gyro[0], 'y': gyro[1], 'z': gyro[2]}
+
+        def get_temp(self):
+            faults.call()
+            return sample()[1]
+
+    module.mpu6050 = mpu6050
+    return module
+
+
+def build_ina3221(boat, faults):
+    """adafruit_ina3221 module stand-in"""
+    module = types.ModuleType('adafruit_ina3221')
+
+    class INA3221:
+        def __init__(self, i2c, address=0x40):
+            faults.open()
+
+        @property
+        def bus_voltage(self):
+            faults.call()
+            return boat.voltage() + boat.noise.normal(0, 0.005)
+
+    module.INA3221 = INA3221
+    return module
+
+
+def build_picamera2(boat, faults, config):
+    """picamera2 module stand-in rendering a horizon that moves with the boat"""
+    import cv2
+
+    module = types.ModuleType('picamera2')
+    fps = config.get('fps', 30)
+    rng = np.random.default_rng(config.get('seed', 0))
+
+    class Picamera2:
+        def __init__(self, camera_num=0):
+            faults.open()
+            self.main_size = (640, 480)
+            self.lores_size = None
+            self.started = False
+            self.frame = 0
+            self.next_frame = time.monotonic()
+            self.canvas = None
+
+        def create_preview_configuration(self, main=None, lores=None, **kwargs):
+            return {'main': main or {'size': (640, 480)}, 'lores': lores}
+
+        def configure(self, config):
+            self.main_size = tuple(config['main']['size'])
+            self.lores_size = tuple(config['lores']['size']) if config.get('lores') else None
+            width, height = self.main_size
+            # Sky above, textured water below, twice the frame size so the
+            # view can roll and shift without running off the edge. The
+            # texture keeps JPEG sizes close to a real scene.
+            self.canvas = np.empty((height * 2, width * 2, 3), dtype=np.uint8)
+            self.canvas[:height] = (200, 160, 110)  # BGR
+            self.canvas[height:] = (110, 80, 30)
+            self.canvas[height:] += rng.integers(0, 40, (height, width * 2, 1), dtype=np.uint8)
+
+        def start(self):
+            self.started = True
+
+        def stop(self):
+            self.started = False
+
+        def render(self):
+            """View of the canvas with the horizon tilted by roll and shifted by pitch"""
+            width, height = self.main_size
+            state = boat.state()
+            pitch = state['pitch'] + state['camera_tilt']
+            shift = pitch / math.radians(45) * height
+            matrix = cv2.getRotationMatrix2D((width, height), math.degrees(state['roll']), 1.0)
+            matrix[:, 2] -= (width / 2, height / 2 - shift)
+            view = cv2.warpAffine(self.canvas, matrix, (width, height))
+
+            stamp = datetime.now().strftime('%H:%M:%S.%f')[:-3]
+            cv2.putText(view, f"SIM {self.frame} {stamp}", (10, 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            cv2.putText(view, f"{state['lat']:.6f} {state['lon']:.6f} {state['speed']:.1f}m/s",
+                        (10, height - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
+            return view
+
+        def wait_frame(self):
+            """Block until the sensor would deliver the next frame"""
+            delay = self.next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self.next_frame = max(self.next_frame, time.monotonic() - 1.0 / fps) + 1.0 / fps
+            faults.call()
+            self.frame += 1
+
+        def capture_array(self, name='main'):
+            return self.capture_arrays([name])[0][0]
+
+        def capture_arrays(self, names):
+            self.wait_frame()
+            main = self.render()
+            arrays = []
+            for name in names:
+                if name == 'lores' and self.lores_size:
+                    small = cv2.resize(main, self.lores_size, interpolation=cv2.INTER_AREA)
+                    arrays.append(cv2.cvtColor(small, cv2.COLOR_BGR2YUV_I420))
+                else:
+                    arrays.append(main)
+            return arrays, {'FrameDuration': int(1e6 / fps)}
+
+    module.Picamera2 = Picamera2
+    return module
+
+
+def install(config):
+    """Register the simulated hardware modules; returns the shared Boat"""
+    settings = config.get('simulation', {})
+    devices = settings.get('devices', {})
+    boat = Boat(settings, config.get('pins', {}), config.get('esc_range', {}))
+    # Kept on the boat so tests and benchmarks can change them at run time
+    boat.faults = {
+        name: Faults(name, devices.get(name, {}), boat.rng)
+        for name in ('camera', 'gps', 'imu', 'battery', 'pigpio')
+    }
+
+    board, busio = build_i2c_modules()
+    modules = {
+        'pigpio': build_pigpio(boat, boat.faults['pigpio']),
+        'serial': build_serial(boat, boat.faults['gps'], devices.get('gps', {})),
+        'board': board,
+        'busio': busio,
+        'mpu6050': build_mpu6050(boat, boat.faults['imu'], devices.get('imu', {})),
+        'adafruit_ina3221': build_ina3221(boat, boat.faults['battery']),
+        'picamera2': build_picamera2(boat, boat.faults['camera'], devices.get('camera', {}))
+    }
+    for name, module in modules.items():
+        _replaced.setdefault(name, sys.modules.get(name))
+        sys.modules[name] = module
+
+    print("Simulated hardware installed: " + ', '.join(sorted(modules)))
+    return boat
+
+
+def uninstall():
+    """Restore whatever the hardware module names pointed to before install()"""
+    for name, module in _replaced.items():
+        if module is None:
+            sys.modules.pop(name, None)
+        else:
+            sys.modules[name] = module
+    _replaced.clear()
@@ -0,0 +1,313 @@
+# Long-running soak test against simulated hardware
+#
+# Runs the server (simulated, with the leak monitor on) for hours while
+# clients churn: viewers come and go, slow readers let queues and send
+# buffers fill, commanders send control, servo and pump commands and
+# history requests, and about half the sessions end by dropping the TCP
+# connection instead of closing it. The server's soak file is then
+# turned into a report: every counter that keeps growing after warmup is
+# flagged, with the allocation sites that grew alongside it.
+#
+#   python soak_test.py --hours 4 --clients 6
+#   python soak_test.py --report soak_results/soak_20250101_120000.jsonl
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+from websockets.asyncio.client import connect
+
+from benchmark import CONFIG_PATH, ServerProcess, git_commit, set_path
+
+# Smallest growth over the run worth flagging, per counter
+GROWTH_THRESHOLDS = {
+    'rss_mb': 8,
+    'traced_mb': 4,
+    'fds': 4,
+    'threads': 2,
+    'tasks': 5,
+    'gc_objects': 10000,
+    'loop_lag_p99_ms': 20,
+    'connections': 2,
+    'background_tasks': 2,
+    'pump_tasks': 2,
+    'queued_messages': 10,
+    'write_buffer_bytes': 1024 * 1024,
+    'history_cache': 10,
+    'recorder_rows': 1000,
+    'metric_series': 5
+}
+
+# Allocation sites that grew at every snapshot by at least this much are flagged
+MIN_SITE_GROWTH_KB = 256
+
+
+def load_samples(path):
+    """Rows of a soak file"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def growth(times, values, threshold, windows=5):
+    """Trend of one counter: flagged when the median of every window is at least the previous one's and it grew by threshold"""
+    values = np.asarray(values, dtype=np.float64)
+    times = np.asarray(times, dtype=np.float64)
+    result = {
+        'first': round(float(values[0]), 2),
+        'last': round(float(values[-1]), 2),
+        'max': round(float(values.max()), 2),
+        'slope_per_hour': None,
+        'monotonic': False,
+        'flagged': False
+    }
+    if len(values) < windows * 2:
+        return result
+
+    result['slope_per_hour'] = round(float(np.polyfit(times / 3600, values, 1)[0]), 3)
+    medians = [float(np.median(part)) for part in np.array_split(values, windows)]
+    result['window_medians'] = [round(m, 2) for m in medians]
+    result['monotonic'] = all(b >= a for a, b in zip(medians, medians[1:]))
+    result['flagged'] = result['monotonic'] and medians[-1] - medians[0] >= threshold
+    return result
+
+
+def growing_sites(samples):
+    """Allocation sites whose growth since the baseline increased at every snapshot"""
+    snapshots = [row['allocations'] for row in samples if 'allocations' in row]
+    if len(snapshots) < 3:
+        return []
+
+    history = {}
+    for index, snapshot in enumerate(snapshots):
+        for stat in snapshot:
+            key = tuple(stat['traceback'])
+            history.setdefault(key, {})[index] = stat
+
+    sites = []
+    for key, seen in history.items():
+        # Sites drop out of a snapshot's top list when they stop growing
+        if len(seen) < len(snapshots) - 1 or len(snapshots) - 1 not in seen:
+            continue
+        diffs = [seen[i]['size_diff_kb'] for i in sorted(seen)]
+        if all(b >= a for a, b in zip(diffs, diffs[1:])) and diffs[-1] >= MIN_SITE_GROWTH_KB:
+            latest = seen[len(snapshots) - 1]
+            sites.append({
+                'site': latest['site'],
+                'size_diff_kb': latest['size_diff_kb'],
+                'count_diff': latest['count_diff'],
+                'growth_kb': diffs,
+                'traceback': latest['traceback']
+            })
+    return sorted(sites, key=lambda site: -site['size_diff_kb'])
+
+
+def analyze(samples, thresholds=GROWTH_THRESHOLDS):
+    """Growth report for the rows after warmup"""
+    rows = [row for row in samples if not row.get('warmup')]
+    report = {
+        'samples': len(samples),
+        'measured_samples': len(rows),
+        'duration_hours': round((samples[-1]['t'] - samples[0]['t']) / 3600, 2) if samples else 0,
+        'counters': {},
+        'flagged': [],
+        'allocation_sites': growing_sites(rows),
+        'latest_allocations': next((row['allocations'] for row in reversed(rows) if 'allocations' in row), [])
+    }
+    if len(rows) < 2:
+        return report
+
+    times = [row['t'] for row in rows]
+    names = [name for name in rows[0] if isinstance(rows[0][name], (int, float)) and not isinstance(rows[0][name], bool)]
+    for name in names:
+        if name == 't':
+            continue
+        points = [(t, row.get(name)) for t, row in zip(times, rows) if row.get(name) is not None]
+        if len(points) < 2:
+            continue
+        trend = growth([p[0] for p in points], [p[1] for p in points], thresholds.get(name, float('inf')))
+        report['counters'][name] = trend
+        if trend['flagged']:
+            report['flagged'].append(name)
+    return report
+
+
+def print_report(report):
+    """Human-readable summary"""
+    print(f"\nSoak report: {report['duration_hours']} h, {report['measured_samples']} samples after warmup")
+    for name, trend in report['counters'].items():
+        flag = '  GROWING' if trend['flagged'] else ''
+        slope = '' if trend['slope_per_hour'] is None else f" ({trend['slope_per_hour']:+}/h)"
+        print(f"  {name:22s} {trend['first']:>12} -> {trend['last']:>12}, max {trend['max']}{slope}{flag}")
+    if report['allocation_sites']:
+        print("\nAllocation sites growing at every snapshot:")
+        for site in report['allocation_sites'][:10]:
+            print(f"  +{site['size_diff_kb']} KB ({site['count_diff']:+} blocks) at {site['site']}")
+            for frame in site['traceback'][:5]:
+                print(f"      {frame}")
+    elif report['latest_allocations']:
+        print("\nLargest growth since baseline (not steady):")
+        for site in report['latest_allocations'][:5]:
+            print(f"  +{site['size_diff_kb']} KB at {site['site']}")
+    print(f"\n{len(report['flagged'])} growing counter(s): {', '.join(report['flagged']) or 'none'}")
+
+
+class ChurnClient:
+    """Connects, behaves as one kind of client for a while, leaves, repeats"""
+
+    BEHAVIORS = ('viewer', 'slow', 'commander')
+
+    def __init__(self, url, seed, session, stop_at, stats):
+        self.url = url
+        self.rng = random.Random(seed)
+        self.session = session
+        self.stop_at = stop_at
+        self.stats = stats
+
+    async def run(self):
+        """Start sessions until the soak ends"""
+        while time.monotonic() < self.stop_at:
+            behavior = self.rng.choice(self.BEHAVIORS)
+            length = min(self.rng.uniform(0.2, 1.0) * self.session, max(0.0, self.stop_at - time.monotonic()))
+            try:
+                await self.session_once(behavior, length)
+                self.stats[behavior] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Soak client error ({behavior}): {e}")
+            await asyncio.sleep(self.rng.uniform(0.1, 2.0))
+
+    async def session_once(self, behavior, length):
+        """One connection; about half end by dropping the TCP connection"""
+        async with connect(self.url, max_size=None, max_queue=4) as websocket:
+            if self.rng.random() < 0.5:
+                await websocket.send(json.dumps({'type': 'video_mode', 'mode': 'binary'}))
+                await websocket.send(json.dumps({'type': 'telemetry_mode', 'mode': 'binary'}))
+
+            reader = asyncio.create_task(self.read(websocket, behavior == 'slow'))
+            try:
+                if behavior == 'commander':
+                    await self.command(websocket, length)
+                else:
+                    await asyncio.sleep(length)
+            finally:
+                reader.cancel()
+                await asyncio.gather(reader, return_exceptions=True)
+
+            if self.rng.random() < 0.5:
+                websocket.transport.abort()
+                self.stats['aborted'] += 1
+
+    async def read(self, websocket, slow):
+        """Drain messages, or read at ~50 KB/s so the server's queues and buffers fill"""
+        async for message in websocket:
+            self.stats['messages'] += 1
+            if slow:
+                await asyncio.sleep(len(message) / 50000)
+
+    async def command(self, websocket, length):
+        """Control, servo and pump commands plus the occasional stats or history request"""
+        end = time.monotonic() + length
+        while time.monotonic() < end:
+            choice = self.rng.random()
+            if choice < 0.4:
+                message = {'type': 'control', 'command': self.rng.choice(['forward', 'left', 'right', 'stop'])}
+            elif choice < 0.6:
+                message = {'type': 'servo', 'command': 'pan', 'value': {'angle': self.rng.uniform(-90, 90)}}
+            elif choice < 0.7:
+                message = {'type': 'pump', 'pump_id': self.rng.randint(1, 4), 'duration': 1}
+            elif choice < 0.8:
+                message = {'type': self.rng.choice(['client_stats', 'device_status', 'sensor_stats', 'video_stats'])}
+            else:
+                message = {'type': 'history', 'duration': self.rng.choice([60, 600, 3600]), 'points': 200}
+            await websocket.send(json.dumps(message))
+            await asyncio.sleep(self.rng.uniform(0.05, 0.5))
+
+
+async def churn(url, clients, duration, session, seed):
+    """Run the churning clients for `duration` seconds"""
+    stats = {'viewer': 0, 'slow': 0, 'commander': 0, 'aborted': 0, 'messages': 0, 'errors': 0}
+    stop_at = time.monotonic() + duration
+    tasks = [
+        asyncio.create_task(ChurnClient(url, seed + i, session, stop_at, stats).run())
+        for i in range(clients)
+    ]
+    reporter = asyncio.create_task(report_progress(stats, stop_at))
+    await asyncio.gather(*tasks)
+    reporter.cancel()
+    return stats
+
+
+async def report_progress(stats, stop_at):
+    """A line every few minutes so a long soak shows it is alive"""
+    while True:
+        await asyncio.sleep(300)
+        print(f"  {max(0, stop_at - time.monotonic()) / 60:.0f} min left, sessions {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Soak test the server against simulated hardware')
+    parser.add_argument('--hours', type=float, default=2.0, help='length of the soak')
+    parser.add_argument('--clients', type=int, default=4, help='concurrently churning clients')
+    parser.add_argument('--session', type=float, default=60, help='longest client session in seconds')
+    parser.add_argument('--interval', type=float, default=30, help='seconds between resource samples')
+    parser.add_argument('--snapshot-interval', type=float, default=300, help='seconds between allocation snapshots')
+    parser.add_argument('--warmup', type=float, default=300, help='seconds before the baseline snapshot')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE', help='override a setting')
+    parser.add_argument('--output', help='report file (default next to the soak file)')
+    parser.add_argument('--report', help='only analyze an existing soak file')
+    args = parser.parse_args()
+
+    if args.report:
+        soak_file = args.report
+    else:
+        with open(CONFIG_PATH) as f:
+            config = json.load(f)
+        soak_file = os.path.abspath(os.path.join(
+            'soak_results', f"soak_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl"))
+        os.makedirs(os.path.dirname(soak_file), exist_ok=True)
+        config['websocket']['port'] = args.port
+        config.setdefault('simulation', {})['enabled'] = True
+        config['soak'] = {
+            'enabled': True,
+            'file': soak_file,
+            'interval': args.interval,
+            'snapshot_interval': args.snapshot_interval,
+            'warmup': args.warmup
+        }
+        for override in args.set:
+            key, _, value = override.partition('=')
+            set_path(config, key, value)
+
+        server = ServerProcess(config)
+        print(f"Soaking for {args.hours} h with {args.clients} churning clients, "
+              f"server log in {server.directory}, samples in {soak_file}")
+        server.start()
+        try:
+            stats = asyncio.run(churn(server.url, args.clients, args.hours * 3600, args.session, args.seed))
+            print(f"Client sessions: {stats}")
+        finally:
+            server.stop()
+
+    report = analyze(load_samples(soak_file))
+    report.update({'soak_file': soak_file, 'git_commit': git_commit()})
+    print_report(report)
+
+    output = args.output or os.path.splitext(soak_file)[0] + '_report.json'
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {output}")
+    if report['flagged'] or report['allocation_sites']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,153 @@
 # System monitoring
+#
+# Metrics change at very different rates, so each one is sampled on its
+# own TTL (CPU and temperature every second, disk once a minute) and the
+# rest of the time the cached value is returned. get_status() is called
+# by the sensor hub's poller thread; the telemetry loop only ever sees the
+# hub's cached snapshot.
 import os
+import threading
 import time
 import psutil
 
+from histogram import Histogram
+
+# Raspberry Pi firmware throttling state, as reported by `vcgencmd get_throttled`
+THROTTLED_PATH = '/sys/devices/platform/soc/soc:firmware/get_throttled'
+THROTTLE_FLAGS = {
+    0: 'under_voltage',
+    1: 'freq_capped',
+    2: 'throttled',
+    3: 'soft_temp_limit',
+    16: 'under_voltage_occurred',
+    17: 'freq_capped_occurred',
+    18: 'throttled_occurred',
+    19: 'soft_temp_limit_occurred'
+}
+
+# Seconds between samples of each metric
+DEFAULT_TTL = {
+    'temp': 1.0,
+    'cpu': 1.0,
+    'memory': 5.0,
+    'process': 5.0,
+    'throttle': 5.0,
+    'disk': 60.0
+}
+
+# Event loop lag buckets in milliseconds
+LAG_BOUNDS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def throttle_flags(bits):
+    """Names of the set throttling bits"""
+    return [name for bit, name in THROTTLE_FLAGS.items() if bits & (1 << bit)]
+
+
 class SystemStatus:
-    def __init__(self):
+    def __init__(self, config=None):
+        config = config or {}
         self.start_time = time.time()
+        self.ttl = dict(DEFAULT_TTL, **config.get('ttl', {}))
+        self.process = psutil.Process()
+        self.throttled_path = THROTTLED_PATH
+        
+        self.samplers = {
+            'temp': self.read_temp,
+            'cpu': self.read_cpu,
+            'memory': self.read_memory,
+            'process': self.read_process,
+            'throttle': self.read_throttle,
+            'disk': self.read_disk
+        }
+        self.values = {}
+        self.sampled_at = {}
         
+        # Event loop lag, recorded from the loop and read from the poller thread
+        self.lock = threading.Lock()
+        self.loop_lag = None
+        self.loop_lag_max = None
+        self.loop_lag_histogram = Histogram(LAG_BOUNDS_MS)
+        
+        # cpu_percent() measures since the previous call; start the first window now
+        psutil.cpu_percent(percpu=True)
+        self.process.cpu_percent()
+
+    def read_temp(self):
+        """CPU temperature from the thermal zone"""
+        try:
+            with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
+                return {'cpu_temp': round(float(f.read()) / 1000, 1)}
+        except (OSError, ValueError):
+            return {'cpu_temp': None}
+
+    def read_cpu(self):
+        """Overall and per-core CPU usage since the last sample, and the load average"""
+        cores = psutil.cpu_percent(percpu=True)
+        return {
+            'cpu_usage': round(sum(cores) / len(cores), 1) if cores else None,
+            'cpu_cores': cores,
+            'load_average': round(os.getloadavg()[0], 2)
+        }
+
+    def read_memory(self):
+        """System memory usage"""
+        return {'memory_usage': psutil.virtual_memory().percent}
+
+    def read_process(self):
+        """This server's resident memory and CPU usage"""
+        with self.process.oneshot():
+            return {
+                'process_rss_mb': round(self.process.memory_info().rss / (1024 * 1024), 1),
+                'process_cpu': round(self.process.cpu_percent(), 1),
+                'process_threads': self.process.num_threads()
+            }
+
+    def read_throttle(self):
+        """Firmware under-voltage and throttling bits (None when not on a Pi)"""
+        if self.throttled_path is None:
+            return {'throttled': None, 'throttle_flags': None}
+        try:
+            with open(self.throttled_path) as f:
+                bits = int(f.read().strip(), 16)
+        except FileNotFoundError:
+            self.throttled_path = None  # not a Pi, or an old kernel; stop looking
+            return {'throttled': None, 'throttle_flags': None}
+        except (OSError, ValueError):
+            return {'throttled': None, 'throttle_flags': None}
+        return {'throttled': bits, 'throttle_flags': throttle_flags(bits)}
+
+    def read_disk(self):
+        """Root filesystem usage"""
+        return {'disk_usage': psutil.disk_usage('/').percent}
+
+    def refresh(self):
+        """Resample every metric whose TTL has expired"""
+        now = time.monotonic()
+        for name, sampler in self.samplers.items():
+            sampled_at = self.sampled_at.get(name)
+            # A little slack so a 1 s TTL polled every second refreshes every time
+            if sampled_at is not None and now - sampled_at < self.ttl[name] * 0.95:
+                continue
+            try:
+                self.values.update(sampler())
+            except Exception as e:
+                print(f"System status error ({name}): {e}")
+            self.sampled_at[name] = now
+
+    def record_loop_lag(self, lag):
+        """Record how late the event loop woke up (seconds)"""
+        lag_ms = max(0.0, lag * 1000)
+        self.loop_lag_histogram.observe(lag_ms)
+        with self.lock:
+            self.loop_lag = lag_ms
+            if self.loop_lag_max is None or lag_ms > self.loop_lag_max:
+                self.loop_lag_max = lag_ms
+
     def get_status(self):
         """Get system status information"""
         try:
-            # CPU temperature
-            temp = None
-            try:
-                with open('/sys/class/thermal/thermal_zone0/temp', 'r') as f:
-                    temp = round(float(f.read()) / 1000, 1)
-            except:
-                temp = None
-                
-            # CPU usage
-            cpu_percent = psutil.cpu_percent()
-            
-            # Memory usage
-            memory = psutil.virtual_memory()
-            memory_percent = memory.percent
-            
-            # Disk usage
-            disk = psutil.disk_usage('/')
-            disk_percent = disk.percent
+            self.refresh()
             
             # Uptime
             uptime = time.time() - self.start_time
@@ -35,14 +155,21 @@ class SystemStatus:
             minutes, seconds = divmod(remainder, 60)
             uptime_str = f"{int(hours)}h {int(minutes)}m {int(seconds)}s"
             
-            return {
-                'cpu_temp': temp,
-                'cpu_usage': cpu_percent,
-                'memory_usage': memory_percent,
-                'disk_usage': disk_percent,
-                'uptime': uptime_str
-            }
+            # Worst lag since the previous status, so short stalls are not missed
+            with self.lock:
+                lag = self.loop_lag
+                lag_max = self.loop_lag if self.loop_lag_max is None else self.loop_lag_max
+                self.loop_lag_max = None
             
+            status = dict(self.values)
+            status.update({
+                'loop_lag_ms': None if lag is None else round(lag, 1),
+                'loop_lag_max_ms': None if lag_max is None else round(lag_max, 1),
+                'uptime': uptime_str,
+                'uptime_seconds': int(uptime)
+            })
+            return status
+        
         except Exception as e:
             print(f"System status error: {e}")
-            return None
\ No newline at end of file
+            return None
@@ -0,0 +1,182 @@
+# Telemetry history queries with server-side downsampling
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from telemetry_recorder import FIELD_NAMES, read_file
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax', 'stride')
+
+
+def lttb(t, v, points):
+    """Largest-Triangle-Three-Buckets downsampling, returns selected indices.
+
+    The bucket loop is inherent to LTTB (each pick depends on the previous
+    one), but the triangle areas inside a bucket are computed with NumPy.
+    """
+    n = len(t)
+    if points >= n or points < 3:
+        return np.arange(n)
+
+    # Bucket i covers [edges[i], edges[i + 1]); the final point is its own bucket
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    edges = np.r_[edges, n]
+    counts = np.maximum(np.diff(edges), 1)
+    avg_t = np.add.reduceat(t, edges[:-1]) / counts
+    avg_v = np.add.reduceat(v, edges[:-1]) / counts
+
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+
+    for i in range(points - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        at, av = t[a], v[a]
+        area = np.abs((at - avg_t[i + 1]) * (v[lo:hi] - av) - (at - t[lo:hi]) * (avg_v[i + 1] - av))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+
+    return selected
+
+
+def minmax(t, v, points):
+    """Keep the minimum and maximum sample of each time bucket, returns indices"""
+    n = len(t)
+    buckets = max(1, points // 2)
+    if n <= points:
+        return np.arange(n)
+
+    span = t[-1] - t[0] or 1.0
+    bucket = np.minimum(((t - t[0]) / span * buckets).astype(np.int64), buckets - 1)
+
+    # Sort by (bucket, value); the first and last entry of each bucket
+    # group are its min and max
+    order = np.lexsort((v, bucket))
+    sorted_bucket = bucket[order]
+    starts = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+
+    return np.unique(np.concatenate((order[starts], order[ends])))
+
+
+def stride(t, v, points):
+    """Every k-th sample; keeps multi-field series (e.g. lat/lon) aligned"""
+    n = len(t)
+    if n <= points:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, points).astype(np.int64))
+
+
+class TelemetryHistory:
+    def __init__(self, recorder, cache_size=32, live_ttl=5):
+        self.recorder = recorder
+        self.cache_size = cache_size
+        self.live_ttl = live_ttl
+        self.cache = OrderedDict()
+        self.file_cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def load_file(self, path):
+        """Decoded file contents, cached while the file is unchanged"""
+        key = (path, os.path.getsize(path))
+        with self.lock:
+            if key in self.file_cache:
+                self.file_cache.move_to_end(key)
+                return self.file_cache[key]
+
+        chunks = read_file(path)
+        with self.lock:
+            self.file_cache[key] = chunks
+            while len(self.file_cache) > 4:
+                self.file_cache.popitem(last=False)
+        return chunks
+
+    def load_range(self, start, end, fields):
+        """Concatenate recorded and buffered columns between start and end"""
+        chunks = []
+        for path in self.recorder.files_in_range(start, end):
+            chunks.extend(self.load_file(path))
+        buffered = self.recorder.buffered_columns()
+        if buffered:
+            chunks.append(buffered)
+
+        start_ms, end_ms = start * 1000, end * 1000
+        times = []
+        columns = {name: [] for name in fields}
+        for chunk in chunks:
+            t = chunk['time_ms']
+            if not len(t) or t[-1] < start_ms or t[0] > end_ms:
+                continue
+            mask = (t >= start_ms) & (t <= end_ms)
+            times.append(t[mask])
+            for name in fields:
+                columns[name].append(chunk[name][mask])
+
+        if not times:
+            return np.empty(0), {name: np.empty(0) for name in fields}
+
+        t = np.concatenate(times) / 1000.0
+        order = np.argsort(t, kind='stable')
+        return t[order], {name: np.concatenate(columns[name])[order] for name in fields}
+
+    def get_history(self, start=None, end=None, duration=3600, fields=None,
+                    points=500, method='lttb'):
+        """Downsampled series for each field between start and end (epoch seconds).
+
+        Results are cached by (range, fields, points, method). The range is
+        snapped to the bucket width, so repeated "last N hours" requests
+        share an entry; entries that include unflushed data expire after
+        live_ttl seconds.
+        """
+        if method not in DOWNSAMPLE_METHODS:
+            raise ValueError(f'Unknown downsampling method: {method}')
+
+        now = time.time()
+        end = float(end) if end is not None else now
+        start = float(start) if start is not None else end - float(duration)
+        points = max(3, min(int(points), 5000))
+        fields = [f for f in (fields or FIELD_NAMES[1:]) if f in FIELD_NAMES[1:]]
+
+        width = max((end - start) / points, 0.1)
+        start = float(np.floor(start / width) * width)
+        end = float(np.ceil(end / width) * width)
+
+        key = (start, end, tuple(fields), points, method)
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry and (entry[0] is None or entry[0] > now):
+                self.cache.move_to_end(key)
+                return entry[1]
+
+        t, columns = self.load_range(start, end, fields)
+        downsample = {'lttb': lttb, 'minmax': minmax, 'stride': stride}[method]
+
+        series = {}
+        for name in fields:
+            values = columns[name]
+            valid = ~np.isnan(values)
+            field_t, field_v = t[valid], values[valid]
+            index = downsample(field_t, field_v, points)
+            series[name] = {
+                't': np.round(field_t[index], 3).tolist(),
+                'v': np.round(field_v[index], 7).tolist()
+            }
+
+        result = {
+            'start': start,
+            'end': end,
+            'method': method,
+            'points': points,
+            'series': series
+        }
+
+        expires = now + self.live_ttl if end >= now - self.recorder.flush_interval else None
+        with self.lock:
+            self.cache[key] = (expires, result)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return result
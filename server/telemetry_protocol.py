@@ -0,0 +1,135 @@
+# Compact binary telemetry protocol with keyframes and deltas
+#
+# Every telemetry field is sent as a scaled fixed-width integer. A keyframe
+# carries every field; in between, delta frames carry only the fields that
+# differ from the last keyframe. Deltas are taken against the keyframe
+# rather than the previous frame, so a client whose outbound queue
+# replaced a delta with a newer one still decodes correctly. The schema is
+# sent to the client as JSON when it switches to binary mode, so fields can
+# be added by bumping SCHEMA_VERSION without breaking the decoder.
+import struct
+
+from binary_frames import FRAME_TELEMETRY
+
+SCHEMA_VERSION = 4
+
+# name, path in the telemetry snapshot, struct code, scale
+TELEMETRY_FIELDS = [
+    ('gps.lat', ('gps', 'lat'), 'i', 1e7),
+    ('gps.lon', ('gps', 'lon'), 'i', 1e7),
+    ('gps.alt', ('gps', 'alt'), 'i', 10),
+    ('gps.satellites', ('gps', 'satellites'), 'h', 1),
+    ('gps.fix', ('gps', 'fix'), 'h', 1),
+    ('imu.accel.x', ('imu', 'accel', 'x'), 'h', 100),
+    ('imu.accel.y', ('imu', 'accel', 'y'), 'h', 100),
+    ('imu.accel.z', ('imu', 'accel', 'z'), 'h', 100),
+    ('imu.gyro.x', ('imu', 'gyro', 'x'), 'h', 100),
+    ('imu.gyro.y', ('imu', 'gyro', 'y'), 'h', 100),
+    ('imu.gyro.z', ('imu', 'gyro', 'z'), 'h', 100),
+    ('imu.temp', ('imu', 'temp'), 'h', 10),
+    ('battery.voltage', ('battery', 'voltage'), 'h', 100),
+    ('battery.percentage', ('battery', 'percentage'), 'h', 1),
+    ('system.cpu_temp', ('system', 'cpu_temp'), 'h', 10),
+    ('system.cpu_usage', ('system', 'cpu_usage'), 'h', 10),
+    ('system.memory_usage', ('system', 'memory_usage'), 'h', 10),
+    ('system.disk_usage', ('system', 'disk_usage'), 'h', 10),
+    ('system.uptime_seconds', ('system', 'uptime_seconds'), 'i', 1),
+    ('servos.pan_angle', ('servos', 'pan_angle'), 'h', 10),
+    ('servos.tilt_angle', ('servos', 'tilt_angle'), 'h', 10),
+    ('imu.orientation.roll', ('imu', 'orientation', 'roll'), 'h', 100),
+    ('imu.orientation.pitch', ('imu', 'orientation', 'pitch'), 'h', 100),
+    ('imu.orientation.yaw', ('imu', 'orientation', 'yaw'), 'h', 100),
+    ('imu.orientation.quaternion.w', ('imu', 'orientation', 'quaternion', 'w'), 'h', 10000),
+    ('imu.orientation.quaternion.x', ('imu', 'orientation', 'quaternion', 'x'), 'h', 10000),
+    ('imu.orientation.quaternion.y', ('imu', 'orientation', 'quaternion', 'y'), 'h', 10000),
+    ('imu.orientation.quaternion.z', ('imu', 'orientation', 'quaternion', 'z'), 'h', 10000),
+    ('nav.lat', ('nav', 'lat'), 'i', 1e7),
+    ('nav.lon', ('nav', 'lon'), 'i', 1e7),
+    ('nav.speed', ('nav', 'speed'), 'h', 100),
+    ('nav.heading', ('nav', 'heading'), 'h', 10),
+    ('nav.position_error', ('nav', 'position_error'), 'h', 10),
+    ('system.process_rss_mb', ('system', 'process_rss_mb'), 'h', 10),
+    ('system.loop_lag_max_ms', ('system', 'loop_lag_max_ms'), 'h', 10),
+    ('system.throttled', ('system', 'throttled'), 'i', 1),
+]
+
+# type, schema version, flags, sequence, keyframe sequence, time (ms), field mask
+TELEMETRY_HEADER = struct.Struct('!BBBIIQQ')
+FLAG_KEYFRAME = 0x01
+
+LIMITS = {'h': (-(1 << 15), (1 << 15) - 1), 'i': (-(1 << 31), (1 << 31) - 1)}
+
+
+def get_schema(fields=TELEMETRY_FIELDS):
+    """Schema description sent to clients that switch to binary telemetry"""
+    return {
+        'version': SCHEMA_VERSION,
+        'header': '!BBBIIQQ',
+        'missing': {code: low for code, (low, _) in LIMITS.items()},
+        'fields': [
+            {'name': name, 'type': code, 'scale': scale}
+            for name, _, code, scale in fields
+        ]
+    }
+
+
+def scaled_value(snapshot, path, code, scale):
+    """Scaled integer for one field, or the type's minimum when missing"""
+    value = snapshot
+    for key in path:
+        if not isinstance(value, dict):
+            value = None
+            break
+        value = value.get(key)
+
+    low, high = LIMITS[code]
+    if isinstance(value, bool):
+        value = int(value)
+    if not isinstance(value, (int, float)):
+        return low
+    return max(low + 1, min(high, int(round(value * scale))))
+
+
+class TelemetryEncoder:
+    def __init__(self, keyframe_interval=10, fields=TELEMETRY_FIELDS):
+        self.fields = fields
+        self.keyframe_interval = keyframe_interval
+        self.sequence = 0
+        self.keyframe_sequence = 0
+        self.keyframe_values = None
+        self.keyframe_mask = (1 << len(fields)) - 1
+        self.keyframe_struct = struct.Struct('!' + ''.join(f[2] for f in fields))
+
+    def request_keyframe(self):
+        """Make the next frame a keyframe, e.g. when a client joins"""
+        self.keyframe_values = None
+
+    def encode(self, snapshot, timestamp):
+        """Encode one snapshot; returns the frame bytes"""
+        values = [scaled_value(snapshot, path, code, scale) for _, path, code, scale in self.fields]
+        self.sequence += 1
+        time_ms = int(timestamp * 1000)
+
+        if self.keyframe_values is None or self.sequence - self.keyframe_sequence >= self.keyframe_interval:
+            self.keyframe_values = values
+            self.keyframe_sequence = self.sequence
+            header = TELEMETRY_HEADER.pack(
+                FRAME_TELEMETRY, SCHEMA_VERSION, FLAG_KEYFRAME,
+                self.sequence, self.sequence, time_ms, self.keyframe_mask
+            )
+            return header + self.keyframe_struct.pack(*values)
+
+        mask = 0
+        codes = []
+        changed = []
+        for i, (value, base) in enumerate(zip(values, self.keyframe_values)):
+            if value != base:
+                mask |= 1 << i
+                codes.append(self.fields[i][2])
+                changed.append(value)
+
+        header = TELEMETRY_HEADER.pack(
+            FRAME_TELEMETRY, SCHEMA_VERSION, 0,
+            self.sequence, self.keyframe_sequence, time_ms, mask
+        )
+        return header + struct.pack('!' + ''.join(codes), *changed)
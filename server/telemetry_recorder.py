@@ -0,0 +1,290 @@
+# Continuous telemetry recording to compressed, size-rotated files
+#
+# Snapshots are buffered in memory and flushed as columnar chunks: each
+# field is scaled to a fixed-width integer, delta-encoded and the whole
+# chunk is gzip-compressed. Every chunk is a complete gzip member, so a
+# file cut short by a power loss still reads up to its last flush.
+import asyncio
+import glob
+import gzip
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+CHUNK_MAGIC = b'TLM1'
+CHUNK_HEADER = struct.Struct('<4sII')  # magic, rows, fields
+
+# name, path in the telemetry snapshot, stored dtype, scale. Append-only:
+# chunks written before a field existed decode with that column missing.
+FIELDS = [
+    ('time_ms', None, '<i8', 1),
+    ('gps_lat', ('gps', 'lat'), '<i4', 1e7),
+    ('gps_lon', ('gps', 'lon'), '<i4', 1e7),
+    ('gps_alt', ('gps', 'alt'), '<i4', 10),
+    ('gps_satellites', ('gps', 'satellites'), '<i2', 1),
+    ('gps_fix', ('gps', 'fix'), '<i2', 1),
+    ('imu_accel_x', ('imu', 'accel', 'x'), '<i2', 100),
+    ('imu_accel_y', ('imu', 'accel', 'y'), '<i2', 100),
+    ('imu_accel_z', ('imu', 'accel', 'z'), '<i2', 100),
+    ('imu_gyro_x', ('imu', 'gyro', 'x'), '<i2', 100),
+    ('imu_gyro_y', ('imu', 'gyro', 'y'), '<i2', 100),
+    ('imu_gyro_z', ('imu', 'gyro', 'z'), '<i2', 100),
+    ('imu_temp', ('imu', 'temp'), '<i2', 10),
+    ('battery_voltage', ('battery', 'voltage'), '<i2', 100),
+    ('battery_percentage', ('battery', 'percentage'), '<i2', 1),
+    ('system_cpu_temp', ('system', 'cpu_temp'), '<i2', 10),
+    ('system_cpu_usage', ('system', 'cpu_usage'), '<i2', 10),
+    ('system_memory_usage', ('system', 'memory_usage'), '<i2', 10),
+    ('system_disk_usage', ('system', 'disk_usage'), '<i2', 10),
+    ('servo_pan', ('servos', 'pan_angle'), '<i2', 10),
+    ('servo_tilt', ('servos', 'tilt_angle'), '<i2', 10),
+    ('imu_roll', ('imu', 'orientation', 'roll'), '<i2', 100),
+    ('imu_pitch', ('imu', 'orientation', 'pitch'), '<i2', 100),
+    ('imu_yaw', ('imu', 'orientation', 'yaw'), '<i2', 100),
+    ('gps_speed', ('gps', 'speed_knots'), '<i2', 100),
+    ('gps_course', ('gps', 'course'), '<i2', 10),
+    ('gps_hdop', ('gps', 'hdop'), '<i2', 10),
+    ('nav_lat', ('nav', 'lat'), '<i4', 1e7),
+    ('nav_lon', ('nav', 'lon'), '<i4', 1e7),
+    ('nav_speed', ('nav', 'speed'), '<i2', 100),
+    ('nav_heading', ('nav', 'heading'), '<i2', 10),
+    ('nav_error', ('nav', 'position_error'), '<i2', 10),
+    ('system_process_rss', ('system', 'process_rss_mb'), '<i2', 10),
+    ('system_loop_lag', ('system', 'loop_lag_max_ms'), '<i2', 10),
+    ('system_throttled', ('system', 'throttled'), '<i4', 1),
+]
+
+FIELD_NAMES = [field[0] for field in FIELDS]
+
+
+def missing_value(dtype):
+    """Sentinel stored for fields that were None in the snapshot"""
+    return np.iinfo(np.dtype(dtype)).min
+
+
+def lookup(snapshot, path):
+    """Follow a key path into the nested telemetry dict"""
+    value = snapshot
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    if isinstance(value, bool):
+        return int(value)
+    return value if isinstance(value, (int, float)) else None
+
+
+def encode_chunk(rows):
+    """Pack buffered rows into one columnar, delta-encoded chunk"""
+    parts = [CHUNK_HEADER.pack(CHUNK_MAGIC, len(rows), len(FIELDS))]
+    columns = list(zip(*rows))
+
+    for (name, _, dtype, scale), column in zip(FIELDS, columns):
+        sentinel = missing_value(dtype)
+        info = np.iinfo(np.dtype(dtype))
+        values = np.array(
+            [sentinel if v is None else v for v in column], dtype=np.float64
+        )
+        present = values != sentinel
+        values[present] = np.clip(np.round(values[present] * scale), info.min + 1, info.max)
+        values = values.astype(dtype)
+
+        # Slowly changing signals become runs of small numbers that gzip
+        # compresses well; the int dtype wraps, so cumsum undoes it exactly
+        deltas = np.empty_like(values)
+        deltas[0] = values[0]
+        np.subtract(values[1:], values[:-1], out=deltas[1:])
+        parts.append(deltas.tobytes())
+
+    return b''.join(parts)
+
+
+def decode_chunk(data, offset=0):
+    """Decode one chunk into {field: float64 array}, returns (columns, next offset)"""
+    magic, rows, field_count = CHUNK_HEADER.unpack_from(data, offset)
+    if magic != CHUNK_MAGIC or field_count > len(FIELDS):
+        raise ValueError('Unsupported telemetry chunk')
+    offset += CHUNK_HEADER.size
+
+    columns = {name: np.full(rows, np.nan) for name in FIELD_NAMES[field_count:]}
+    for name, _, dtype, scale in FIELDS[:field_count]:
+        dt = np.dtype(dtype)
+        deltas = np.frombuffer(data, dtype=dt, count=rows, offset=offset)
+        offset += rows * dt.itemsize
+        values = np.cumsum(deltas, dtype=dt)
+        column = values.astype(np.float64)
+        column[values == missing_value(dtype)] = np.nan
+        columns[name] = column if scale == 1 else column / scale
+
+    return columns, offset
+
+
+def read_file(path):
+    """Read every complete chunk of a telemetry file"""
+    chunks = []
+    data = read_complete_members(path)
+
+    offset = 0
+    while offset < len(data):
+        columns, offset = decode_chunk(data, offset)
+        chunks.append(columns)
+    return chunks
+
+
+def read_complete_members(path):
+    """Decompress gzip members one by one, stopping at a truncated last one"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    data = []
+    while raw:
+        decompressor = zlib.decompressobj(31)
+        try:
+            data.append(decompressor.decompress(raw))
+        except zlib.error:
+            break
+        if not decompressor.eof:
+            break
+        raw = decompressor.unused_data
+    return b''.join(data)
+
+
+class TelemetryRecorder:
+    def __init__(self, config, log_interval=0.1):
+        self.directory = config.get('dir', 'telemetry')
+        self.flush_interval = config.get('flush_interval', 30)
+        self.max_file_size = config.get('max_file_size', 8 * 1024 * 1024)
+        self.max_files = config.get('max_files', 200)
+        self.compress_level = config.get('compress_level', 6)
+        self.log_interval = log_interval
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.rows = []
+        self.last_record = 0
+        self.current_file = None
+        self.records_written = 0
+        self.bytes_written = 0
+
+    def record(self, snapshot):
+        """Buffer one telemetry snapshot; cheap enough for the broadcast loop"""
+        now = time.time()
+        if now - self.last_record < self.log_interval * 0.95:
+            return
+        self.last_record = now
+
+        row = [int(now * 1000)]
+        row.extend(lookup(snapshot, path) for _, path, _, _ in FIELDS[1:])
+        with self.lock:
+            self.rows.append(row)
+
+    def flush(self):
+        """Write buffered rows as one compressed chunk (blocking, run off the loop)"""
+        with self.lock:
+            rows, self.rows = self.rows, []
+        if not rows:
+            return 0
+
+        payload = gzip.compress(encode_chunk(rows), compresslevel=self.compress_level)
+
+        path = self.get_file()
+        with open(path, 'ab') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.records_written += len(rows)
+        self.bytes_written += len(payload)
+        return len(rows)
+
+    def get_file(self):
+        """Current output file, rotating once it exceeds max_file_size"""
+        if self.current_file and os.path.exists(self.current_file):
+            if os.path.getsize(self.current_file) < self.max_file_size:
+                return self.current_file
+
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        self.current_file = os.path.join(self.directory, f'telemetry_{timestamp}.tlm.gz')
+        self.remove_old_files()
+        return self.current_file
+
+    def remove_old_files(self):
+        """Keep at most max_files recordings on the SD card"""
+        files = self.list_files()
+        for path in files[:max(0, len(files) - self.max_files + 1)]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"Telemetry cleanup error: {e}")
+
+    def list_files(self):
+        """Recording files, oldest first"""
+        return sorted(glob.glob(os.path.join(self.directory, 'telemetry_*.tlm.gz')))
+
+    def buffered_columns(self):
+        """Rows not yet flushed, in the same column layout as decode_chunk"""
+        with self.lock:
+            rows = list(self.rows)
+        if not rows:
+            return None
+
+        columns = {}
+        for (name, _, _, _), column in zip(FIELDS, zip(*rows)):
+            columns[name] = np.array(
+                [np.nan if v is None else v for v in column], dtype=np.float64
+            )
+        return columns
+
+    def file_start_time(self, path):
+        """Epoch seconds when a recording file was started, from its name"""
+        stamp = os.path.basename(path)[len('telemetry_'):-len('.tlm.gz')]
+        try:
+            return datetime.strptime(stamp, '%Y%m%d_%H%M%S').timestamp()
+        except ValueError:
+            return None
+
+    def files_in_range(self, start, end):
+        """Recording files that may hold samples between start and end"""
+        files = self.list_files()
+        starts = [self.file_start_time(path) for path in files]
+        selected = []
+        for i, path in enumerate(files):
+            file_start = starts[i]
+            file_end = starts[i + 1] if i + 1 < len(files) else None
+            # A file is named when its first chunk is flushed, so it can hold
+            # up to flush_interval seconds of data from before that
+            if file_start is not None and file_start - self.flush_interval > end:
+                continue
+            if file_end is not None and file_end < start:
+                continue
+            selected.append(path)
+        return selected
+
+    def get_status(self):
+        """Recorder counters"""
+        with self.lock:
+            buffered = len(self.rows)
+        return {
+            'records_written': self.records_written,
+            'bytes_written': self.bytes_written,
+            'buffered': buffered,
+            'file': self.current_file
+        }
+
+    async def run(self):
+        """Periodically flush buffered snapshots on a worker thread"""
+        while True:
+            try:
+                await asyncio.sleep(self.flush_interval)
+                await asyncio.to_thread(self.flush)
+            except asyncio.CancelledError:
+                self.flush()
+                raise
+            except Exception as e:
+                print(f"Telemetry recorder error: {e}")
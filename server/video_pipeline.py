@@ -0,0 +1,232 @@
+# Threaded camera capture -> JPEG encode pipeline
+import asyncio
+import threading
+import time
+from collections import deque
+
+import cv2
+
+from histogram import Histogram
+
+
+class EncodedFrame:
+    __slots__ = ('sequence', 'capture_time', 'jpegs', 'capture_ms', 'encode_ms', 'ready_time')
+
+    def __init__(self, sequence, capture_time, jpegs, capture_ms, encode_ms):
+        self.sequence = sequence
+        self.capture_time = capture_time
+        self.jpegs = jpegs  # tier index -> JPEG bytes
+        self.capture_ms = capture_ms
+        self.encode_ms = encode_ms
+        self.ready_time = time.monotonic()
+
+
+class StageTimer:
+    """Exponential moving average of a stage's latency"""
+
+    def __init__(self, alpha=0.1):
+        self.alpha = alpha
+        self.value = None
+
+    def add(self, sample):
+        """Fold in one measurement"""
+        if self.value is None:
+            self.value = sample
+        else:
+            self.value += self.alpha * (sample - self.value)
+
+    def get(self):
+        """Current average, rounded for reporting"""
+        return None if self.value is None else round(self.value, 2)
+
+
+class VideoPipeline:
+    """Captures and encodes frames on two threads.
+
+    Picamera2's capture_array and cv2.imencode both release the GIL, so
+    capture of frame N+1 overlaps encoding of frame N. Stages hand off
+    through small ring buffers where the newest frame wins, and capture is
+    paced against a deadline so processing time doesn't lower the frame
+    rate the way a fixed sleep does.
+
+    Each frame is encoded once per quality tier that some client is
+    using (see adaptive_video), and each tier only at its own frame rate.
+    With no active tiers nothing is captured or encoded.
+    """
+
+    def __init__(self, camera, tiers, ring_size=2):
+        self.camera = camera
+        self.tiers = tiers
+        self.active_tiers = set()
+        self.last_encoded = [0.0] * len(tiers)
+
+        self.raw_frames = deque(maxlen=ring_size)
+        self.encoded_frames = deque(maxlen=ring_size)
+        self.raw_ready = threading.Condition()
+
+        self.running = False
+        self.threads = []
+        self.loop = None
+        self.frame_ready = None
+        self.sequence = 0
+
+        self.capture_timer = StageTimer()
+        self.encode_timer = StageTimer()
+        self.queue_timer = StageTimer()
+        self.capture_latency = Histogram()
+        self.encode_latency = Histogram()
+        self.frame_interval = StageTimer()
+        self.last_capture = None
+        self.dropped = 0
+        self.capture_errors = 0
+
+    def start(self, loop=None):
+        """Start the capture and encode threads"""
+        self.loop = loop or asyncio.get_running_loop()
+        self.frame_ready = asyncio.Event()
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self.capture_loop, name='video-capture', daemon=True),
+            threading.Thread(target=self.encode_loop, name='video-encode', daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        """Stop the pipeline threads"""
+        self.running = False
+        with self.raw_ready:
+            self.raw_ready.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.threads = []
+
+    def set_active_tiers(self, tiers):
+        """Tiers some client is currently receiving"""
+        self.active_tiers = set(tiers)
+
+    @property
+    def interval(self):
+        """Capture interval for the fastest active tier"""
+        active = self.active_tiers or {0}
+        return 1.0 / max(self.tiers[i]['fps'] for i in active)
+
+    def capture_loop(self):
+        """Capture frames at the rate of the fastest active tier"""
+        deadline = time.monotonic()
+        while self.running:
+            active = self.active_tiers
+            if not active:
+                time.sleep(0.1)
+                deadline = time.monotonic()
+                continue
+
+            start = time.monotonic()
+            frames = self.camera.capture_streams({self.tiers[i]['stream'] for i in active})
+            capture_time = time.time()
+            end = time.monotonic()
+
+            if frames is None:
+                self.capture_errors += 1
+            else:
+                self.capture_timer.add((end - start) * 1000)
+                self.capture_latency.observe((end - start) * 1000)
+                if self.last_capture is not None:
+                    self.frame_interval.add(end - self.last_capture)
+                self.last_capture = end
+
+                with self.raw_ready:
+                    if len(self.raw_frames) == self.raw_frames.maxlen:
+                        self.dropped += 1
+                    self.raw_frames.append((frames, capture_time, end, (end - start) * 1000))
+                    self.raw_ready.notify()
+
+            # Pace against the deadline; if we fell behind, don't try to catch up
+            deadline += self.interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()
+
+    def encode_loop(self):
+        """Encode the newest captured frame for each tier that is due"""
+        while self.running:
+            with self.raw_ready:
+                while self.running and not self.raw_frames:
+                    self.raw_ready.wait(timeout=0.5)
+                if not self.running:
+                    break
+                frames, capture_time, captured_at, capture_ms = self.raw_frames.pop()
+                self.dropped += len(self.raw_frames)
+                self.raw_frames.clear()
+
+            start = time.monotonic()
+            self.queue_timer.add((start - captured_at) * 1000)
+
+            jpegs = {}
+            for index in sorted(self.active_tiers):
+                tier = self.tiers[index]
+                if start - self.last_encoded[index] < 0.9 / tier['fps']:
+                    continue
+                jpeg = self.encode(frames, tier)
+                if jpeg is not None:
+                    jpegs[index] = jpeg
+                    self.last_encoded[index] = start
+            if not jpegs:
+                continue
+
+            encode_ms = (time.monotonic() - start) * 1000
+            self.encode_timer.add(encode_ms)
+            self.encode_latency.observe(encode_ms)
+
+            self.sequence += 1
+            self.encoded_frames.append(
+                EncodedFrame(self.sequence, capture_time, jpegs, capture_ms, encode_ms)
+            )
+            try:
+                self.loop.call_soon_threadsafe(self.frame_ready.set)
+            except RuntimeError:
+                # Event loop already closed during shutdown
+                break
+
+    def encode(self, frames, tier):
+        """JPEG-encode one tier from the captured streams"""
+        image = frames.get(tier['stream'])
+        if image is None:
+            image = frames.get('main')
+        if image is None:
+            return None
+
+        width, height = tier['size']
+        if image.shape[1] != width or image.shape[0] != height:
+            image = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+        ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, tier['quality']])
+        return buffer.tobytes() if ok else None
+
+    async def get_frame(self):
+        """Wait for the next encoded frame (the newest one if several are ready)"""
+        while True:
+            await self.frame_ready.wait()
+            self.frame_ready.clear()
+            frame = None
+            while self.encoded_frames:
+                frame = self.encoded_frames.popleft()
+            if frame is not None:
+                return frame
+
+    def get_stats(self):
+        """Achieved frame rate and per-stage latency in ms"""
+        interval = self.frame_interval.value
+        return {
+            'fps': round(1.0 / interval, 1) if interval else 0,
+            'target_fps': round(1.0 / self.interval, 1),
+            'active_tiers': sorted(self.active_tiers),
+            'capture_ms': self.capture_timer.get(),
+            'queue_ms': self.queue_timer.get(),
+            'encode_ms': self.encode_timer.get(),
+            'frames': self.sequence,
+            'dropped': self.dropped,
+            'capture_errors': self.capture_errors
+        }
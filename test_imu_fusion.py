@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Test script for IMU orientation fusion
+"""
+
+import sys
+import os
+import math
+import time
+
+import numpy as np
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'server'))
+
+from imu_fusion import ComplementaryFilter, GRAVITY
+from imu_calibration import correction_matrix, default_calibration, fit_accel, fit_gyro
+
+def simulate(duration=60, rate=200, seed=1):
+    """Boat rolling +-20 deg at 0.5 rad/s, pitched 5 deg, turning at 10 deg/s"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(0, duration, 1 / rate)
+    roll = np.radians(20 * np.sin(0.5 * t))
+    roll_rate = np.radians(10 * np.cos(0.5 * t))
+    pitch = np.full_like(t, np.radians(5))
+    yaw_rate = np.radians(10)
+    
+    # Body rates and gravity in the body frame (ZYX Euler angles)
+    gyro = np.degrees(np.stack([
+        roll_rate - yaw_rate * np.sin(pitch),
+        yaw_rate * np.sin(roll) * np.cos(pitch),
+        yaw_rate * np.cos(roll) * np.cos(pitch)
+    ], axis=1))
+    accel = GRAVITY * np.stack([
+        -np.sin(pitch),
+        np.sin(roll) * np.cos(pitch),
+        np.cos(roll) * np.cos(pitch)
+    ], axis=1)
+    
+    gyro += rng.normal(0, 0.3, gyro.shape)
+    accel += rng.normal(0, 0.3, accel.shape)
+    return t, accel, gyro, np.degrees(roll), yaw_rate
+
+def test_imu_fusion():
+    """Test the batched complementary filter against a simulated boat"""
+    print("Testing IMU Fusion...")
+    print("=" * 50)
+    
+    t, accel, gyro, roll, yaw_rate = simulate()
+    fusion = ComplementaryFilter()
+    batch = 10
+    
+    print("1. Filtering 60 s of 200 Hz samples in batches of 10...")
+    errors = []
+    start = time.perf_counter()
+    for i in range(0, len(t), batch):
+        orientation = fusion.update(t[i:i + batch], accel[i:i + batch], gyro[i:i + batch])
+        if t[i] > 5:
+            errors.append((orientation['roll'] - roll[i + batch - 1], orientation['pitch'] - 5))
+    elapsed = time.perf_counter() - start
+    
+    rms = np.sqrt(np.mean(np.square(errors), axis=0))
+    raw = np.degrees(np.arctan2(accel[:, 1], accel[:, 2])) - roll
+    print(f"   Roll/pitch RMS error: {rms[0]:.2f}/{rms[1]:.2f} deg "
+          f"(accelerometer alone: {np.sqrt(np.mean(raw ** 2)):.2f} deg)")
+    print(f"   {elapsed / (len(t) / batch) * 1e6:.0f} us per batch")
+    assert rms[0] < 0.5 and rms[1] < 0.5
+    
+    print("2. Yaw follows the integrated turn rate...")
+    expected = math.degrees(math.remainder(yaw_rate * t[-1], 2 * math.pi))
+    print(f"   Yaw {orientation['yaw']} deg, expected {expected:.2f} deg")
+    assert abs(math.remainder(math.radians(orientation['yaw'] - expected), 2 * math.pi)) < math.radians(2)
+    
+    print("3. Quaternion is normalized...")
+    q = orientation['quaternion']
+    assert abs(math.sqrt(q['w'] ** 2 + q['x'] ** 2 + q['y'] ** 2 + q['z'] ** 2) - 1) < 1e-3
+    
+    print("4. Accelerations away from 1 g don't tilt the estimate...")
+    fusion = ComplementaryFilter()
+    level = np.tile([0.0, 0.0, GRAVITY], (batch, 1))
+    fusion.update(np.arange(batch) / 200, level, np.zeros((batch, 3)))
+    surge = np.tile([6.0, 0.0, GRAVITY], (batch, 1))  # hard acceleration forward (1.17 g)
+    for i in range(1, 20):
+        orientation = fusion.update((np.arange(batch) + i * batch) / 200, surge, np.zeros((batch, 3)))
+    print(f"   Pitch after 1 s of surge: {orientation['pitch']} deg")
+    assert abs(orientation['pitch']) < 0.01
+    
+    print("5. Calibration recovers accelerometer offsets and scales...")
+    scale_error = np.array([1.03, 0.97, 1.01])
+    offset_error = np.array([0.3, -0.2, 0.5])
+    faces = np.array([(0, 0, 1), (0, 0, -1), (1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0)], dtype=float)
+    offset, scale = fit_accel(faces * GRAVITY * scale_error + offset_error)
+    print(f"   Offset {np.round(offset, 3)}, scale {np.round(scale, 4)}")
+    assert np.allclose(offset, offset_error, atol=1e-6)
+    assert np.allclose(scale, 1 / scale_error, atol=1e-6)
+    
+    print("6. Temperature-compensated gyro bias folds into the correction matrix...")
+    bias, coeff, reference = fit_gyro([
+        {'bias': [1.0, -0.5, 0.2], 'temp': 20.0},
+        {'bias': [1.4, -0.5, 0.0], 'temp': 40.0}
+    ])
+    assert np.allclose(coeff, [0.02, 0.0, -0.01]) and reference == 30.0
+    calibration = dict(default_calibration(), gyro_bias=bias, gyro_temp_coeff=coeff, reference_temp=reference)
+    matrix, constant = correction_matrix(calibration, GRAVITY / 16384, 1 / 131)
+    raw = np.array([[0, 0, 16384, (40 - 36.53) * 340, 1.4 * 131, -0.5 * 131, 0.0]])
+    corrected = raw @ matrix.T + constant
+    print(f"   Corrected gyro at 40 C: {np.round(corrected[0, 4:], 4)}")
+    assert np.allclose(corrected[0, 4:], 0, atol=1e-9)
+    assert np.isclose(corrected[0, 3], 40) and np.isclose(corrected[0, 2], GRAVITY)
+    
+    print("\n" + "=" * 50)
+    print("IMU fusion test completed successfully!")
+
+if __name__ == "__main__":
+    test_imu_fusion()
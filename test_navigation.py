@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Test script for the GPS/IMU navigation filter
+"""
+
+import sys
+import os
+import math
+import tempfile
+
+import numpy as np
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'server'))
+
+from navigation_filter import NavigationFilter, KNOTS_TO_MS
+from sample_store import METERS_PER_DEGREE
+from telemetry_recorder import TelemetryRecorder
+from replay_navigation import replay
+
+LAT0, LON0 = 47.6, -122.3
+
+def simulate(duration=180, rate=20, seed=2):
+    """Boat at 3 m/s turning 3 deg/s mid-run: 1 Hz GPS with 3 m noise, gyro biased 0.5 deg/s"""
+    rng = np.random.default_rng(seed)
+    dt = 1 / rate
+    east = north = heading = 0.0
+    fix = None
+    for k in range(int(duration * rate)):
+        t = k * dt
+        turn = math.radians(3) if 30 < t < 120 else 0.0
+        heading += turn * dt
+        east += 3 * math.sin(heading) * dt
+        north += 3 * math.cos(heading) * dt
+
+        # z up: a clockwise turn is a negative gyro z rate
+        imu = {
+            'gyro': {'z': -math.degrees(turn) + 0.5 + rng.normal(0, 0.3)},
+            'accel': {'x': rng.normal(0, 0.3)},
+            'orientation': {'pitch': 0.0}
+        }
+        if k % rate == 0:
+            noisy_east = east + rng.normal(0, 3)
+            noisy_north = north + rng.normal(0, 3)
+            fix = {
+                'fix': True,
+                'lat': LAT0 + noisy_north / METERS_PER_DEGREE,
+                'lon': LON0 + noisy_east / (METERS_PER_DEGREE * math.cos(math.radians(LAT0))),
+                'speed_knots': (3 + rng.normal(0, 0.1)) / KNOTS_TO_MS,
+                'course': math.degrees(heading + rng.normal(0, 0.03)) % 360,
+                'hdop': 1.2
+            }
+        yield t, east, north, heading, fix, imu
+
+def position_error(estimate, east, north):
+    """Distance in metres between an estimate and the true position"""
+    est_east = (estimate['lon'] - LON0) * METERS_PER_DEGREE * math.cos(math.radians(LAT0))
+    est_north = (estimate['lat'] - LAT0) * METERS_PER_DEGREE
+    return math.hypot(est_east - east, est_north - north)
+
+def test_navigation():
+    """Test the fused estimate against a simulated boat and the replay harness"""
+    print("Testing Navigation Filter...")
+    print("=" * 50)
+
+    print("1. Fusing 3 minutes of 20 Hz IMU and 1 Hz GPS...")
+    nav = NavigationFilter()
+    fused, raw = [], []
+    last_fix = None
+    for t, east, north, heading, fix, imu in simulate():
+        estimate = nav.step(fix, imu, t)
+        if t > 20:
+            fused.append(position_error(estimate, east, north))
+            if fix is not last_fix:
+                raw.append(position_error(fix, east, north))
+        last_fix = fix
+    fused_rms = math.sqrt(np.mean(np.square(fused)))
+    raw_rms = math.sqrt(np.mean(np.square(raw)))
+    print(f"   Position RMS error: fused {fused_rms:.2f} m, raw GPS {raw_rms:.2f} m")
+    assert fused_rms < raw_rms * 0.6
+
+    print("2. Speed, heading and gyro bias converge...")
+    print(f"   {estimate['speed']} m/s, heading {estimate['heading']} (true {math.degrees(heading) % 360:.1f}), "
+          f"bias {estimate['gyro_bias']} deg/s")
+    assert abs(estimate['speed'] - 3) < 0.3
+    assert abs((estimate['heading'] - math.degrees(heading) + 180) % 360 - 180) < 3
+    assert abs(abs(estimate['gyro_bias']) - 0.5) < 0.15
+    assert nav.get_stats()['fixes_rejected'] == 0
+
+    print("3. A GPS jump is rejected, a persistent offset resets the filter...")
+    jumped = dict(last_fix, lat=last_fix['lat'] + 0.01, utc='jump')
+    nav.step(jumped, None, t + 0.05)
+    assert nav.get_stats()['fixes_rejected'] == 1
+    assert position_error(nav.get_estimate(), east, north) < 10
+    for i in range(nav.max_rejections):
+        nav.step(dict(jumped, utc=i), None, t + 0.1 * (i + 2))
+    assert nav.get_stats()['resets'] == 2
+
+    print("4. Recorded telemetry replays faster than real time...")
+    with tempfile.TemporaryDirectory() as directory:
+        recorder = TelemetryRecorder({'dir': directory}, log_interval=0)
+        for t, east, north, heading, fix, imu in simulate(duration=60):
+            recorder.last_record = 0
+            recorder.record({'gps': fix, 'imu': imu})
+            recorder.rows[-1][0] = int((1.7e9 + t) * 1000)
+        recorder.flush()
+        result = replay(recorder.list_files())
+    print(f"   {result}")
+    assert result['rows'] == 1200 and result['duration'] > 59
+    assert result['speedup'] > 10
+    assert result['fix_residual_rms'] < 6
+
+    print("\n" + "=" * 50)
+    print("Navigation filter test completed successfully!")
+
+if __name__ == "__main__":
+    test_navigation()
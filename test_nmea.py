@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test script for the streaming NMEA parser
+"""
+
+import sys
+import os
+import time
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'server'))
+
+from nmea import NMEAParser, checksum_ok
+
+SENTENCES = [
+    b'$GPGGA,123519,4807.038,N,01131.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n',
+    b'$GPRMC,123519,A,4807.038,N,01131.000,E,022.4,084.4,230394,003.1,W*6A\r\n',
+    b'$GPVTG,054.7,T,034.4,M,005.5,N,010.2,K*48\r\n',
+    b'$GPGSA,A,3,04,05,,09,12,,,24,,,,,2.5,1.3,2.1*39\r\n',
+    b'$GPGSV,2,1,08,01,40,083,46,02,17,308,41,12,07,344,39,14,22,228,45*75\r\n',
+]
+
+def test_nmea_parser():
+    """Test sentence parsing, checksums and partial reads"""
+    print("Testing NMEA Parser...")
+    print("=" * 50)
+
+    print("1. Checksums...")
+    assert checksum_ok(SENTENCES[0].strip())
+    assert not checksum_ok(SENTENCES[0].strip().replace(b'545.4', b'545.5'))
+
+    print("2. Feeding the stream in small, unaligned chunks...")
+    parser = NMEAParser()
+    stream = b'noise' + b''.join(SENTENCES)
+    parsed = 0
+    for i in range(0, len(stream), 7):
+        parsed += parser.feed(stream[i:i + 7])
+    print(f"   Parsed {parsed} sentences: {parser.get_stats()['by_type']}")
+    assert parsed == len(SENTENCES)
+
+    fix = parser.get_fix()
+    print(f"   Fix: {fix}")
+    assert fix['fix'] and fix['fix_type'] == '3D'
+    assert abs(fix['lat'] - 48.1173) < 1e-6 and abs(fix['lon'] - 11.516667) < 1e-6
+    assert fix['alt'] == 545.4 and fix['satellites'] == 8
+    assert fix['speed_knots'] == 5.5 and fix['speed_kmh'] == 10.2 and fix['course'] == 54.7
+    assert (fix['pdop'], fix['hdop'], fix['vdop']) == (2.5, 1.3, 2.1)
+    assert fix['utc'] == '1994-03-23T12:35:19+00:00'
+
+    print("3. Corrupted sentences are rejected...")
+    parser.feed(b'$GPGGA,123520,0000.000,N,00000.000,E,1,08,0.9,545.4,M,46.9,M,,*47\r\n')
+    assert parser.get_stats()['checksum_errors'] == 1
+    assert abs(parser.get_fix()['lat'] - 48.1173) < 1e-6
+
+    print("4. GSV cycles complete on the last sentence...")
+    assert parser.get_fix()['satellites_in_view'] == 0
+    parser.feed(b'$GPGSV,2,2,08,15,10,050,30,16,20,100,35,17,30,150,,18,40,200,40*7A\r\n')
+    fix = parser.get_fix()
+    assert fix['satellites_in_view'] == 8 and fix['snr_mean'] == 39.4
+
+    print("5. Fix expires without position updates...")
+    parser.fix_timeout = 0
+    time.sleep(0.01)
+    fix = parser.get_fix()
+    assert not fix['fix'] and 'lat' not in fix
+
+    print("6. Parse throughput...")
+    burst = b''.join(SENTENCES) * 2000
+    start = time.perf_counter()
+    NMEAParser().feed(burst)
+    elapsed = time.perf_counter() - start
+    rate = len(SENTENCES) * 2000 / elapsed
+    print(f"   {rate:.0f} sentences/s ({len(burst) / elapsed / 1024:.0f} KiB/s; 115200 baud is ~11 KiB/s)")
+
+    print("\n" + "=" * 50)
+    print("NMEA parser test completed successfully!")
+
+if __name__ == "__main__":
+    test_nmea_parser()
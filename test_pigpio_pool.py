@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared pigpio connection and batched pin updates
+"""
+
+import sys
+import os
+import threading
+import time
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'server'))
+
+import simulator
+
+CONFIG = {
+    'pins': {'motor_left': 18, 'motor_right': 19, 'pumps': [17, 27, 22], 'camera_pan': 12, 'camera_tilt': 13},
+    'esc_range': {'min': 1000, 'max': 2000},
+    'simulation': {'seed': 1}
+}
+
+def test_pigpio_pool():
+    """Every actuator shares one connection; pin pairs change in one command"""
+    print("Testing pigpio Pool...")
+    print("=" * 50)
+
+    boat = simulator.install(CONFIG)
+    try:
+        for name in ('pigpio_pool', 'motor_control', 'pump_control', 'servo_controller'):
+            sys.modules.pop(name, None)
+        from device_supervisor import DeviceSupervisor
+        from motor_control import MotorController
+        from pump_control import PumpController
+        from servo_controller import ServoController
+
+        devices = DeviceSupervisor(base_delay=0.1, max_delay=0.2, check_interval=0.1)
+        motors = MotorController(CONFIG['pins'], CONFIG['esc_range'], devices)
+        pumps = PumpController(CONFIG['pins']['pumps'], {'default': 5}, devices)
+        servos = ServoController(CONFIG['pins'], devices)
+        pool = motors.gpio
+        faults = boat.faults['pigpio']
+
+        print("1. One connection for motors, pumps and servos...")
+        print(f"   devices {list(devices.get_status())}")
+        assert pumps.gpio is pool and servos.gpio is pool
+        assert list(devices.get_status()) == ['pigpio']
+        assert boat.pulses[18] == 1000 and boat.levels[17] == 1 and boat.pulses[12] == 1500
+
+        print("2. Both ESCs change in one pigpio command...")
+        motors.forward()  # stores the script
+        calls = faults.calls
+        motors.left()
+        assert faults.calls - calls == 1
+        assert boat.pulses[18] == 1000 and boat.pulses[19] == 2000
+        calls = faults.calls
+        assert servos.set_angles(45, 135) and faults.calls - calls == 1
+        assert boat.pulses[12] == 1000 and boat.pulses[13] == 2000
+
+        print("3. Relays switch with one bank write...")
+        pumps.write(17, 0)
+        pumps.write(22, 0)
+        calls = faults.calls
+        pumps.cleanup()
+        assert faults.calls - calls == 1 and all(boat.levels[pin] == 1 for pin in CONFIG['pins']['pumps'])
+
+        print("4. Motors and servos share the 2-pin script from two threads...")
+        faults.latency = 0.005
+        before = dict(pool.stats)
+        calls = faults.calls
+        servo_thread = threading.Thread(target=lambda: [servos.set_angles(54 - i, 126 + i) for i in range(10)])
+        servo_thread.start()
+        for i in range(10):
+            motors.set_pulses(1500 + i, 1500 - i)
+        servo_thread.join()
+        print(f"   {pool.stats['scripted'] - before['scripted']} script runs, "
+              f"{pool.stats['sequential'] - before['sequential']} one by one, {pool.stats['busy']} busy")
+        assert pool.stats['scripted'] - before['scripted'] == 20 and faults.calls - calls == 20  # never refused
+        assert pool.stats['sequential'] == before['sequential'] and pool.stats['busy'] == 0
+
+        print("5. Latency is measured, skew only where pins took several commands...")
+        for _ in range(10):
+            motors.forward()
+            motors.right()
+        scripted = pool.get_stats()
+        pool.scripts[2] = None  # daemon refused the script: one pin at a time
+        for _ in range(10):
+            motors.forward()
+        sequential = pool.get_stats()
+        faults.latency = 0.0
+        print(f"   scripted p50 {scripted['latency_p50_ms']} ms, skew p99 {scripted['skew_p99_ms']}; "
+              f"one by one skew p99 {sequential['skew_p99_ms']} ms")
+        assert scripted['latency_p50_ms'] <= 10 and scripted['skew_p99_ms'] is None
+        assert sequential['sequential'] == 10 and sequential['skew_p99_ms'] >= 5
+        assert pool.skew.count == 10 and pool.latency.count == pool.stats['updates']
+
+        print("6. A reconnect restores every actuator and stores the script again...")
+        faults.failure_rate = 1.0
+        assert not motors.set_pulses(1500, 1500)
+        assert 'pigpio' in devices.degraded()
+        faults.failure_rate = 0.0
+        time.sleep(0.5)
+        pi = devices.get('pigpio')
+        assert pi is not None and not pool.scripts
+        assert boat.pulses[18] == 1000 and boat.pulses[12] == 1000 and all(boat.levels[pin] == 1 for pin in (17, 27, 22))
+        assert motors.set_pulses(2000, 2000) and pi.scripts and boat.pulses[19] == 2000
+
+        print("7. Cleanup deletes the stored scripts...")
+        devices.stop()
+        pool.cleanup()
+        assert not pi.scripts and not pi.connected
+    finally:
+        simulator.uninstall()
+        for name in ('pigpio_pool', 'motor_control', 'pump_control', 'servo_controller'):
+            sys.modules.pop(name, None)
+
+    print("\n" + "=" * 50)
+    print("pigpio pool test completed successfully!")
+
+if __name__ == "__main__":
+    test_pigpio_pool()
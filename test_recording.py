@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test script for session recording and accelerated replay
+"""
+
+import sys
+import os
+import asyncio
+import importlib
+import json
+import tempfile
+import time
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'server'))
+
+import simulator
+import session_recording
+from session_recording import read_recording, GPS, IMU, BATTERY, CLIENT, ERROR
+
+# Bind their hardware imports to whatever is installed for each phase
+READERS = ('gps_reader', 'imu_reader', 'battery_monitor', 'camera_stream')
+
+def fresh_readers():
+    """Import the reader modules again against the current stand-ins"""
+    for name in READERS:
+        sys.modules.pop(name, None)
+    return [importlib.import_module(name) for name in READERS]
+
+def record_session(config):
+    """Run the sensors on the simulator for a couple of seconds with the recorder on"""
+    from device_supervisor import DeviceSupervisor
+
+    boat = simulator.install(config)
+    recorder = session_recording.install_recorder(config)
+    try:
+        gps_reader, imu_reader, battery_monitor, camera_stream = fresh_readers()
+        devices = DeviceSupervisor(base_delay=0.1, max_delay=0.2, check_interval=0.1)
+        gps = gps_reader.GPSReader({'port': '/dev/serial0', 'baudrate': 9600}, devices)
+        imu = imu_reader.IMUReader({'calibration_file': os.path.join(config['recording']['dir'], 'imu.json')}, devices)
+        battery = battery_monitor.BatteryMonitor(devices)
+        camera = camera_stream.CameraStream((640, 480), (320, 240))
+
+        client = object()
+        recorder.client_event(client, 'connect')
+        recorder.client_event(client, 'message', json.dumps({'type': 'control', 'command': 'forward'}))
+        time.sleep(1.0)
+
+        # A short IMU outage is recorded as an error
+        boat.faults['imu'].failure_rate = 1.0
+        time.sleep(0.05)
+        boat.faults['imu'].failure_rate = 0.0
+
+        for _ in range(10):
+            camera.capture_streams({'main'})
+            battery.read()
+        recorder.client_event(client, 'disconnect')
+        time.sleep(0.5)
+
+        devices.stop()
+        imu.cleanup()
+        gps.cleanup()
+        camera.cleanup()
+        recorder.flush()
+        return recorder.path, gps.read()
+    finally:
+        session_recording.uninstall()
+        simulator.uninstall()
+
+def test_recording():
+    """Record simulated sensors and client messages, then replay them at 4x"""
+    print("Testing Session Recording...")
+    print("=" * 50)
+
+    directory = tempfile.mkdtemp()
+    config = {
+        'pins': {'motor_left': 18, 'motor_right': 19, 'pumps': [17], 'camera_pan': 12, 'camera_tilt': 13},
+        'esc_range': {'min': 1000, 'max': 2000},
+        'simulation': {'seed': 3, 'devices': {'gps': {'rate': 10.0}}},
+        'recording': {'dir': directory},
+        'replay': {'file': directory, 'speed': 4.0}
+    }
+
+    print("1. Recording every device and client message...")
+    path, recorded_fix = record_session(config)
+    streams, meta = read_recording(path)
+    counts = {session_recording.STREAM_NAMES[s]: len(records) for s, records in streams.items()}
+    print(f"   {counts}, {os.path.getsize(path)} bytes")
+    assert meta['version'] == 1 and meta['config']['recording']['dir'] == directory
+    assert counts['gps'] > 5 and counts['imu'] > 100 and counts['battery'] >= 10 and counts['camera'] >= 10
+    assert [json.loads(r[2])['event'] for r in streams[CLIENT]] == ['connect', 'message', 'disconnect']
+    imu_errors = [r for r in streams[IMU] if r[1] == ERROR]
+    assert imu_errors and all(len(r[2]) == 14 for r in streams[IMU] if r[1] != ERROR)
+    assert all(r[0] <= s[0] for r, s in zip(streams[GPS], streams[GPS][1:]))
+
+    print("2. Replaying at 4x through the same readers...")
+    replay = session_recording.install_replay(config)
+    try:
+        assert replay.path == path
+        gps_reader, imu_reader, battery_monitor, camera_stream = fresh_readers()
+        from device_supervisor import DeviceSupervisor
+        devices = DeviceSupervisor(base_delay=0.1, max_delay=0.2, check_interval=0.1)
+        gps = gps_reader.GPSReader({'port': '/dev/serial0', 'baudrate': 9600}, devices)
+        battery = battery_monitor.BatteryMonitor(devices)
+        camera = camera_stream.CameraStream((640, 480), (320, 240))
+        started = time.monotonic()
+
+        events = []
+        async def collect():
+            async for lap, event in replay.client_events():
+                events.append(event['event'])
+        asyncio.run(collect())
+        elapsed = time.monotonic() - started
+        fix = gps.read()
+        print(f"   {replay.clock.duration:.1f} s replayed in {elapsed:.1f} s, "
+              f"GPS {fix['lat']:.6f} {fix['lon']:.6f} vs recorded {recorded_fix['lat']:.6f} {recorded_fix['lon']:.6f}")
+        assert elapsed < replay.clock.duration / 2
+        assert events == ['connect', 'message', 'disconnect']
+        assert abs(fix['lat'] - recorded_fix['lat']) < 1e-5 and abs(fix['lon'] - recorded_fix['lon']) < 1e-5
+        assert replay.streams[GPS].get_stats()['delivered'] == counts['gps']
+        recorded_voltages = {session_recording.BATTERY_VALUE.unpack(r[2])[0] for r in streams[BATTERY]}
+        assert round(battery.devices.get('battery').bus_voltage, 6) in {round(v, 6) for v in recorded_voltages}
+
+        print("3. Recorded errors are raised again at the same point...")
+        mpu = sys.modules['mpu6050'].mpu6050(0x68)
+        replay.clock.start = time.monotonic() - imu_errors[0][0] / replay.clock.speed
+        try:
+            mpu.bus.read_i2c_block_data(0x68, 0x3B, 14)
+            raise AssertionError('IMU error was not replayed')
+        except OSError as e:
+            print(f"   {e}")
+        replay.clock.start = time.monotonic() - streams[IMU][-1][0] / replay.clock.speed
+        assert bytes(mpu.bus.read_i2c_block_data(0x68, 0x3B, 14)) == streams[IMU][-1][2]
+
+        print("4. A looping stream finishes each lap before starting the next...")
+        clock = session_recording.ReplayClock(1.0, 1.0, True)
+        stream = session_recording.ReplayStream([(0.1, GPS, b''), (0.5, GPS, b''), (0.9, GPS, b'')], clock)
+        clock.start = time.monotonic() - 0.2
+        assert len(stream.due()) == 1
+        clock.start = time.monotonic() - 1.2
+        assert len(stream.due()) == 3
+        clock.start = time.monotonic() - 3.6
+        records = stream.due()
+        print(f"   {len(records)} records after two skipped laps, {stream.get_stats()}")
+        assert len(records) == 4 and stream.get_stats()['skipped'] == 3
+
+        devices.stop()
+        gps.cleanup()
+        camera.cleanup()
+    finally:
+        session_recording.uninstall()
+        for name in READERS:
+            sys.modules.pop(name, None)
+
+    print("\n" + "=" * 50)
+    print("Session recording test completed successfully!")
+
+if __name__ == "__main__":
+    test_recording()
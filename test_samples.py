@@ -6,6 +6,7 @@ Test script for sample management functionality
 import sys
 import os
 import json
+import tempfile
 from datetime import datetime
 
 # Add server directory to path
@@ -18,8 +19,16 @@ def test_sample_management():
     print("Testing Sample Management System...")
     print("=" * 50)
     
-    # Initialize logger
-    logger = DataLogger('config/settings.json')
+    # Initialize logger with files in a scratch directory
+    config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config', 'settings.json')
+    with open(config_path) as f:
+        config = json.load(f)['data_logging']
+    
+    work_dir = tempfile.mkdtemp(prefix='aquabot_samples_')
+    for key in ('csv_file', 'json_file', 'db_file', 'samples_dir'):
+        config[key] = os.path.join(work_dir, config[key])
+    
+    logger = DataLogger(config)
     
     # Test adding sample locations
     test_locations = [
@@ -37,15 +46,30 @@ def test_sample_management():
     print("\n2. Retrieving all samples...")
     samples = logger.get_all_samples()
     print(f"   Found {len(samples)} samples")
+    assert len(samples) == len(test_locations)
     
     for sample in samples:
         print(f"   - {sample['sample_id'][:8]}... | Pump {sample['pump_id']} | {sample['latitude']:.4f}, {sample['longitude']:.4f}")
     
+    # Test indexed queries
+    print("\n   Querying samples around San Francisco...")
+    result = logger.query_samples(center=(37.7749, -122.4194), radius_m=1000)
+    print(f"   Found {len(result['samples'])} samples within 1 km")
+    assert [s['pump_id'] for s in result['samples']] == [1]
+    edge = logger.query_samples(bbox=(37.7749, -122.4194, 37.78, -122.41))
+    assert [s['pump_id'] for s in edge['samples']] == [1]  # on the box edge
+    
+    page = logger.query_samples(limit=2)
+    rest = logger.query_samples(limit=2, cursor=page['next_cursor'])
+    assert len(page['samples']) == 2 and len(rest['samples']) == 1
+    assert rest['next_cursor'] is None
+    
     # Test statistics
     print("\n3. Getting statistics...")
     stats = logger.get_statistics()
     print(f"   Total samples: {stats['total_samples']}")
     print(f"   Samples today: {stats['samples_today']}")
+    assert stats['total_samples'] == len(test_locations)
     
     # Test exports
     print("\n4. Testing exports...")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test script for the servo motion planner (runs on the simulated hardware)
+"""
+
+import sys
+import os
+import asyncio
+import time
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'server'))
+
+import simulator
+from servo_motion import Axis
+
+CONFIG = {
+    'pins': {'motor_left': 18, 'motor_right': 19, 'pumps': [17], 'camera_pan': 12, 'camera_tilt': 13},
+    'esc_range': {'min': 1000, 'max': 2000},
+    'simulation': {'seed': 1}
+}
+
+MOTION = {'rate': 50, 'max_velocity': 120.0, 'max_acceleration': 480.0, 'jog_velocity': 30.0, 'status_interval': 0.1}
+
+def profile(distance, dt=0.02):
+    """Positions of one axis moving `distance` degrees from rest"""
+    axis = Axis(0, -360, 360)
+    axis.set_target(distance)
+    positions = [0.0]
+    while axis.moving and len(positions) < 1000:
+        axis.step(dt, MOTION['max_velocity'], MOTION['max_acceleration'])
+        positions.append(axis.position)
+    return positions
+
+async def settle(servos, statuses):
+    """Wait until the axes stop and the loop has pushed the resting status"""
+    while servos.get_status()['moving'] or not statuses or statuses[-1]['moving']:
+        await asyncio.sleep(0.02)
+
+async def drive(servos, statuses):
+    """Flood pan steps the way a held button used to, then jog and halt the tilt"""
+    loop_task = asyncio.create_task(servos.run(statuses.append))
+    await asyncio.sleep(0.05)
+    commands = servos.stats['commands']
+
+    for _ in range(30):
+        servos.handle_command('pan', {'direction': 'left', 'step': 1})
+        await asyncio.sleep(0.01)
+    await settle(servos, statuses)
+    pan_commands = servos.stats['commands'] - commands
+
+    servos.handle_command('jog', {'axis': 'tilt', 'direction': 'down'})
+    await asyncio.sleep(0.5)
+    servos.handle_command('halt', {'axis': 'tilt'})
+    await settle(servos, statuses)
+
+    loop_task.cancel()
+    await asyncio.gather(loop_task, return_exceptions=True)
+    return pan_commands
+
+def test_servo_motion():
+    """Trapezoidal profiles, coalesced commands and bounded status pushes"""
+    print("Testing Servo Motion Planner...")
+    print("=" * 50)
+
+    print("1. A 90 degree move follows a trapezoidal profile...")
+    positions = profile(90)
+    velocities = [(b - a) / 0.02 for a, b in zip(positions, positions[1:])]
+    accelerations = [(b - a) / 0.02 for a, b in zip(velocities, velocities[1:])]
+    print(f"   {len(positions) - 1} steps, peak {max(velocities):.0f} deg/s, "
+          f"peak acceleration {max(abs(a) for a in accelerations[:-1]):.0f} deg/s^2")
+    assert positions[-1] == 90
+    assert max(velocities) <= MOTION['max_velocity'] + 1e-6
+    assert max(abs(a) for a in accelerations[:-1]) <= MOTION['max_acceleration'] + 1e-6
+    assert 0.9 <= (len(positions) - 1) * 0.02 <= 1.1  # 0.25 s up, 0.5 s cruise, 0.25 s down
+
+    boat = simulator.install(CONFIG)
+    writes = []
+    set_pulse = boat.set_pulse
+    def record_pulse(pin, pulse):
+        writes.append((time.monotonic(), pin, pulse))
+        set_pulse(pin, pulse)
+    boat.set_pulse = record_pulse
+    try:
+        for name in ('pigpio_pool', 'servo_controller'):
+            sys.modules.pop(name, None)
+        from servo_controller import ServoController
+        from device_supervisor import DeviceSupervisor
+
+        devices = DeviceSupervisor(base_delay=0.1, max_delay=0.2, check_interval=0.1)
+        servos = ServoController(CONFIG['pins'], devices, MOTION)
+
+        print("2. Without the control loop, angles are written at once...")
+        writes.clear()
+        assert servos.set_pan_angle(45) and servos.pan_angle == 45
+        assert writes[-1][1:] == (12, 1000)
+        servos.smooth_move(90, 90, steps=5, delay=0.001)
+        assert servos.get_status()['pan_angle'] == 90 and not servos.get_status()['moving']
+
+        print("3. 30 pan commands in 0.3 s bend one smooth move...")
+        writes.clear()
+        statuses = []
+        pan_commands = asyncio.run(drive(servos, statuses))
+        pan_writes = [w for w in writes if w[1] == 12]
+        steps = [abs(b[2] - a[2]) for a, b in zip(pan_writes, pan_writes[1:])]
+        print(f"   {pan_commands} commands, {len(pan_writes)} pan writes, "
+              f"largest step {max(steps)} us, final pan {servos.pan_angle}")
+        assert servos.pan_angle == 120
+        assert pan_commands == 30 and len(pan_writes) <= 40 and max(steps) <= 120 * 0.02 * 3 * 11.2
+        assert all(w[2] != v[2] for w, v in zip(pan_writes, pan_writes[1:]))  # no repeated writes
+
+        print("4. Jog and halt move the tilt at jog speed and stop it...")
+        tilt = servos.get_status()['tilt_angle']
+        print(f"   tilt {tilt}, {len(statuses)} status pushes, stats {servos.get_stats()}")
+        assert 90 + 30 * 0.4 <= tilt <= 90 + 30 * 0.6
+        assert not statuses[-1]['moving'] and statuses[-1]['tilt_angle'] == tilt
+        pushed_for = max(s[0] for s in writes) - min(s[0] for s in writes)
+        assert len(statuses) <= pushed_for / MOTION['status_interval'] + 6
+
+        devices.stop()
+    finally:
+        simulator.uninstall()
+        for name in ('pigpio_pool', 'servo_controller'):
+            sys.modules.pop(name, None)
+
+    print("\n" + "=" * 50)
+    print("Servo motion test completed successfully!")
+
+if __name__ == "__main__":
+    test_servo_motion()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Test script for the simulated hardware backends
+"""
+
+import sys
+import os
+import tempfile
+import time
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), 'server'))
+
+import simulator
+
+CONFIG = {
+    'pins': {'motor_left': 18, 'motor_right': 19, 'pumps': [17, 27], 'camera_pan': 12, 'camera_tilt': 13},
+    'esc_range': {'min': 1000, 'max': 2000},
+    'simulation': {
+        'seed': 1,
+        'idle_speed': 0.0,
+        'idle_turn_rate': 0.0,
+        'battery_capacity_ah': 0.01,
+        'devices': {
+            'gps': {'rate': 10.0},
+            'camera': {'fps': 30}
+        }
+    }
+}
+
+def test_simulator():
+    """Run the real server components against the simulated boat"""
+    print("Testing Hardware Simulator...")
+    print("=" * 50)
+
+    boat = simulator.install(CONFIG)
+    try:
+        from device_supervisor import DeviceSupervisor
+        from camera_stream import CameraStream
+        from gps_reader import GPSReader
+        from imu_reader import IMUReader
+        from battery_monitor import BatteryMonitor
+        from motor_control import MotorController
+        from pump_control import PumpController
+
+        devices = DeviceSupervisor(base_delay=0.1, max_delay=0.2, check_interval=0.1)
+        gps = GPSReader({'port': '/dev/serial0', 'baudrate': 9600}, devices)
+        imu = IMUReader({'calibration_file': os.path.join(tempfile.mkdtemp(), 'imu.json')}, devices)
+        battery = BatteryMonitor(devices)
+        motors = MotorController(CONFIG['pins'], CONFIG['esc_range'], devices)
+        pumps = PumpController(CONFIG['pins']['pumps'], {'default': 5}, devices)
+        camera = CameraStream((640, 480), (320, 240))
+
+        print("1. Every device connects...")
+        status = devices.get_status()
+        print(f"   {({name: device['state'] for name, device in status.items()})}")
+        assert all(device['state'] == 'ok' for device in status.values())
+
+        print("2. Motors drive the boat; GPS, IMU and battery follow it...")
+        start_voltage = battery.read()['voltage']
+        motors.forward()
+        time.sleep(2.0)
+        fix = gps.read()
+        state = imu.read()
+        print(f"   GPS {fix['lat']:.6f} {fix['lon']:.6f} at {fix['speed_knots']} kn, IMU at {state['sample_rate']} Hz")
+        assert fix['fix'] and fix['fix_type'] == '3D' and fix['speed_knots'] > 1
+        assert gps.get_stats()['checksum_errors'] == 0
+        assert state['orientation'] is not None and abs(state['accel']['z'] - 9.8) < 1
+        assert battery.read()['voltage'] < start_voltage
+        assert pumps.write(17, 0) and boat.levels[17] == 0
+
+        print("3. Camera frames for both streams...")
+        frames = camera.capture_streams({'main', 'lores'})
+        print(f"   main {frames['main'].shape}, lores {frames['lores'].shape}")
+        assert frames['main'].shape == (480, 640, 3) and frames['lores'].shape == (240, 320, 3)
+
+        print("4. Injected failures degrade a device until it recovers...")
+        faults = boat.faults['pigpio']
+        faults.failure_rate = 1.0
+        assert not motors.set_pulses(1500, 1500)
+        assert 'pigpio' in devices.degraded()
+        faults.failure_rate = 0.0
+        time.sleep(0.5)
+        assert devices.get('pigpio') is not None and motors.set_pulses(1500, 1500)
+
+        motors.stop()
+        devices.stop()
+        imu.cleanup()
+        gps.cleanup()
+        camera.cleanup()
+    finally:
+        simulator.uninstall()
+
+    print("\n" + "=" * 50)
+    print("Simulator test completed successfully!")
+
+if __name__ == "__main__":
+    test_simulator()
@@ -10,6 +10,8 @@ let map = null;
 let boatMarker = null;
 let pathLayer = null;
 let sampleMarkers = [];
+let samplesOnMap = false;
+let activeDownloads = {};
 let pathPoints = [];
 
 // 3D visualization variables
@@ -276,14 +278,29 @@ function onWindowResize() {
 function connectWebSocket() {
     try {
         ws = new WebSocket(`ws://${host}:${port}`);
+        ws.binaryType = 'arraybuffer';
         
         ws.onopen = function() {
             console.log("Connected to boat server");
             updateConnectionStatus(true);
             clearInterval(reconnectInterval);
+            
+            // Ask for raw JPEG binary frames instead of base64 JSON
+            ws.send(JSON.stringify({ type: 'video_mode', mode: 'binary' }));
+            
+            // Ask for compact keyframe/delta telemetry instead of JSON
+            ws.send(JSON.stringify({ type: 'telemetry_mode', mode: 'binary', version: TELEMETRY_SCHEMA_VERSION }));
+            
+            // Restore the recent track from recorded telemetry
+            requestHistory('track', ['gps_lat', 'gps_lon'], 3600, 500, 'stride');
         };
         
         ws.onmessage = function(event) {
+            if (event.data instanceof ArrayBuffer) {
+                handleBinaryMessage(event.data);
+                return;
+            }
+            
             try {
                 const data = JSON.parse(event.data);
                 
@@ -300,8 +317,23 @@ function connectWebSocket() {
                         document.getElementById('video-feed').src = data.data;
                         break;
                         
+                    case 'history':
+                        handleHistory(data.data);
+                        break;
+                        
+                    case 'telemetry_mode':
+                        setTelemetrySchema(data.data.schema);
+                        break;
+                        
+                    case 'imu_calibration':
+                        console.log('IMU calibration:', data.data);
+                        break;
+                        
+                    case 'video_quality':
+                        console.log(`Video quality: ${data.data.name} (${data.data.size.join('x')}, ${data.data.fps} fps)`);
+                        break;
+                        
                     case 'servo_status':
-                        console.log('Received servo status:', data.data);
                         updateServoStatus(data.data);
                         break;
                         
@@ -337,6 +369,188 @@ function connectWebSocket() {
     }
 }
 
+// Binary frames start with a one byte frame type
+const FRAME_VIDEO = 0x01;
+const FRAME_FILE_CHUNK = 0x02;
+const FRAME_TELEMETRY = 0x03;
+const VIDEO_HEADER_SIZE = 13;
+const TELEMETRY_HEADER_SIZE = 27;
+const TELEMETRY_SCHEMA_VERSION = 4;
+
+let videoObjectUrl = null;
+let lastVideoSequence = 0;
+let lastVideoCaptureTime = 0;
+
+function handleBinaryMessage(buffer) {
+    const view = new DataView(buffer);
+    const frameType = view.getUint8(0);
+    
+    switch (frameType) {
+        case FRAME_VIDEO: {
+            // type (1), sequence (4), capture time in ms (8), JPEG bytes
+            lastVideoSequence = view.getUint32(1);
+            lastVideoCaptureTime = Number(view.getBigUint64(5));
+            showVideoFrame(new Blob([new Uint8Array(buffer, VIDEO_HEADER_SIZE)], { type: 'image/jpeg' }));
+            break;
+        }
+        case FRAME_FILE_CHUNK: {
+            // type (1), transfer id (2), chunk index (4), payload
+            const transferId = view.getUint16(1);
+            const download = activeDownloads[transferId];
+            if (download) {
+                download.chunks.push(new Uint8Array(buffer, 7));
+                download.received += buffer.byteLength - 7;
+            }
+            break;
+        }
+        case FRAME_TELEMETRY:
+            handleTelemetryFrame(view);
+            break;
+        default:
+            console.log('Unknown binary frame type:', frameType);
+    }
+}
+
+// Binary telemetry: keyframes carry every field, deltas only the fields
+// that changed since the keyframe they reference
+let telemetrySchema = null;
+let telemetryKeyframe = null;
+let telemetryKeyframeSequence = null;
+
+function setTelemetrySchema(schema) {
+    telemetrySchema = schema;
+    telemetryKeyframe = null;
+    telemetryKeyframeSequence = null;
+}
+
+function handleTelemetryFrame(view) {
+    // type (1), version (1), flags (1), sequence (4), keyframe sequence (4),
+    // time in ms (8), field mask (8), then the masked fields in schema order
+    if (!telemetrySchema || view.getUint8(1) !== telemetrySchema.version) return;
+    
+    const isKeyframe = (view.getUint8(2) & 0x01) !== 0;
+    const keyframeSequence = view.getUint32(7);
+    const mask = view.getBigUint64(19);
+    
+    if (!isKeyframe && keyframeSequence !== telemetryKeyframeSequence) {
+        return; // Delta against a keyframe we never received
+    }
+    
+    const values = isKeyframe ? [] : telemetryKeyframe.slice();
+    let offset = TELEMETRY_HEADER_SIZE;
+    telemetrySchema.fields.forEach((field, i) => {
+        if ((mask >> BigInt(i)) & 1n) {
+            if (field.type === 'i') {
+                values[i] = view.getInt32(offset);
+                offset += 4;
+            } else {
+                values[i] = view.getInt16(offset);
+                offset += 2;
+            }
+        }
+    });
+    
+    if (isKeyframe) {
+        telemetryKeyframe = values;
+        telemetryKeyframeSequence = keyframeSequence;
+    }
+    
+    updateTelemetry(decodeTelemetry(values));
+}
+
+// Rebuild the nested telemetry object the JSON protocol sends
+function decodeTelemetry(values) {
+    const data = { gps: null, imu: null, battery: null, system: null, servos: null, nav: null };
+    
+    telemetrySchema.fields.forEach((field, i) => {
+        const path = field.name.split('.');
+        const missing = values[i] === telemetrySchema.missing[field.type];
+        
+        if (data[path[0]] === null) {
+            data[path[0]] = {};
+        }
+        let target = data[path[0]];
+        for (const key of path.slice(1, -1)) {
+            target = target[key] = target[key] || {};
+        }
+        target[path[path.length - 1]] = missing ? null : values[i] / field.scale;
+    });
+    
+    // A section with no values at all was unavailable on the boat
+    const isEmpty = value => value === null ||
+        (typeof value === 'object' && Object.values(value).every(isEmpty));
+    for (const section of Object.keys(data)) {
+        if (isEmpty(data[section])) {
+            data[section] = null;
+        }
+    }
+    
+    if (data.battery) {
+        const percentage = data.battery.percentage;
+        data.battery.status = percentage >= 60 ? 'Good' : percentage >= 30 ? 'Fair' : percentage >= 10 ? 'Low' : 'Critical';
+    }
+    if (data.system) {
+        const uptime = data.system.uptime_seconds || 0;
+        data.system.uptime = `${Math.floor(uptime / 3600)}h ${Math.floor(uptime % 3600 / 60)}m ${uptime % 60}s`;
+    }
+    if (data.gps) {
+        data.gps.fix = Boolean(data.gps.fix);
+    }
+    
+    return data;
+}
+
+// Request recorded telemetry, downsampled on the server
+function requestHistory(requestId, fields, seconds, points = 500, method = 'lttb') {
+    if (ws && ws.readyState === WebSocket.OPEN) {
+        ws.send(JSON.stringify({
+            type: 'history',
+            request_id: requestId,
+            fields: fields,
+            duration: seconds,
+            points: points,
+            method: method
+        }));
+    }
+}
+
+function handleHistory(data) {
+    if (data.error) {
+        console.error('History request failed:', data.error);
+        return;
+    }
+    
+    if (data.request_id === 'track') {
+        const lat = data.series.gps_lat;
+        const lon = data.series.gps_lon;
+        if (!lat || !lon) return;
+        
+        // Stride sampling keeps both series aligned on the same timestamps
+        const lonByTime = new Map(lon.t.map((t, i) => [t, lon.v[i]]));
+        const track = [];
+        lat.t.forEach((t, i) => {
+            if (lonByTime.has(t)) {
+                track.push([lat.v[i], lonByTime.get(t)]);
+            }
+        });
+        
+        pathPoints = track.concat(pathPoints);
+        pathLayer.setLatLngs(pathPoints);
+    }
+}
+
+function showVideoFrame(blob) {
+    const url = URL.createObjectURL(blob);
+    const img = document.getElementById('video-feed');
+    
+    // Release the previous frame once the new one replaces it
+    if (videoObjectUrl) {
+        URL.revokeObjectURL(videoObjectUrl);
+    }
+    videoObjectUrl = url;
+    img.src = url;
+}
+
 // Update connection status UI
 function updateConnectionStatus(connected) {
     const statusElement = document.getElementById('connection-status');
@@ -412,7 +626,16 @@ function updateTelemetry(data) {
         
         document.getElementById('gps-status').querySelector('span:last-child').textContent = 
             data.gps.fix ? 'GPS Fix' : 'No Fix';
-        
+    }
+    
+    // The fused GPS/IMU estimate updates the map between fixes
+    if (data.nav) {
+        document.getElementById('gps-data').innerHTML += `
+            <br>Speed: ${data.nav.speed} m/s<br>
+            Heading: ${data.nav.heading}° (±${data.nav.position_error}m)
+        `;
+        updateMap(data.nav);
+    } else if (data.gps) {
         updateMap(data.gps);
     }
     
@@ -457,8 +680,18 @@ function updateTelemetry(data) {
             CPU Usage: ${data.system.cpu_usage}%<br>
             Memory: ${data.system.memory_usage}%<br>
             Disk: ${data.system.disk_usage}%<br>
+            Server: ${data.system.process_rss_mb ?? 'N/A'}MB, lag ${data.system.loop_lag_max_ms ?? 'N/A'}ms<br>
             Uptime: ${data.system.uptime}
         `;
+        
+        // Low 4 bits are the current firmware state: under-voltage, capped, throttled, soft limit
+        const throttled = data.system.throttled || 0;
+        if (throttled & 0xF) {
+            const reasons = ['Under-voltage', 'Freq capped', 'Throttled', 'Soft temp limit']
+                .filter((_, bit) => throttled & (1 << bit));
+            document.getElementById('system-data').innerHTML +=
+                `<br><span class="battery-status-critical">${reasons.join(', ')}</span>`;
+        }
     }
     
     // Update servo status
@@ -496,7 +729,21 @@ function centerMapOnBoat() {
 // Update 3D boat orientation based on IMU data
 function updateBoatOrientation(imuData) {
     // Apply rotation to the entire scene
-    // Using accelerometer data for pitch and roll
+    const orientation = imuData.orientation;
+    if (orientation) {
+        // Fused on the boat from high-rate gyro and accelerometer samples
+        const toRadians = Math.PI / 180;
+        scene.rotation.x = orientation.pitch * toRadians;
+        scene.rotation.z = orientation.roll * toRadians;
+        scene.rotation.y = -orientation.yaw * toRadians;
+        
+        // Update heading display (relative to the heading at startup)
+        document.getElementById('heading-value').textContent = 
+            `${Math.round((orientation.yaw + 360) % 360)}°`;
+        return;
+    }
+    
+    // Older servers: estimate pitch and roll from the accelerometer
     const pitch = Math.atan2(imuData.accel.y, imuData.accel.z);
     const roll = Math.atan2(imuData.accel.x, imuData.accel.z);
     
@@ -548,8 +795,8 @@ function setupCameraControls() {
     console.log('Camera controls setup completed');
 }
 
-let cameraControlInterval = null;
-let isControllingCamera = false;
+// Axis being jogged by a held button; the server keeps it moving until halt
+let joggingAxis = null;
 
 function handleCameraControl(event) {
     event.preventDefault();
@@ -562,27 +809,17 @@ function handleCameraControl(event) {
         return;
     }
     
-    // Start continuous control
-    isControllingCamera = true;
-    
-    // Immediate first command
-    sendServoCommand(command, { direction: direction, step: 2 });
-    
-    // Continue sending commands while button is held
-    cameraControlInterval = setInterval(() => {
-        if (isControllingCamera) {
-            sendServoCommand(command, { direction: direction, step: 1 });
-        }
-    }, 100);
+    // One message starts the move and one stops it, however long the button is held
+    joggingAxis = command;
+    sendServoCommand('jog', { axis: command, direction: direction });
 }
 
 function stopCameraControl(event) {
     event.preventDefault();
-    isControllingCamera = false;
     
-    if (cameraControlInterval) {
-        clearInterval(cameraControlInterval);
-        cameraControlInterval = null;
+    if (joggingAxis) {
+        sendServoCommand('halt', { axis: joggingAxis });
+        joggingAxis = null;
     }
 }
 
@@ -597,28 +834,24 @@ function handleKeyboardCamera(event) {
         pressedKeys.delete(event.code);
     }
     
-    // Handle camera movement keys
+    // Handle camera movement keys: jog while held, halt on release
+    const jogKeys = {
+        KeyW: ['tilt', 'up'],
+        KeyS: ['tilt', 'down'],
+        KeyA: ['pan', 'left'],
+        KeyD: ['pan', 'right']
+    };
+    if (jogKeys[event.code]) {
+        const [axis, direction] = jogKeys[event.code];
+        if (event.type === 'keydown') {
+            sendServoCommand('jog', { axis: axis, direction: direction });
+        } else {
+            sendServoCommand('halt', { axis: axis });
+        }
+        return;
+    }
+    
     switch(event.code) {
-        case 'KeyW':
-            if (event.type === 'keydown') {
-                sendServoCommand('tilt', { direction: 'up', step: 2 });
-            }
-            break;
-        case 'KeyS':
-            if (event.type === 'keydown') {
-                sendServoCommand('tilt', { direction: 'down', step: 2 });
-            }
-            break;
-        case 'KeyA':
-            if (event.type === 'keydown') {
-                sendServoCommand('pan', { direction: 'left', step: 2 });
-            }
-            break;
-        case 'KeyD':
-            if (event.type === 'keydown') {
-                sendServoCommand('pan', { direction: 'right', step: 2 });
-            }
-            break;
         case 'Space':
             if (event.type === 'keydown') {
                 event.preventDefault();
@@ -657,37 +890,48 @@ function updateServoStatus(servoData) {
 function setupSampleManagement() {
     // Refresh samples button
     document.getElementById('refresh-samples').addEventListener('click', () => {
-        requestSampleData('get_all');
+        requestRecentSamples();
         requestSampleData('get_statistics');
+        if (samplesOnMap) {
+            requestSamplesInView();
+        }
     });
     
     // Show samples on map button
     document.getElementById('show-samples-map').addEventListener('click', () => {
-        requestSampleData('get_all');
+        samplesOnMap = true;
+        requestSamplesInView();
+    });
+    
+    // Only fetch the samples inside the visible map area
+    map.on('moveend', () => {
+        if (samplesOnMap) {
+            requestSamplesInView();
+        }
     });
     
     // Export buttons
     document.getElementById('export-geojson').addEventListener('click', () => {
-        requestSampleData('export_geojson');
+        requestSampleData('export_geojson', { download: true });
     });
     
     document.getElementById('export-csv').addEventListener('click', () => {
-        requestSampleData('export_csv');
+        requestSampleData('export_csv', { download: true });
     });
     
     // Load initial data
     setTimeout(() => {
-        requestSampleData('get_all');
+        requestRecentSamples();
         requestSampleData('get_statistics');
     }, 2000); // Wait 2 seconds after page load
 }
 
-function requestSampleData(command) {
+function requestSampleData(command, extra = {}) {
     if (ws && ws.readyState === WebSocket.OPEN) {
-        const message = {
+        const message = Object.assign({
             type: 'samples',
             command: command
-        };
+        }, extra);
         console.log('Requesting sample data:', command);
         ws.send(JSON.stringify(message));
     } else {
@@ -695,6 +939,25 @@ function requestSampleData(command) {
     }
 }
 
+function requestRecentSamples() {
+    requestSampleData('query', {
+        request_id: 'recent',
+        query: { newest_first: true, limit: 10 }
+    });
+}
+
+function requestSamplesInView(cursor = null) {
+    const bounds = map.getBounds();
+    requestSampleData('query', {
+        request_id: cursor === null ? 'map' : 'map_page',
+        query: {
+            bbox: [bounds.getSouth(), bounds.getWest(), bounds.getNorth(), bounds.getEast()],
+            cursor: cursor,
+            limit: 500
+        }
+    });
+}
+
 function handleSampleData(data) {
     console.log('Received sample data:', data);
     
@@ -704,6 +967,21 @@ function handleSampleData(data) {
             showSamplesOnMap(data.samples);
             break;
             
+        case 'query_results':
+            if (data.request_id === 'recent') {
+                displaySamples(data.samples);
+            } else if (data.request_id === 'map' || data.request_id === 'map_page') {
+                if (data.request_id === 'map') {
+                    clearSampleMarkers();
+                }
+                addSampleMarkers(data.samples);
+                // Follow the cursor until the whole view is loaded
+                if (data.next_cursor !== null) {
+                    requestSamplesInView(data.next_cursor);
+                }
+            }
+            break;
+            
         case 'statistics':
             updateSampleStatistics(data.statistics);
             break;
@@ -715,9 +993,48 @@ function handleSampleData(data) {
         case 'csv_exported':
             showExportMessage(data.message);
             break;
+            
+        case 'export_progress':
+            console.log(`Exporting ${data.format}: ${data.done}/${data.total} samples`);
+            break;
+            
+        case 'export_failed':
+            showExportMessage(data.message);
+            break;
+            
+        case 'download_start':
+            activeDownloads[data.transfer_id] = {
+                filename: data.filename,
+                size: data.size,
+                received: 0,
+                chunks: []
+            };
+            break;
+            
+        case 'download_complete':
+            saveDownload(data.transfer_id);
+            break;
     }
 }
 
+function saveDownload(transferId) {
+    const download = activeDownloads[transferId];
+    if (!download) return;
+    delete activeDownloads[transferId];
+    
+    const blob = new Blob(download.chunks);
+    const url = URL.createObjectURL(blob);
+    const link = document.createElement('a');
+    link.href = url;
+    link.download = download.filename;
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    URL.revokeObjectURL(url);
+    
+    console.log(`Downloaded ${download.filename} (${download.received} bytes)`);
+}
+
 function displaySamples(samples) {
     const samplesList = document.getElementById('samples-list');
     
@@ -758,12 +1075,18 @@ function displaySamples(samples) {
 }
 
 function showSamplesOnMap(samples) {
-    // Clear existing sample markers
+    clearSampleMarkers();
+    addSampleMarkers(samples);
+}
+
+function clearSampleMarkers() {
     sampleMarkers.forEach(marker => {
         map.removeLayer(marker);
     });
     sampleMarkers = [];
-    
+}
+
+function addSampleMarkers(samples) {
     if (!samples || samples.length === 0) return;
     
     // Add markers for each sample with location